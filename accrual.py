@@ -0,0 +1,197 @@
+# accrual.py
+import argparse
+import io
+import time
+from datetime import date, datetime
+
+from amortization import ScheduleError, annuity_balance, normalize_term
+from models import db, Deposit, Loan, Accrual, Accrual_Run
+from partitions import add_months, month_start
+
+# Ежемесячное начисление процентов по вкладам и кредитам. Продукты читаются
+# порциями по CHUNK_SIZE в порядке id, расчёт по порции выполняется массивами
+# NumPy, результат загружается COPY во временную таблицу и переносится в
+# accrual одним INSERT ... ON CONFLICT. Запись порции и контрольная точка
+# (Accrual_Run.last_id) фиксируются в одной транзакции, поэтому прерванный
+# запуск продолжается с первой необработанной порции.
+CHUNK_SIZE = 50000
+DAYS_IN_YEAR = 365
+PRODUCTS = ('deposit', 'loan')
+
+
+class AccrualResult:
+    def __init__(self, product_type):
+        self.product_type = product_type
+        self.processed = 0
+        self.skipped = 0
+        self.seconds = 0.0
+        self.resumed_from = 0
+
+
+def deposit_interest(np, rows, period):
+    # Простые проценты без капитализации: за месяц - по дням действия вклада
+    # в этом месяце, остаток - вклад плюс проценты со дня открытия
+    _, rates, amounts, opened, closed = zip(*rows)
+    rates = np.array(rates, dtype=float) / 100
+    amounts = np.array(amounts, dtype=float)
+    opened = np.array(opened, dtype='datetime64[D]')
+    closed = np.array(closed, dtype='datetime64[D]')
+    start = np.datetime64(period, 'D')
+    end = np.datetime64(add_months(period, 1), 'D')
+
+    active_to = np.minimum(closed, end)
+    days = (active_to - np.maximum(opened, start)).astype(int).clip(0)
+    total_days = (active_to - opened).astype(int).clip(0)
+    accrued = amounts * rates * days / DAYS_IN_YEAR
+    balance = amounts * (1 + rates * total_days / DAYS_IN_YEAR)
+    return np.ones(len(rows), dtype=bool), accrued, balance
+
+
+def loan_interest(np, rows, period):
+    # Аннуитетный кредит: проценты за месяц на остаток к началу месяца,
+    # остаток - после платежей, срок которых наступил до конца месяца. В месяц
+    # открытия проценты - только за дни действия кредита, как у вкладов
+    _, rates, amounts, terms, repayment, opened = zip(*rows)
+    annual = np.array(rates, dtype=float) / 100
+    amounts = np.array(amounts, dtype=float)
+
+    # Сроки и периодичность - строки с небольшим числом различных сочетаний:
+    # каждое проверяется один раз тем же normalize_term, что и графики
+    # погашения; нулевой срок или срок, не кратный периоду, не начисляется
+    parsed = {}
+    for key in set(zip(terms, repayment)):
+        try:
+            parsed[key] = normalize_term(*key)
+        except ScheduleError:
+            parsed[key] = (0, 0)
+    months, per_year = (np.array(column) for column in zip(*[parsed[key] for key in zip(terms, repayment)]))
+    valid = (per_year > 0) & (amounts > 0)
+
+    step = 12 // np.where(valid, per_year, 12)
+    payments = np.where(valid, months // step, 1)
+    rates = annual / np.where(valid, per_year, 12)
+    elapsed = (np.datetime64(period, 'M') - np.array(opened, dtype='datetime64[M]')).astype(int)
+    # Платежи через step, 2*step, ... месяцев после открытия
+    made_before = ((elapsed - 1) // step).clip(0, payments)
+    made = (elapsed // step).clip(0, payments)
+
+    start = np.datetime64(period, 'D')
+    end = np.datetime64(add_months(period, 1), 'D')
+    days = (end - np.maximum(np.array(opened, dtype='datetime64[D]'), start)).astype(int).clip(0)
+    share = days / (end - start).astype(int)
+
+    accrued = amounts * annuity_balance(np, rates, payments, made_before) * annual / 12 * share
+    balance = amounts * annuity_balance(np, rates, payments, made)
+    accrued = np.where(made_before < payments, accrued, 0)
+    return valid, accrued, balance
+
+
+PRODUCT_QUERIES = {
+    'deposit': (Deposit, lambda start, end: Deposit.select(
+        Deposit.id, Deposit.interest_rate, Deposit.deposit_amount, Deposit.opening_date, Deposit.closing_date
+    ).where((Deposit.opening_date < end) & (Deposit.closing_date >= start)), deposit_interest),
+    'loan': (Loan, lambda start, end: Loan.select(
+        Loan.id, Loan.interest_rate, Loan.loan_amount, Loan.loan_term, Loan.repayment_period, Loan.opening_date
+    ).where((Loan.opening_date < end) & (Loan.closing_date >= start)), loan_interest),
+}
+
+
+def write_results(np, product_type, period, ids, accrued, balance):
+    buffer = io.StringIO()
+    np.savetxt(buffer, np.column_stack((ids, accrued.round(2), balance.round(2))),
+               fmt=('%d', '%.2f', '%.2f'), delimiter='\t')
+    buffer.seek(0)
+    db.execute_sql('CREATE TEMPORARY TABLE IF NOT EXISTS accrual_chunk '
+                   '(product_id integer, accrued_interest numeric(14, 2), balance numeric(14, 2)) '
+                   'ON COMMIT DELETE ROWS')
+    with db.cursor() as cursor:
+        cursor.copy_expert('COPY accrual_chunk FROM STDIN', buffer)
+    db.execute_sql(
+        'INSERT INTO accrual (period, product_type, product_id, accrued_interest, balance) '
+        'SELECT %s, %s, product_id, accrued_interest, balance FROM accrual_chunk '
+        'ON CONFLICT (product_type, period, product_id) DO UPDATE '
+        'SET accrued_interest = EXCLUDED.accrued_interest, balance = EXCLUDED.balance',
+        (period, product_type)
+    )
+
+
+def start_run(period, product_type, restart=False):
+    # Незавершённый запуск продолжается; завершённый пропускается, если не restart
+    run, created = Accrual_Run.get_or_create(period=period, product_type=product_type,
+                                             defaults={'started_at': datetime.now()})
+    if restart and not created:
+        with db.atomic():
+            run.last_id = run.processed = run.skipped = 0
+            run.started_at = datetime.now()
+            run.finished_at = None
+            run.save()
+            Accrual.delete().where((Accrual.period == period) & (Accrual.product_type == product_type)).execute()
+    elif run.finished_at is not None:
+        return None
+    return run
+
+
+def accrue(product_type, period, chunk_size=CHUNK_SIZE, restart=False, progress=None):
+    import numpy as np
+
+    period = month_start(period)
+    model, make_query, compute = PRODUCT_QUERIES[product_type]
+    result = AccrualResult(product_type)
+    run = start_run(period, product_type, restart)
+    if run is None:
+        return None
+    result.resumed_from = run.last_id
+    query = make_query(period, add_months(period, 1))
+    started = time.perf_counter()
+
+    while True:
+        rows = list(query.where(model.id > run.last_id).order_by(model.id).limit(chunk_size).tuples())
+        if not rows:
+            break
+        valid, accrued, balance = compute(np, rows, period)
+        ids = np.array([row[0] for row in rows])
+        with db.atomic():
+            if valid.any():
+                write_results(np, product_type, period, ids[valid], accrued[valid], balance[valid])
+            run.last_id = rows[-1][0]
+            run.processed += int(valid.sum())
+            run.skipped += int((~valid).sum())
+            run.save(only=[Accrual_Run.last_id, Accrual_Run.processed, Accrual_Run.skipped])
+        result.processed += int(valid.sum())
+        result.skipped += int((~valid).sum())
+        if progress is not None:
+            progress(product_type, result.processed)
+
+    run.finished_at = datetime.now()
+    run.save(only=[Accrual_Run.finished_at])
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def parse_period(value):
+    return datetime.strptime(value, '%Y-%m').date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Начисление процентов по вкладам и кредитам за месяц")
+    parser.add_argument('--period', type=parse_period, default=add_months(month_start(date.today()), -1),
+                        help="Месяц в формате ГГГГ-ММ (по умолчанию - прошлый)")
+    parser.add_argument('--products', nargs='+', choices=PRODUCTS, default=list(PRODUCTS))
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--restart', action='store_true', help="Пересчитать месяц заново")
+    args = parser.parse_args()
+
+    with db.connection_context():
+        for product_type in args.products:
+            result = accrue(product_type, args.period, args.chunk_size, args.restart,
+                            progress=lambda product, done: print(f"  {product}: {done}", end='\r'))
+            if result is None:
+                print(f"{product_type}: месяц {args.period:%Y-%m} уже рассчитан (--restart для пересчёта)")
+                continue
+            note = f", продолжено после id {result.resumed_from}" if result.resumed_from else ""
+            print(f"{product_type}: начислено {result.processed}, пропущено {result.skipped} "
+                  f"за {result.seconds:.1f} с{note}")
+
+
+if __name__ == '__main__':
+    main()
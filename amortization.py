@@ -0,0 +1,285 @@
+# amortization.py
+import argparse
+import calendar
+import re
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+from itertools import islice
+
+from models import db, Loan
+
+# Графики погашения кредитов. loan_term и repayment_period хранятся в Loan
+# строками; здесь они приводятся к числу месяцев и числу платежей в год.
+# График строится массивами NumPy и кэшируется по (сумма, ставка, срок,
+# периодичность, вид); прогноз по портфелю строит график на единицу суммы
+# для каждого набора условий и масштабирует его суммами кредитов.
+ANNUITY = 'annuity'
+DIFFERENTIATED = 'differentiated'
+KINDS = {ANNUITY: 'Аннуитетный', DIFFERENTIATED: 'Дифференцированный'}
+PAYMENTS_PER_YEAR = {'ежемесячно': 12, 'ежеквартально': 4, 'раз в полгода': 2, 'ежегодно': 1}
+SCHEDULE_CACHE_SIZE = 4096
+CHUNK_SIZE = 50000
+
+
+class ScheduleError(ValueError):
+    pass
+
+
+class Schedule:
+    # Массивы графика по номеру платежа; общие для всех пользователей кэша,
+    # поэтому доступны только для чтения
+    def __init__(self, months, per_year, payment, principal, interest, balance):
+        self.months = months
+        self.per_year = per_year
+        self.step = 12 // per_year
+        self.payment = payment
+        self.principal = principal
+        self.interest = interest
+        self.balance = balance
+        for array in (payment, principal, interest, balance):
+            array.flags.writeable = False
+
+    def __len__(self):
+        return len(self.payment)
+
+    @property
+    def total_interest(self):
+        return float(self.interest.sum())
+
+    def dates(self, opening_date):
+        return [shift_months(opening_date, self.step * number) for number in range(1, len(self) + 1)]
+
+    def rows(self, opening_date):
+        # (номер, дата, платёж, основной долг, проценты, остаток)
+        return list(zip(range(1, len(self) + 1), self.dates(opening_date), self.payment.tolist(),
+                        self.principal.tolist(), self.interest.tolist(), self.balance.tolist()))
+
+
+@lru_cache(maxsize=None)
+def term_months(term):
+    # '12 месяцев', '24 месяца', '1 год', '5 лет' -> число месяцев; None, если не разобрать
+    match = re.fullmatch(r'(\d+)\s*(мес\w*|год\w*|лет)', (term or '').strip().lower())
+    if not match:
+        return None
+    count = int(match.group(1))
+    return count if match.group(2).startswith('мес') else count * 12
+
+
+def payments_per_year(repayment_period):
+    return PAYMENTS_PER_YEAR.get((repayment_period or '').strip().lower())
+
+
+def normalize_term(loan_term, repayment_period, amount=None):
+    # (число месяцев, платежей в год); срок должен быть положительным и делиться
+    # на интервал платежей, сумма (если передана) - положительной
+    months = term_months(loan_term)
+    if months is None:
+        raise ScheduleError(f"Не удалось разобрать срок кредита: {loan_term!r}")
+    if months <= 0:
+        raise ScheduleError(f"Срок кредита должен быть положительным: {loan_term!r}")
+    if amount is not None and Decimal(str(amount)) <= 0:
+        raise ScheduleError("Сумма кредита должна быть положительной.")
+    per_year = payments_per_year(repayment_period)
+    if per_year is None:
+        raise ScheduleError(f"Неизвестная периодичность погашения: {repayment_period!r}")
+    if months % (12 // per_year):
+        raise ScheduleError(f"Срок {loan_term} не кратен периоду погашения «{repayment_period}»")
+    return months, per_year
+
+
+def shift_months(day, count):
+    # Та же дата через count месяцев; 31 января + 1 месяц -> последний день февраля
+    index = day.year * 12 + day.month - 1 + count
+    year, month = divmod(index, 12)
+    return date(year, month + 1, min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def annuity_payment(np, rate, count):
+    # Аннуитетный платёж на единицу суммы; rate - ставка за период,
+    # count - число платежей (числа или массивы NumPy)
+    rate, count = np.asarray(rate, dtype=float), np.asarray(count, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = (1 + rate) ** count
+        return np.where(rate > 0, rate * growth / (growth - 1), 1 / count)
+
+
+def annuity_balance(np, rate, count, made):
+    # Остаток на единицу суммы после made аннуитетных платежей из count
+    rate, count, made = (np.asarray(value, dtype=float) for value in (rate, count, made))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = (1 + rate) ** count
+        balance = np.where(rate > 0, (growth - (1 + rate) ** made) / (growth - 1), 1 - made / count)
+    return balance.clip(0)
+
+
+@lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def cached_schedule(amount, rate, months, per_year, kind):
+    import numpy as np
+
+    count = months * per_year // 12
+    r = float(rate) / 100 / per_year
+    amount = float(amount)
+    numbers = np.arange(1, count + 1)
+
+    if kind == ANNUITY:
+        opening = amount * annuity_balance(np, r, count, numbers - 1)
+        principal = (amount * annuity_payment(np, r, count) - opening * r).round(2)
+    elif kind == DIFFERENTIATED:
+        principal = np.full(count, round(amount / count, 2))
+    else:
+        raise ScheduleError(f"Неизвестный вид графика: {kind}")
+
+    # Копейки округления уходят в последний платёж, остаток после него - ровно 0
+    principal[-1] = round(amount - principal[:-1].sum(), 2)
+    balance = (amount - principal.cumsum()).round(2)
+    opening = np.concatenate(([amount], balance[:-1]))
+    interest = (opening * r).round(2)
+    payment = (principal + interest).round(2)
+    return Schedule(months, per_year, payment, principal, interest, balance.clip(0))
+
+
+def schedule(amount, rate, loan_term, repayment_period, kind=ANNUITY):
+    months, per_year = normalize_term(loan_term, repayment_period, amount)
+    return cached_schedule(Decimal(str(amount)), Decimal(str(rate)), months, per_year, kind)
+
+
+def loan_schedule(loan, kind=ANNUITY):
+    return schedule(loan.loan_amount, loan.interest_rate, loan.loan_term, loan.repayment_period, kind)
+
+
+def loan_rows(chunk_size=CHUNK_SIZE):
+    # Кредиты порциями по id: (сумма, ставка, срок, периодичность, дата открытия)
+    last_id = 0
+    while True:
+        rows = list(Loan
+                    .select(Loan.id, Loan.loan_amount, Loan.interest_rate, Loan.loan_term, Loan.repayment_period,
+                            Loan.opening_date)
+                    .where(Loan.id > last_id)
+                    .order_by(Loan.id)
+                    .limit(chunk_size)
+                    .tuples())
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        for row in rows:
+            yield row[1:]
+
+
+@lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def unit_schedule(rate, months, per_year, kind):
+    # График на единицу суммы без округления: (шаг в месяцах, массив 3 x число
+    # платежей - платёж, основной долг, проценты)
+    import numpy as np
+
+    count = months * per_year // 12
+    r = float(rate) / 100 / per_year
+    numbers = np.arange(1, count + 1)
+    if kind == ANNUITY:
+        opening = annuity_balance(np, r, count, numbers - 1)
+        payment = np.broadcast_to(annuity_payment(np, r, count), opening.shape)
+        interest = opening * r
+        principal = payment - interest
+    elif kind == DIFFERENTIATED:
+        principal = np.full(count, 1 / count)
+        interest = (1 - (numbers - 1) / count) * r
+        payment = principal + interest
+    else:
+        raise ScheduleError(f"Неизвестный вид графика: {kind}")
+    values = np.vstack((payment, principal, interest))
+    values.flags.writeable = False
+    return 12 // per_year, values
+
+
+def portfolio_cash_flows(rows=None, kind=ANNUITY, start=None, chunk_size=CHUNK_SIZE):
+    # Прогноз денежного потока портфеля по месяцам: [(месяц, платёж, основной
+    # долг, проценты)] и число кредитов, которые не удалось разобрать.
+    # Кредиты читаются порциями; в порции суммы складываются по (условия, месяц
+    # открытия), так что память зависит от числа различных условий и месяцев,
+    # а не от числа кредитов. В конце график на единицу суммы каждого набора
+    # условий умножается на вектор этих сумм. Копейки не округляются
+    # по каждому кредиту, поэтому итог может отличаться от суммы графиков на
+    # несколько копеек.
+    import numpy as np
+
+    terms = {}  # (ставка, срок, периодичность) -> номер набора условий или None
+    plans = []  # номер набора -> (шаг, график на единицу суммы)
+    weights = defaultdict(float)  # (номер набора, месяц открытия) -> сумма кредитов
+    skipped = 0
+    rows = iter(loan_rows() if rows is None else rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        amounts, rates, loan_terms, periods, opened = zip(*chunk)
+        numbers = []
+        for key in zip(rates, loan_terms, periods):
+            if key not in terms:
+                try:
+                    months, per_year = normalize_term(key[1], key[2])
+                    plans.append(unit_schedule(Decimal(str(key[0])), months, per_year, kind))
+                    terms[key] = len(plans) - 1
+                except ScheduleError:
+                    terms[key] = None
+            numbers.append(-1 if terms[key] is None else terms[key])
+        numbers = np.array(numbers)
+        amounts = np.array(amounts, dtype=float)
+        opened = np.array(opened, dtype='datetime64[M]').astype(int) + 1970 * 12
+        valid = (numbers >= 0) & (amounts > 0)
+        skipped += int((~valid).sum())
+        if not valid.any():
+            continue
+        pairs, inverse = np.unique(np.column_stack((numbers[valid], opened[valid])), axis=0, return_inverse=True)
+        sums = np.bincount(inverse.ravel(), weights=amounts[valid], minlength=len(pairs))
+        for (number, month), amount in zip(pairs.tolist(), sums.tolist()):
+            weights[number, month] += amount
+    if not weights:
+        return [], skipped
+
+    by_plan = defaultdict(list)
+    for (number, month), amount in weights.items():
+        by_plan[number].append((month, amount))
+    first = min(month for number, month in weights)
+    last = max(month + plans[number][0] * plans[number][1].shape[1] for number, month in weights)
+    totals = np.zeros((3, last - first + 1))
+    for number, opened_amounts in by_plan.items():
+        step, values = plans[number]
+        months, amounts = (np.array(column) for column in zip(*opened_amounts))
+        offsets = (months[:, None] - first + step * np.arange(1, values.shape[1] + 1)).ravel()
+        for row in range(3):
+            np.add.at(totals[row], offsets, np.outer(amounts, values[row]).ravel())
+
+    start_index = 0 if start is None else max(start.year * 12 + start.month - 1 - first, 0)
+    flows = []
+    for index in np.flatnonzero(totals[0]):
+        if index >= start_index:
+            year, month = divmod(first + int(index), 12)
+            flows.append((date(year, month + 1, 1), *(round(float(value), 2) for value in totals[:, index])))
+    return flows, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Графики погашения кредитов")
+    parser.add_argument('--loan', type=int, help="Показать график кредита с этим id")
+    parser.add_argument('--portfolio', action='store_true', help="Прогноз платежей по всем кредитам по месяцам")
+    parser.add_argument('--kind', choices=list(KINDS), default=ANNUITY)
+    args = parser.parse_args()
+
+    with db.connection_context():
+        if args.loan is not None:
+            loan = Loan.get_by_id(args.loan)
+            plan = loan_schedule(loan, args.kind)
+            for row in plan.rows(loan.opening_date):
+                print("{:4} {} {:>14.2f} {:>14.2f} {:>12.2f} {:>14.2f}".format(*row))
+            print(f"Переплата: {plan.total_interest:.2f}")
+        if args.portfolio:
+            flows, skipped = portfolio_cash_flows(kind=args.kind, start=date.today())
+            for month, payment, principal, interest in flows:
+                print(f"{month:%Y-%m} {payment:>16.2f} {principal:>16.2f} {interest:>14.2f}")
+            if skipped:
+                print(f"Не разобраны условия у {skipped} кредитов")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,41 +1,239 @@
+import argparse
+import hashlib
+import json
 import os
+import shutil
 import subprocess
+import sys
+import time
 import datetime
 
-DB_NAME = "bank"
-DB_USER = "postgres"
-DB_PASSWORD = "123"
-DB_HOST = "localhost"
-DB_PORT = "5432"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-BACKUP_FOLDER = r"E:\!Yandex sync\YandexDisk\BD_backup"
+from database import load_settings  # noqa: E402
 
+# Параметры подключения берутся из database.ini / BANK_DB_*, как у приложения.
+# Каталог копий и путь к утилитам PostgreSQL - из BANK_BACKUP_DIR и BANK_PG_BIN.
+BACKUP_FOLDER = os.environ.get('BANK_BACKUP_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                               'backups'))
+PG_BIN = os.environ.get('BANK_PG_BIN', '')
+MANIFEST = 'manifest.json'
+CHUNK = 1 << 20
 
-def backup_database():
-    if not os.path.exists(BACKUP_FOLDER):
-        os.makedirs(BACKUP_FOLDER)
 
-    current_time = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    backup_file = os.path.join(BACKUP_FOLDER, f"{DB_NAME}_backup_{current_time}.sql")
-
-    pg_dump_path = r"C:\Program Files\PostgreSQL\17\bin\pg_dump.exe"
-    pg_dump_command = [
-        pg_dump_path,
-        f"-U{DB_USER}",
-        f"-h{DB_HOST}",
-        f"-p{DB_PORT}",
-        "-F", "c",
-        "-f", backup_file,
-        DB_NAME
-    ]
+def tool(name):
+    path = shutil.which(name, path=PG_BIN or None)
+    if path is None:
+        raise FileNotFoundError(f"Не найдена утилита {name}: добавьте каталог PostgreSQL bin в PATH или BANK_PG_BIN")
+    return path
+
+
+def connection_args(settings):
+    return ['-h', settings['host'], '-p', str(settings['port']), '-U', settings['user']]
 
+
+def environment(settings):
     env = os.environ.copy()
-    env["PGPASSWORD"] = DB_PASSWORD
+    env['PGPASSWORD'] = settings['password']
+    return env
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def checksums(backup_dir):
+    files = {}
+    for folder, _, names in os.walk(backup_dir):
+        for name in sorted(names):
+            path = os.path.join(folder, name)
+            relative = os.path.relpath(path, backup_dir).replace(os.sep, '/')
+            if relative != MANIFEST:
+                files[relative] = {'size': os.path.getsize(path), 'sha256': sha256(path)}
+    return files
+
+
+def read_manifest(backup_dir):
+    with open(os.path.join(backup_dir, MANIFEST), encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+
+def write_manifest(backup_dir, manifest):
+    path = os.path.join(backup_dir, MANIFEST)
+    with open(path + '.tmp', 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def backup_database(settings, folder=BACKUP_FOLDER, jobs=None, compress='6'):
+    # Формат каталога: таблицы выгружаются параллельно в jobs потоков, каждый
+    # файл сжимается по мере записи
+    jobs = jobs or os.cpu_count() or 1
+    os.makedirs(folder, exist_ok=True)
+    current_time = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    backup_dir = os.path.join(folder, f"{settings['name']}_backup_{current_time}")
+
+    pg_dump = tool('pg_dump')
+    command = [pg_dump, *connection_args(settings), '-F', 'd', '-j', str(jobs), '-Z', compress,
+               '-f', backup_dir, settings['name']]
+    started = time.perf_counter()
+    try:
+        subprocess.run(command, env=environment(settings), check=True)
+    except BaseException:
+        shutil.rmtree(backup_dir, ignore_errors=True)
+        raise
+    elapsed = time.perf_counter() - started
 
+    files = checksums(backup_dir)
+    size = sum(info['size'] for info in files.values())
+    version = subprocess.run([pg_dump, '--version'], capture_output=True, text=True).stdout.strip()
+    manifest = {
+        'database': settings['name'],
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'pg_dump': version,
+        'format': 'directory',
+        'jobs': jobs,
+        'compress': compress,
+        'dump_seconds': round(elapsed, 3),
+        'size_bytes': size,
+        'dump_mb_per_second': round(size / 2 ** 20 / elapsed, 2) if elapsed else None,
+        'files': files,
+    }
+    write_manifest(backup_dir, manifest)
+    print(f"Резервная копия успешно создана: {backup_dir} "
+          f"({size / 2 ** 20:.1f} МБ за {elapsed:.1f} с, {jobs} потоков)")
+    return backup_dir
+
+
+def verify_checksums(backup_dir):
+    manifest = read_manifest(backup_dir)
+    actual = checksums(backup_dir)
+    damaged = sorted(name for name, info in manifest['files'].items()
+                     if actual.get(name, {}).get('sha256') != info['sha256'])
+    extra = sorted(set(actual) - set(manifest['files']))
+    return damaged, extra
+
+
+def table_counts(settings, database):
+    psql = tool('psql')
+    # Точное число строк в каждой таблице одним запросом. Считаются только
+    # таблицы с данными (relkind 'r'): секционированный родитель ('p') не
+    # считается, иначе строки transaction вошли бы дважды - в него и в секции
+    sql = ("SELECT c.relname, (xpath('/row/c/text()', query_to_xml(format('SELECT count(*) AS c FROM %I.%I', "
+           "n.nspname, c.relname), false, true, '')))[1]::text::bigint FROM pg_class c "
+           "JOIN pg_namespace n ON n.oid = c.relnamespace "
+           "WHERE n.nspname = 'public' AND c.relkind = 'r' ORDER BY c.relname")
+    output = subprocess.run([psql, *connection_args(settings), '-d', database, '-At', '-F', '\t', '-c', sql],
+                            env=environment(settings), capture_output=True, text=True, check=True).stdout
+    return {name: int(count) for name, count in (line.split('\t') for line in output.splitlines() if line)}
+
+
+def verify_restore(settings, backup_dir, jobs=None):
+    # Проверка восстановлением: копия разворачивается в пустую временную базу
+    # (pg_restore -j), после чего база удаляется. Итог записывается в manifest.
+    jobs = jobs or os.cpu_count() or 1
+    damaged, extra = verify_checksums(backup_dir)
+    if damaged or extra:
+        raise RuntimeError(f"Контрольные суммы не совпадают: {', '.join(damaged + extra)}")
+
+    scratch = f"{settings['name']}_verify_{os.getpid()}"
+    env = environment(settings)
+    subprocess.run([tool('createdb'), *connection_args(settings), scratch], env=env, check=True)
     try:
-        subprocess.run(pg_dump_command, env=env, check=True)
-        print(f"Резервная копия успешно создана: {backup_file}")
+        started = time.perf_counter()
+        subprocess.run([tool('pg_restore'), *connection_args(settings), '-j', str(jobs), '--exit-on-error',
+                        '-d', scratch, backup_dir], env=env, check=True)
+        elapsed = time.perf_counter() - started
+        counts = table_counts(settings, scratch)
+    finally:
+        subprocess.run([tool('dropdb'), *connection_args(settings), '--if-exists', scratch], env=env)
+
+    manifest = read_manifest(backup_dir)
+    manifest['verified'] = {
+        'at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'restore_jobs': jobs,
+        'restore_seconds': round(elapsed, 3),
+        'restore_mb_per_second': round(manifest['size_bytes'] / 2 ** 20 / elapsed, 2) if elapsed else None,
+        'row_counts': counts,
+    }
+    write_manifest(backup_dir, manifest)
+    print(f"Копия {backup_dir} проверена: восстановлена за {elapsed:.1f} с, "
+          f"строк: {sum(counts.values())}")
+    return manifest['verified']
+
+
+def list_backups(folder, database):
+    backups = []
+    prefix = f"{database}_backup_"
+    if not os.path.isdir(folder):
+        return backups
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if name.startswith(prefix) and os.path.isfile(os.path.join(path, MANIFEST)):
+            created = datetime.datetime.strptime(name[len(prefix):], "%Y-%m-%d_%H-%M-%S")
+            backups.append((created, path))
+    return sorted(backups, reverse=True)
+
+
+def prune(folder, database, keep_last=7, keep_daily=7, keep_weekly=4):
+    # Хранятся keep_last последних копий, а также последняя копия каждого из
+    # keep_daily последних дней и каждой из keep_weekly последних недель
+    backups = list_backups(folder, database)
+    keep = {path for _, path in backups[:keep_last]}
+    days, weeks = [], []
+    for created, path in backups:
+        day, week = created.date(), created.isocalendar()[:2]
+        if day not in days and len(days) < keep_daily:
+            days.append(day)
+            keep.add(path)
+        if week not in weeks and len(weeks) < keep_weekly:
+            weeks.append(week)
+            keep.add(path)
+    removed = [path for _, path in backups if path not in keep]
+    for path in removed:
+        shutil.rmtree(path)
+        print(f"Удалена устаревшая копия: {path}")
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Резервное копирование базы банка")
+    parser.add_argument('command', nargs='?', default='backup', choices=['backup', 'verify', 'prune'])
+    parser.add_argument('path', nargs='?', help="Каталог копии для verify (по умолчанию последняя)")
+    parser.add_argument('--dir', default=BACKUP_FOLDER, help="Каталог резервных копий")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="Потоков pg_dump/pg_restore")
+    parser.add_argument('--compress', default='6',
+                        help="Сжатие pg_dump -Z: уровень gzip или метод, например zstd:3 (PostgreSQL 16+)")
+    parser.add_argument('--verify', action='store_true', help="После копирования проверить восстановлением")
+    parser.add_argument('--keep-last', type=int, default=7)
+    parser.add_argument('--keep-daily', type=int, default=7)
+    parser.add_argument('--keep-weekly', type=int, default=4)
+    args = parser.parse_args()
+    settings = load_settings()
+
+    try:
+        if args.command == 'backup':
+            backup_dir = backup_database(settings, args.dir, args.jobs, args.compress)
+            if args.verify:
+                verify_restore(settings, backup_dir, args.jobs)
+            prune(args.dir, settings['name'], args.keep_last, args.keep_daily, args.keep_weekly)
+        elif args.command == 'verify':
+            backups = list_backups(args.dir, settings['name'])
+            backup_dir = args.path or (backups[0][1] if backups else None)
+            if backup_dir is None:
+                raise FileNotFoundError(f"В {args.dir} нет резервных копий")
+            verify_restore(settings, backup_dir, args.jobs)
+        else:
+            prune(args.dir, settings['name'], args.keep_last, args.keep_daily, args.keep_weekly)
     except Exception as ex:
-        print(f"Ошибка при создании резервной копии: {ex}")
+        print(f"Ошибка при резервном копировании: {ex}")
+        return 1
+    return 0
+
 
-backup_database()
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,2 +1,2 @@
 @echo off
-python C:\Users\Spasca\PycharmProjects\pythonProject\backup\backup.py 
\ No newline at end of file
+python "%~dp0backup.py" backup --verify %*
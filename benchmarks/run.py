@@ -0,0 +1,232 @@
+# benchmarks/run.py
+# Замеры основных сценариев приложения без GUI на локальной базе, заполненной
+# benchmarks/seed.py. Выполняются те же функции, что вызывает gui.py; результат
+# сохраняется в JSON, который можно сравнить с предыдущим прогоном (--compare).
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from peewee import fn  # noqa: E402
+
+from models import Users, Bank_Account, Transaction, db  # noqa: E402
+from partitions import add_months, month_start  # noqa: E402
+from queries import (  # noqa: E402
+    TABLES, scoped_query, query_columns, fetch_page, estimate_count, sort_order, row_cursor, apply_filters
+)
+from rendering import RowRenderer  # noqa: E402
+from exporters import stream_csv, stream_xlsx  # noqa: E402
+from sql_console import QuerySession  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+SEED_PASSWORD = 'bench'
+ROLE_TABLES = {
+    'admin': list(TABLES),
+    'employee': [table for table in TABLES if table != 'Employee'],
+    'client': ['Personal_Data', 'Organization_Data', 'Client', 'Deposit', 'Loan', 'Card', 'Bank_Account',
+               'Transaction'],
+}
+
+
+class Bench:
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = {}
+
+    def measure(self, name, func, repeat=None):
+        # func возвращает число обработанных строк
+        timings = []
+        rows = 0
+        for _ in range(repeat or self.repeat):
+            started = time.perf_counter()
+            rows = func()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        self.results[name] = {
+            'min_ms': round(timings[0] * 1000, 3),
+            'median_ms': round(statistics.median(timings) * 1000, 3),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 3),
+            'max_ms': round(timings[-1] * 1000, 3),
+            'runs': len(timings),
+            'rows': rows,
+        }
+        print(f"  {name:55} {self.results[name]['median_ms']:10.2f} мс  ({rows} строк)")
+
+
+def largest_client():
+    cursor = db.execute_sql(
+        "SELECT client_id FROM bank_account WHERE client_id IS NOT NULL "
+        "GROUP BY client_id ORDER BY count(*) DESC LIMIT 1"
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def load_table(renderer, model, user_status, client_id, filters=None, sort=None, period=None):
+    # То, что делает App.load_table + fetch_rows для первой страницы
+    query = scoped_query(model, user_status, client_id, period)
+    if filters:
+        query = apply_filters(query, model, filters)
+    order = sort_order(model, *sort) if sort else sort_order(model)
+    columns = query_columns(query)
+    records = fetch_page(query, order)
+    renderer.render(model, columns, records)
+    estimate_count(query, model)
+    return query, order, columns, records
+
+
+def next_page(renderer, model, user_status, client_id):
+    query, order, columns, records = load_table(renderer, model, user_status, client_id)
+    if not records:
+        return 0
+    page = fetch_page(query, order, after=row_cursor(order, columns, records[-1]))
+    renderer.render(model, columns, page)
+    return len(page)
+
+
+def login(login_name):
+    from werkzeug.security import check_password_hash
+
+    user = Users.get(Users.login == login_name)
+    check_password_hash(user.password, SEED_PASSWORD)
+    return 1
+
+
+def export(writer, model, user_status, client_id, limit):
+    query = scoped_query(model, user_status, client_id).limit(limit)
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        return writer(query, query_columns(query), path)
+    finally:
+        os.remove(path)
+
+
+def stream_query(sql, row_limit, pages):
+    session = QuerySession()
+    result = session.start(sql, row_limit)
+    rows = len(result.rows)
+    for _ in range(pages - 1):
+        if not result.has_more:
+            break
+        result = session.fetch_more(row_limit)
+        rows += len(result.rows)
+    session.close()
+    return rows
+
+
+def run(bench, export_rows):
+    renderer = RowRenderer()
+    client_id = largest_client()
+    roles = {'admin': None, 'employee': None, 'client': client_id}
+
+    print("Вход")
+    for name in ('admin', 'employee', f'client{client_id}'):
+        bench.measure(f'login/{name.rstrip("0123456789")}', lambda: login(name))
+
+    for user_status, scope_client in roles.items():
+        print(f"load_table: {user_status}")
+        for table in ROLE_TABLES[user_status]:
+            model = TABLES[table]
+            # Новый RowRenderer на каждый замер: загрузка подписей входит в время
+            bench.measure(f'load_table/{user_status}/{table}', lambda: len(
+                load_table(RowRenderer(), model, user_status, scope_client)[3]))
+        bench.measure(f'next_page/{user_status}/Transaction',
+                      lambda: next_page(renderer, Transaction, user_status, scope_client))
+
+    print("Сортировка и фильтры")
+    bench.measure('load_table/admin/Transaction/sort_amount_desc', lambda: len(
+        load_table(renderer, Transaction, 'admin', None, sort=('amount_money', True))[3]))
+    bench.measure('load_table/admin/Transaction/filter_amount', lambda: len(
+        load_table(renderer, Transaction, 'admin', None, filters={'amount_money': '>90000'})[3]))
+    bench.measure('load_table/admin/Bank_Account/filter_client', lambda: len(
+        load_table(renderer, Bank_Account, 'admin', None, filters={'client': str(client_id)})[3]))
+
+    # Последний месяц с данными: при секционировании читается одна секция
+    last = Transaction.select(fn.MAX(Transaction.date)).scalar()
+    if last is not None:
+        period = (month_start(last), add_months(month_start(last), 1))
+        print("Период: последний месяц")
+        for user_status, scope_client in (('admin', None), ('client', client_id)):
+            bench.measure(f'load_table/{user_status}/Transaction/last_month', lambda: len(
+                load_table(renderer, Transaction, user_status, scope_client, period=period)[3]))
+        bench.measure('load_table/admin/Transaction/last_month_desc', lambda: len(
+            load_table(renderer, Transaction, 'admin', None, sort=('date', True), period=period)[3]))
+
+    print("Клиентские выборки")
+    bench.measure('client_join/transactions_all', lambda: len(list(
+        scoped_query(Transaction, 'client', client_id).tuples())))
+
+    print("Экспорт")
+    bench.measure('export_csv/admin/Transaction', lambda: export(
+        stream_csv, Transaction, 'admin', None, export_rows), repeat=1)
+    bench.measure('export_xlsx/admin/Transaction', lambda: export(
+        lambda query, columns, path: stream_xlsx(query, columns, 'Transaction', path),
+        Transaction, 'admin', None, min(export_rows, 100000)), repeat=1)
+
+    print("Произвольный SQL")
+    bench.measure('custom_query/first_page', lambda: stream_query('SELECT * FROM "transaction"', 1000, 1))
+    bench.measure('custom_query/10_pages', lambda: stream_query('SELECT * FROM "transaction"', 1000, 10))
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip()
+    except OSError:
+        commit = None
+    server = db.execute_sql('SHOW server_version').fetchone()[0]
+    counts = dict(db.execute_sql(
+        "SELECT relname, reltuples::bigint FROM pg_class WHERE relname IN (%s)"
+        % ', '.join(['%s'] * len(TABLES)), [model._meta.table_name for model in TABLES.values()]
+    ).fetchall())
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'postgresql': server, 'row_counts': counts}
+
+
+def compare(report, previous_path):
+    with open(previous_path, encoding='utf-8') as previous_file:
+        previous = json.load(previous_file)['results']
+    print(f"\nСравнение с {previous_path} (медиана, мс):")
+    for name, result in report['results'].items():
+        if name in previous:
+            before, after = previous[name]['median_ms'], result['median_ms']
+            ratio = after / before if before else float('inf')
+            print(f"  {name:55} {before:10.2f} -> {after:10.2f}  x{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк основных сценариев приложения")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--export-rows', type=int, default=1000000, help="Строк в замерах экспорта")
+    parser.add_argument('--output', help="Файл отчёта JSON (по умолчанию benchmarks/results/<время>.json)")
+    parser.add_argument('--compare', help="Отчёт предыдущего прогона для сравнения")
+    args = parser.parse_args()
+
+    bench = Bench(args.repeat)
+    with db.connection_context():
+        report = {'created': datetime.now().isoformat(timespec='seconds'), 'environment': environment(),
+                  'repeat': args.repeat}
+        run(bench, args.export_rows)
+    report['results'] = bench.results
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d_%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as report_file:
+        json.dump(report, report_file, ensure_ascii=False, indent=2)
+    print(f"Отчёт: {output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
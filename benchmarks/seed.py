@@ -0,0 +1,256 @@
+# benchmarks/seed.py
+# Заполняет все таблицы models.py синтетическими, ссылочно согласованными
+# данными через COPY FROM STDIN. Строки генерируются потоком, поэтому память
+# не зависит от объёма. Пример:
+#   python benchmarks/seed.py --clients 100000 --accounts 1000000 --transactions 50000000 --truncate
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import (  # noqa: E402
+    Organization_Data, Personal_Data, Client, Employee, Deposit, Loan,
+    Card, Bank_Account, Transaction, Users, db
+)
+from partitions import ensure_partitions  # noqa: E402
+from summaries import refresh_summaries  # noqa: E402
+
+MODELS = [Users, Organization_Data, Personal_Data, Client, Employee, Deposit, Loan, Card, Bank_Account,
+          Transaction]
+
+# Пароль всех сгенерированных пользователей; хэш считается один раз
+SEED_PASSWORD = 'bench'
+NULL = '\\N'
+
+FIRST_NAMES = ['Иван', 'Пётр', 'Анна', 'Мария', 'Сергей', 'Ольга', 'Алексей', 'Елена', 'Дмитрий', 'Наталья']
+LAST_NAMES = ['Иванов', 'Петров', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов', 'Лебедев', 'Козлов', 'Новиков',
+              'Морозов']
+STREETS = ['Ленина', 'Мира', 'Садовая', 'Советская', 'Лесная', 'Школьная', 'Набережная', 'Центральная']
+POSITIONS = ['операционист', 'кредитный специалист', 'менеджер', 'кассир']
+ACCOUNT_TYPES = ['текущий', 'сберегательный', 'кредитный', 'карточный']
+LOAN_TERMS = ['6 месяцев', '12 месяцев', '24 месяца', '36 месяцев', '5 лет']
+REPAYMENT_PERIODS = ['ежемесячно', 'ежеквартально']
+
+START_DATE = date(2015, 1, 1)
+END_DATE = date(2024, 12, 31)
+
+
+class RowStream:
+    # Файлоподобный объект для copy_expert: отдаёт строки генератора в текстовом формате COPY
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ''
+
+    def read(self, size=-1):
+        size = size if size and size > 0 else 1 << 16
+        parts = [self.buffer]
+        length = len(self.buffer)
+        for row in self.rows:
+            line = '\t'.join(NULL if value is None else str(value) for value in row) + '\n'
+            parts.append(line)
+            length += len(line)
+            if length >= size:
+                break
+        data = ''.join(parts)
+        self.buffer = data[size:]
+        return data[:size]
+
+
+def copy(model, rows):
+    columns = ', '.join('"%s"' % field.column_name for field in model._meta.sorted_fields)
+    sql = 'COPY "%s" (%s) FROM STDIN' % (model._meta.table_name, columns)
+    with db.cursor() as cursor:
+        cursor.copy_expert(sql, RowStream(rows))
+    # Идентификаторы заданы явно - подтягиваем последовательность
+    table = model._meta.table_name
+    db.execute_sql(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), GREATEST(max(id), 1)) "
+                   f"FROM \"{table}\"")
+
+
+def random_date(rng, start=START_DATE, end=END_DATE):
+    return start + timedelta(days=rng.randrange((end - start).days + 1))
+
+
+def phone(rng):
+    return f"+7-9{rng.randrange(100):02d}-{rng.randrange(1000):03d}-{rng.randrange(100):02d}-{rng.randrange(100):02d}"
+
+
+def fcs(rng):
+    return f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}"
+
+
+class Scale:
+    def __init__(self, clients, accounts, transactions, employees, organization_share):
+        self.clients = clients
+        self.accounts = accounts
+        self.transactions = transactions
+        self.employees = employees
+        self.organizations = int(clients * organization_share)
+        self.people = clients - self.organizations
+        # Четверть счетов с картой, по десятой части - с кредитом и вкладом
+        self.cards = accounts // 4
+        self.loans = accounts // 10
+        self.deposits = accounts // 10
+        self.staff = 2  # admin и employee
+
+
+def users(rng, scale, password_hash):
+    # id клиента-пользователя совпадает с id клиента (так работает вход)
+    for pk in range(1, scale.clients + 1):
+        yield pk, f'client{pk}', password_hash, 'client'
+    yield scale.clients + 1, 'admin', password_hash, 'admin'
+    yield scale.clients + 2, 'employee', password_hash, 'employee'
+
+
+def organizations(rng, scale):
+    for pk in range(1, scale.organizations + 1):
+        yield (pk, f'ООО "Компания {pk}"', fcs(rng), f'org{pk}@example.com',
+               f'{rng.randrange(10 ** 10):010d}', f'{rng.randrange(10 ** 9):09d}')
+
+
+def people(rng, scale):
+    for pk in range(1, scale.people + 1):
+        yield (pk, fcs(rng), f'г. Москва, ул. {rng.choice(STREETS)}, д. {rng.randrange(1, 200)}', phone(rng),
+               f'person{pk}@example.com', f'{rng.randrange(10 ** 4):04d}', f'{rng.randrange(10 ** 6):06d}')
+
+
+def clients(rng, scale):
+    # Сначала физические лица, затем организации
+    for pk in range(1, scale.clients + 1):
+        registered = random_date(rng)
+        if pk <= scale.people:
+            yield pk, 'физическое лицо', 'активный', registered, pk, None
+        else:
+            yield pk, 'юридическое лицо', 'активный', registered, None, pk - scale.people
+
+
+def employees(rng, scale):
+    for pk in range(1, scale.employees + 1):
+        yield (pk, fcs(rng), phone(rng), f'employee{pk}@bank.example', random_date(rng),
+               rng.choice(POSITIONS), 'работает', f'{rng.uniform(1, 10):.2f}')
+
+
+def employee_id(rng, scale):
+    return rng.randrange(1, scale.employees + 1) if scale.employees else None
+
+
+def deposits(rng, scale):
+    for pk in range(1, scale.deposits + 1):
+        opened = random_date(rng)
+        yield (pk, rng.randrange(3, 16), rng.randrange(10, 10000) * 1000, opened,
+               opened + timedelta(days=365 * rng.randrange(1, 4)), employee_id(rng, scale))
+
+
+def loans(rng, scale):
+    for pk in range(1, scale.loans + 1):
+        opened = random_date(rng)
+        status = rng.choice(['активен', 'активен', 'активен', 'закрыт'])
+        yield (pk, f'{rng.uniform(5, 25):.2f}', f'{rng.randrange(50, 5000) * 1000:.2f}', rng.choice(LOAN_TERMS),
+               rng.choice(REPAYMENT_PERIODS), opened, opened + timedelta(days=365 * rng.randrange(1, 6)), status,
+               employee_id(rng, scale))
+
+
+def cards(rng, scale):
+    for pk in range(1, scale.cards + 1):
+        opened = random_date(rng)
+        number = f'{pk:016d}'
+        yield (pk, '-'.join(number[i:i + 4] for i in range(0, 16, 4)), f'{rng.randrange(1000):03d}',
+               f'{rng.uniform(0, 500000):.2f}', opened, opened + timedelta(days=365 * 4), 'активна',
+               employee_id(rng, scale))
+
+
+def accounts(rng, scale):
+    # У каждого клиента есть хотя бы один счёт, остальные распределены
+    # неравномерно (есть "крупные" клиенты). Карты и кредиты привязаны к первым
+    # счетам, вклады - к последним, по одному на счёт.
+    for pk in range(1, scale.accounts + 1):
+        if pk <= scale.clients:
+            client = pk
+        else:
+            rank = min(int(rng.paretovariate(1.2)), scale.clients)
+            client = rank * 7919 % scale.clients + 1
+        yield (pk, rng.choice(ACCOUNT_TYPES), random_date(rng),
+               pk if pk <= scale.cards else None,
+               pk if pk <= scale.loans else None,
+               pk - (scale.accounts - scale.deposits) if scale.accounts - pk < scale.deposits else None,
+               client)
+
+
+def transactions(rng, scale):
+    # Операции идут по времени, как при реальной вставке
+    days = (END_DATE - START_DATE).days + 1
+    for pk in range(1, scale.transactions + 1):
+        day = START_DATE + timedelta(days=(pk - 1) * days // scale.transactions)
+        source = rng.randrange(1, scale.accounts + 1)
+        target = rng.randrange(1, scale.accounts + 1)
+        yield (pk, day, f'{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}',
+               f'{rng.uniform(1, 100000):.2f}', source if rng.random() > 0.05 else None, target)
+
+
+def seed(scale, seed_value=0, truncate=False):
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(seed_value)
+    password_hash = generate_password_hash(SEED_PASSWORD)
+    steps = [
+        (Users, users(rng, scale, password_hash)),
+        (Organization_Data, organizations(rng, scale)),
+        (Personal_Data, people(rng, scale)),
+        (Client, clients(rng, scale)),
+        (Employee, employees(rng, scale)),
+        (Deposit, deposits(rng, scale)),
+        (Loan, loans(rng, scale)),
+        (Card, cards(rng, scale)),
+        (Bank_Account, accounts(rng, scale)),
+        (Transaction, transactions(rng, scale)),
+    ]
+    with db.connection_context():
+        db.create_tables(MODELS, safe=True)
+        if truncate:
+            db.execute_sql('TRUNCATE %s RESTART IDENTITY CASCADE'
+                           % ', '.join('"%s"' % model._meta.table_name for model in MODELS))
+        # После миграции 004 операции 2015-2024 годов нужно куда-то положить:
+        # секции создаются на весь период данных
+        ensure_partitions(first_month=START_DATE)
+        for model, rows in steps:
+            started = time.perf_counter()
+            table = model._meta.table_name
+            with db.atomic():
+                # Триггеры NOTIFY и сводок на время загрузки отключены, сводки
+                # пересчитываются целиком в конце
+                db.execute_sql('ALTER TABLE "%s" DISABLE TRIGGER USER' % table)
+                copy(model, rows)
+                db.execute_sql('ALTER TABLE "%s" ENABLE TRIGGER USER' % table)
+            db.execute_sql('ANALYZE "%s"' % table)
+            print(f"{model.__name__}: {time.perf_counter() - started:.1f} с")
+        if db.table_exists('client_summary'):
+            started = time.perf_counter()
+            refresh_summaries(full=True)
+            print(f"Сводки: {time.perf_counter() - started:.1f} с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заполнение базы синтетическими данными через COPY")
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--accounts', type=int, default=10000)
+    parser.add_argument('--transactions', type=int, default=100000)
+    parser.add_argument('--employees', type=int, default=100)
+    parser.add_argument('--organization-share', type=float, default=0.1,
+                        help="Доля клиентов-организаций")
+    parser.add_argument('--seed', type=int, default=0, help="Зерно генератора для воспроизводимости")
+    parser.add_argument('--truncate', action='store_true', help="Очистить таблицы перед загрузкой")
+    args = parser.parse_args()
+    if args.accounts < args.clients:
+        parser.error("Счетов должно быть не меньше, чем клиентов")
+
+    scale = Scale(args.clients, args.accounts, args.transactions, args.employees, args.organization_share)
+    seed(scale, args.seed, args.truncate)
+    print(f"Пароль пользователей client<N>, admin, employee: {SEED_PASSWORD}")
+
+
+if __name__ == '__main__':
+    main()
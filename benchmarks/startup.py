@@ -0,0 +1,83 @@
+# benchmarks/startup.py
+# Время запуска приложения: разбор `python -X importtime -c "import gui"` и
+# время до появления окна входа. Завершается с кодом 1, если медиана
+# превышает цель.
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGET_SECONDS = 1.0
+# Эти модули не должны загружаться до первого использования
+LAZY_MODULES = ('pandas', 'openpyxl', 'werkzeug', 'numpy')
+
+# Окно входа закрывается сразу после того, как Tk его отрисовал
+PROBE = """
+import time
+started = time.perf_counter()
+import gui
+imported = time.perf_counter()
+body = gui.LoginDialog.body
+
+def probe(self, master):
+    result = body(self, master)
+    def shown():
+        print(f"{imported - started:.4f} {time.perf_counter() - started:.4f}", flush=True)
+        self.cancel()
+    self.after_idle(shown)
+    return result
+
+gui.LoginDialog.body = probe
+gui.App()
+"""
+
+
+def import_times():
+    # Строки вида "import time:      1234 |      5678 | package.module"
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import gui'], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stderr
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.rstrip()[1:], int(self_us), int(cumulative_us)))
+    return modules
+
+
+def first_window():
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, capture_output=True, text=True,
+                            check=True).stdout
+    imported, shown = output.split()
+    return float(imported), float(shown)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер времени запуска до окна входа")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--target', type=float, default=TARGET_SECONDS, help="Цель, секунд до окна входа")
+    parser.add_argument('--top', type=int, default=15, help="Сколько самых медленных импортов показать")
+    args = parser.parse_args()
+
+    modules = import_times()
+    total = next(module[2] for module in modules if module[0] == 'gui')
+    print(f"Импорт gui: {total / 1e6:.3f} с")
+    for name, self_us, cumulative_us in sorted(modules, key=lambda module: -module[2])[:args.top]:
+        print(f"  {cumulative_us / 1000:9.1f} мс  {self_us / 1000:8.1f} мс  {name.strip()}")
+    eager = sorted({name.strip().split('.')[0] for name, _, _ in modules} & set(LAZY_MODULES))
+    if eager:
+        print("Загружаются при старте: " + ", ".join(eager))
+
+    runs = [first_window() for _ in range(args.runs)]
+    imported = statistics.median(run[0] for run in runs)
+    shown = statistics.median(run[1] for run in runs)
+    print(f"Медиана за {args.runs} запусков: импорт {imported:.3f} с, окно входа {shown:.3f} с "
+          f"(цель {args.target:.3f} с)")
+    return 0 if shown <= args.target and not eager else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
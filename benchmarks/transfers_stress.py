@@ -0,0 +1,142 @@
+# benchmarks/transfers_stress.py
+# Нагрузочная проверка transfers.py: несколько потоков одновременно переводят
+# деньги между небольшим набором «горячих» счетов (встречные переводы,
+# конкуренция за одни и те же строки). После прогона проверяется, что сумма
+# балансов карт не изменилась и баланс каждой карты сходится с созданными
+# операциями. Пример на базе, заполненной benchmarks/seed.py:
+#   python benchmarks/transfers_stress.py --threads 8 --transfers 5000 --batch 500
+# Операции остаются в базе - запускать только на тестовой.
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from peewee import fn  # noqa: E402
+
+from models import Bank_Account, Card, Transaction, db  # noqa: E402
+from transfers import TransferError, transfer, transfer_batch  # noqa: E402
+
+
+def hot_accounts(count):
+    # Счета с картами и их карты
+    return dict(Bank_Account
+                .select(Bank_Account.id, Bank_Account.card)
+                .where(Bank_Account.card.is_null(False))
+                .order_by(Bank_Account.id)
+                .limit(count)
+                .tuples())
+
+
+def card_balances(card_ids):
+    return dict(Card.select(Card.id, Card.card_amount).where(Card.id.in_(card_ids)).tuples())
+
+
+def random_transfers(rng, accounts, count, max_amount):
+    for _ in range(count):
+        source, target = rng.sample(accounts, 2)
+        yield source, target, Decimal(rng.randint(1, max_amount * 100)) / 100
+
+
+class Worker(threading.Thread):
+    def __init__(self, number, accounts, args):
+        super().__init__(name=f'transfer-{number}')
+        self.rng = random.Random(args.seed + number)
+        self.accounts = accounts
+        self.args = args
+        self.done = 0
+        self.rejected = 0
+        self.retries = 0
+        self.error = None
+
+    def run(self):
+        transfers = random_transfers(self.rng, self.accounts, self.args.transfers, self.args.max_amount)
+        try:
+            with db.connection_context():
+                if self.args.batch:
+                    result = transfer_batch(transfers, self.args.batch)
+                    self.done = len(result.transaction_ids)
+                    self.rejected = len(result.rejected)
+                    self.retries = result.retries
+                else:
+                    for source, target, amount in transfers:
+                        try:
+                            transfer(source, target, amount)
+                            self.done += 1
+                        except TransferError:
+                            self.rejected += 1
+        except Exception as e:
+            self.error = e
+
+
+def check(accounts, before, first_id):
+    # Ожидаемый баланс карты = начальный + зачисления - списания по новым операциям
+    expected = dict(before)
+    for column, sign in ((Transaction.bank_account_to, 1), (Transaction.bank_account_from, -1)):
+        moved = (Transaction
+                 .select(column, fn.SUM(Transaction.amount_money))
+                 .where((Transaction.id > first_id) & column.in_(list(accounts)))
+                 .group_by(column)
+                 .tuples())
+        for account, amount in moved:
+            expected[accounts[account]] += sign * Decimal(amount)
+    after = card_balances(list(before))
+    drift = {card: (expected[card], after[card]) for card in before if expected[card] != after[card]}
+    negative = [card for card, balance in after.items() if balance < 0]
+    return sum(before.values()), sum(after.values()), drift, negative
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочная проверка переводов")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--transfers', type=int, default=2000, help="Переводов на поток")
+    parser.add_argument('--accounts', type=int, default=20, help="Число горячих счетов")
+    parser.add_argument('--batch', type=int, default=0, help="Размер пакета transfer_batch (0 - по одному)")
+    parser.add_argument('--max-amount', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with db.connection_context():
+        accounts = hot_accounts(args.accounts)
+        if len(accounts) < 2:
+            print("Нужно хотя бы два счёта с картами: заполните базу benchmarks/seed.py")
+            return 1
+        first_id = Transaction.select(fn.MAX(Transaction.id)).scalar() or 0
+        before = card_balances(list(set(accounts.values())))
+
+    workers = [Worker(number, list(accounts), args) for number in range(args.threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    done = sum(worker.done for worker in workers)
+    print(f"Потоков: {args.threads}, счетов: {len(accounts)}, пакет: {args.batch or 1}")
+    print(f"Проведено: {done}, отклонено: {sum(w.rejected for w in workers)}, "
+          f"повторов: {sum(w.retries for w in workers)}, {done / elapsed:.0f} переводов/с")
+    errors = [worker.error for worker in workers if worker.error is not None]
+    for error in errors:
+        print(f"Ошибка в потоке: {error!r}")
+
+    with db.connection_context():
+        total_before, total_after, drift, negative = check(accounts, before, first_id)
+    print(f"Сумма балансов: {total_before} -> {total_after}")
+    for card, (expected, actual) in sorted(drift.items()):
+        print(f"  карта {card}: ожидалось {expected}, в базе {actual}")
+    if negative:
+        print(f"  отрицательный баланс у карт: {negative}")
+    if errors or drift or negative or total_before != total_after:
+        print("ПРОВЕРКА НЕ ПРОЙДЕНА")
+        return 1
+    print("Балансы сходятся.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
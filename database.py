@@ -1,9 +1,97 @@
-import peewee
-
-db = peewee.PostgresqlDatabase(
-    'bank',
-    user = 'postgres',
-    password = 123,
-    host = '127.0.0.1',
-    port = '5432'
+import atexit
+import configparser
+import os
+import time
+
+from playhouse.pool import PooledPostgresqlDatabase
+from playhouse.shortcuts import ReconnectMixin
+
+import instrumentation
+from instrumentation import InstrumentedMixin
+
+# Настройки читаются из database.ini (секция [database]) и переопределяются
+# переменными окружения BANK_DB_<ПАРАМЕТР>, например BANK_DB_HOST
+CONFIG_FILE = os.environ.get(
+    'BANK_DB_CONFIG',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.ini')
 )
+
+DEFAULTS = {
+    'name': 'bank',
+    'user': 'postgres',
+    'password': '123',
+    'host': '127.0.0.1',
+    'port': '5432',
+    'max_connections': '20',
+    'stale_timeout': '300',
+    'timeout': '10',
+    'health_check_interval': '30',
+    'slow_query_ms': '500',
+    'slow_query_log': '',
+    'metrics_file': '',
+}
+
+
+def load_settings(config_file=CONFIG_FILE):
+    settings = dict(DEFAULTS)
+    parser = configparser.ConfigParser()
+    if parser.read(config_file, encoding='utf-8') and parser.has_section('database'):
+        settings.update(parser['database'])
+    for key in settings:
+        value = os.environ.get('BANK_DB_' + key.upper())
+        if value is not None:
+            settings[key] = value
+    return settings
+
+
+class BankDatabase(InstrumentedMixin, ReconnectMixin, PooledPostgresqlDatabase):
+    # Пул соединений с проверкой живости: соединение, простоявшее в пуле
+    # дольше health_check_interval, перед выдачей проверяется запросом SELECT 1.
+    # ReconnectMixin прозрачно переподключается, если сервер разорвал соединение.
+    # InstrumentedMixin замеряет каждый запрос (см. instrumentation.py).
+    def __init__(self, *args, health_check_interval=30, **kwargs):
+        self.health_check_interval = health_check_interval
+        self._last_checked = {}
+        super().__init__(*args, **kwargs)
+
+    def _is_closed(self, conn):
+        if super()._is_closed(conn):
+            self._last_checked.pop(id(conn), None)
+            return True
+        now = time.time()
+        if now - self._last_checked.get(id(conn), 0) < self.health_check_interval:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception:
+            self._last_checked.pop(id(conn), None)
+            return True
+        self._last_checked[id(conn)] = now
+        return False
+
+    def _close(self, conn, close_conn=False):
+        # Закрытое соединение забывается, иначе словарь растёт, а новое соединение
+        # с тем же id() унаследовало бы чужое время проверки
+        if close_conn:
+            self._last_checked.pop(id(conn), None)
+        super()._close(conn, close_conn)
+
+
+settings = load_settings()
+
+db = BankDatabase(
+    settings['name'],
+    user=settings['user'],
+    password=settings['password'],
+    host=settings['host'],
+    port=settings['port'],
+    max_connections=int(settings['max_connections']),
+    stale_timeout=int(settings['stale_timeout']),
+    timeout=int(settings['timeout']),
+    health_check_interval=int(settings['health_check_interval'])
+)
+
+instrumentation.configure(int(settings['slow_query_ms']), settings['slow_query_log'] or None)
+if settings['metrics_file']:
+    atexit.register(instrumentation.metrics.write, settings['metrics_file'])
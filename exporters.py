@@ -0,0 +1,191 @@
+# exporters.py
+import csv
+import multiprocessing
+import os
+import pickle
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from models import db
+from queries import TABLES, scoped_query, query_columns, sort_order, ordering
+
+CHUNK_SIZE = 5000
+
+# Предел строк на листе Excel (вместе со строкой заголовков)
+XLSX_MAX_ROWS = 1048576
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def iterate_chunks(query, chunk_size=CHUNK_SIZE):
+    # Именованный (серверный) курсор: строки приходят порциями по chunk_size,
+    # память не зависит от размера таблицы. Курсор живёт внутри транзакции.
+    sql, params = query.sql()
+    with db.atomic():
+        cursor = db.connection().cursor(name='export_' + uuid.uuid4().hex)
+        cursor.itersize = chunk_size
+        try:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+
+def header(columns):
+    return [col.replace('_', ' ').capitalize() for col in columns]
+
+
+def stream_csv(query, columns, file_path, progress=None, cancel_event=None, chunk_size=CHUNK_SIZE):
+    written = 0
+    try:
+        with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(header(columns))
+            for rows in iterate_chunks(query, chunk_size):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ExportCancelled()
+                writer.writerows(rows)
+                written += len(rows)
+                if progress is not None:
+                    progress(written)
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return written
+
+
+class SheetWriter:
+    # Пишет строки в лист write-only книги; при достижении предела Excel
+    # продолжает на новом листе "<имя> (2)", "<имя> (3)" и т.д.
+    def __init__(self, workbook, title, columns):
+        self.workbook = workbook
+        self.title = title
+        self.header = header(columns)
+        self.sheet = None
+        self.sheet_rows = 0
+        self.parts = 0
+
+    def new_sheet(self):
+        self.parts += 1
+        title = self.title if self.parts == 1 else f"{self.title} ({self.parts})"
+        self.sheet = self.workbook.create_sheet(title[:31])
+        self.sheet.append(self.header)
+        self.sheet_rows = 1
+
+    def append(self, rows):
+        for row in rows:
+            if self.sheet is None or self.sheet_rows >= XLSX_MAX_ROWS:
+                self.new_sheet()
+            self.sheet.append(row)
+            self.sheet_rows += 1
+
+    def close(self):
+        if self.sheet is None:
+            self.new_sheet()
+
+
+def write_xlsx(file_path, sheets, progress=None, cancel_event=None):
+    # sheets - последовательность (title, columns, chunks)
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    written = 0
+    try:
+        for title, columns, chunks in sheets:
+            writer = SheetWriter(workbook, title, columns)
+            for rows in chunks:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ExportCancelled()
+                writer.append(rows)
+                written += len(rows)
+                if progress is not None:
+                    progress(written)
+            writer.close()
+        workbook.save(file_path)
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return written
+
+
+def stream_xlsx(query, columns, title, file_path, progress=None, cancel_event=None, chunk_size=CHUNK_SIZE):
+    sheets = [(title, columns, iterate_chunks(query, chunk_size))]
+    return write_xlsx(file_path, sheets, progress, cancel_event)
+
+
+def stage_table(table, user_status, client_id, chunk_size=CHUNK_SIZE, cancel_event=None):
+    # Выполняется в отдельном процессе: выгружает таблицу через серверный курсор
+    # во временный файл порциями pickle, сохраняя типы значений. cancel_event -
+    # событие Manager, общее с основным процессом; проверяется между порциями
+    model = TABLES[table]
+    query = scoped_query(model, user_status, client_id)
+    if query is None:
+        return table, [field.name for field in model._meta.sorted_fields], None
+    query = query.order_by(*ordering(sort_order(model)))
+    fd, path = tempfile.mkstemp(prefix=f'export_{table}_', suffix='.pickle')
+    try:
+        with db.connection_context(), os.fdopen(fd, 'wb') as stage:
+            for rows in iterate_chunks(query, chunk_size):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ExportCancelled()
+                pickle.dump(rows, stage, protocol=pickle.HIGHEST_PROTOCOL)
+    except BaseException:
+        os.remove(path)
+        raise
+    return table, query_columns(query), path
+
+
+def staged_chunks(path):
+    if path is None:
+        return
+    with open(path, 'rb') as stage:
+        while True:
+            try:
+                yield pickle.load(stage)
+            except EOFError:
+                break
+
+
+def export_workbook(tables, user_status, client_id, file_path, progress=None, cancel_event=None,
+                    max_workers=None):
+    # Несколько таблиц в одной книге: выборка из базы идёт параллельно в
+    # процессах (у каждого свои соединения), листы пишутся по мере готовности
+    # таблиц в исходном порядке
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager, \
+            ProcessPoolExecutor(max_workers=max_workers or min(len(tables), os.cpu_count() or 1),
+                                mp_context=context) as pool:
+        stop = manager.Event()
+        futures = [pool.submit(stage_table, table, user_status, client_id, cancel_event=stop) for table in tables]
+
+        def sheets():
+            for future in futures:
+                # Пока таблица выгружается, отмена проверяется каждые 0.1 с
+                while not wait([future], timeout=0.1).done:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise ExportCancelled()
+                table, columns, path = future.result()
+                yield table, columns, staged_chunks(path)
+
+        try:
+            return write_xlsx(file_path, sheets(), progress, cancel_event)
+        finally:
+            # Останавливаем процессы на следующей порции, дожидаемся их и
+            # удаляем временные файлы (отменённые процессы удаляют свои сами)
+            stop.set()
+            for future in futures:
+                future.cancel()
+            for future in futures:
+                if not future.cancelled() and future.exception() is None:
+                    path = future.result()[2]
+                    if path is not None and os.path.exists(path):
+                        os.remove(path)
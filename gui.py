@@ -2,20 +2,53 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, scrolledtext, filedialog
 from typing import List, Optional
-import re
-from datetime import datetime
-import csv
-import pandas as pd
+import threading
+import time
+from datetime import date
 import peewee
-from werkzeug.security import generate_password_hash, check_password_hash
 
 from models import (
     Organization_Data, Personal_Data, Client, Employee, Deposit, Loan,
     Card, Bank_Account, Transaction, Users, db
 )
+from partitions import add_months, ensure_partitions, month_start
+from queries import (
+    PAGE_SIZE, scoped_query, query_columns, fetch_page, estimate_count, sort_order, row_cursor,
+    apply_filters, ordering, TABLES
+)
+from exporters import ExportCancelled, stream_csv, stream_xlsx, export_workbook
+from importer import import_file
+from validation import ValidationError, validate_record
+from sql_console import (
+    DEFAULT_ROW_LIMIT, DEFAULT_TIMEOUT, QuerySession, cancel_backend, is_cancelled, plan_tree
+)
+import query_history
+from rendering import RowRenderer
+from result_cache import ResultCache, query_tables
+from live_updates import CHANGES_CHANNEL, ChangeListener, client_channel
+from worker import QueryExecutor
+from transfers import TransferError, parse_amount, transfer
+from amortization import ANNUITY, KINDS, ScheduleError, loan_schedule
+from summaries import ACCOUNT_COLUMNS, CLIENT_COLUMNS, account_summaries, client_summaries, refresh_summaries
+from instrumentation import metrics, screen
+
+# Максимальное число строк, одновременно хранимых в Treeview
+WINDOW_SIZE = PAGE_SIZE * 3
+# Период просмотра операций: число последних календарных месяцев (None - всё время).
+# Ограничение по дате позволяет PostgreSQL читать только нужные секции transaction.
+PERIODS = {
+    'Всё время': None,
+    'Текущий месяц': 1,
+    '3 месяца': 3,
+    '12 месяцев': 12,
+}
+# Больше изменений открытой таблицы за одну пачку - перечитываем страницу целиком
+LIVE_RELOAD_THRESHOLD = 50
 
 class AddEditDialog(simpledialog.Dialog):
-    def __init__(self, parent, title, fields: List[str], initial_data: Optional[dict] = None, user_status: str = 'admin'):
+    def __init__(self, parent, title, fields: List[str], initial_data: Optional[dict] = None, user_status: str = 'admin',
+                 model=None):
+        self.model = model
         self.fields = fields
         self.initial_data = initial_data
         self.user_status = user_status
@@ -56,55 +89,20 @@ class AddEditDialog(simpledialog.Dialog):
         if not plain_password:
             messagebox.showerror("Ошибка ввода", "Поле пароля не может быть пустым.")
             return
+        from werkzeug.security import generate_password_hash
+
         hashed_password = generate_password_hash(plain_password)
         self.entries['password'].delete(0, tk.END)
         self.entries['password'].insert(0, hashed_password)
         messagebox.showinfo("Успех", "Пароль захэширован.")
 
     def validate(self):
-        data = {}
-        for field, entry in self.entries.items():
-            value = entry.get().strip()
-            if value == '':
-                data[field] = None
-                continue
-
-            if field == 'status' and self.user_status == 'employee' and (value == 'admin' or value == 'employee'):
-                messagebox.showerror("Ошибка ввода", "Недостаточный уровень доступа")
-                return False
-            try:
-                if field in ['date_of_registration', 'opening_date', 'closing_date', 'date', 'date_of_employment',
-                             'validity_period']:
-                    try:
-                        datetime.strptime(value, '%Y-%m-%d')
-                    except ValueError:
-                        messagebox.showerror("Ошибка ввода", "Неверный формат даты. Используйте YYYY-MM-DD.")
-                        return False
-                if field.endswith('_id'):
-                    if not value.isdigit():
-                        raise ValueError(f"Поле {field} должно содержать только цифры.")
-                if field == 'card_number':
-                    if not re.fullmatch(r'\d{4}-\d{4}-\d{4}-\d{4}', value):
-                        raise ValueError("Номер карты должен быть в формате xxxx-xxxx-xxxx-xxxx.")
-                if field in ['security_code', 'card_amount', 'interest_rate', 'deposit_amount', 'inn', 'kpp',
-                             'loan_amount']:
-                    if not re.fullmatch(r'\d+(\.\d+)?', value):
-                        raise ValueError(f"Поле {field} должно содержать только цифры.")
-                if field == 'telephone_number':
-                    if not re.fullmatch(r'\+7-\d{3}-\d{3}-\d{2}-\d{2}', value):
-                        raise ValueError("Номер телефона должен быть в формате +7-XXX-XXX-XX-XX.")
-                if field == 'passport_serial':
-                    if not re.fullmatch(r'\d{4}', value):
-                        raise ValueError("Серия паспорта должна содержать 4 цифры.")
-                if field == 'passport_number':
-                    if not re.fullmatch(r'\d{6}', value):
-                        raise ValueError("Номер паспорта должен содержать 6 цифр.")
-            except ValueError as ve:
-                messagebox.showerror("Ошибка ввода", str(ve))
-                return False
-            data[field] = value
-
-        self.result = data
+        data = {field: entry.get() for field, entry in self.entries.items()}
+        try:
+            self.result = validate_record(self.model, data, self.user_status)
+        except ValidationError as ve:
+            messagebox.showerror("Ошибка ввода", str(ve))
+            return False
         return True
 
 class LoginDialog(simpledialog.Dialog):
@@ -127,6 +125,8 @@ class LoginDialog(simpledialog.Dialog):
         return self.login_entry
 
     def validate(self):
+        from werkzeug.security import check_password_hash
+
         self.login = self.login_entry.get().strip()
         self.password = self.password_entry.get().strip()
 
@@ -135,11 +135,15 @@ class LoginDialog(simpledialog.Dialog):
             return False
 
         try:
-            user = Users.get(Users.login == self.login)
-            if check_password_hash(user.password, self.password):
+            with screen('login'):
+                with db.connection_context():
+                    user = Users.get(Users.login == self.login)
+                valid = check_password_hash(user.password, self.password)
+            if valid:
                 self.user = user
                 if user.status == 'client':
-                    client = Client.get(Client.id == user.id)
+                    with db.connection_context():
+                        client = Client.get(Client.id == user.id)
                     self.client_id = client.id
                     self.result = {'user': user, 'client_id': self.client_id}
                 else:
@@ -154,14 +158,268 @@ class LoginDialog(simpledialog.Dialog):
         except Client.DoesNotExist:
             messagebox.showerror("Ошибка", "Запись клиента не найдена.")
             return False
+        except peewee.OperationalError as e:
+            messagebox.showerror("Ошибка подключения", f"Не удалось подключиться к базе данных: {e}")
+            return False
+
+class TableSelectDialog(simpledialog.Dialog):
+    def __init__(self, parent, title, tables: List[str], selected: List[str]):
+        self.tables = tables
+        self.selected = selected
+        super().__init__(parent, title)
+
+    def body(self, master):
+        tk.Label(master, text="Выберите таблицы для отчёта:").pack(anchor='w', padx=5, pady=5)
+        self.listbox = tk.Listbox(master, selectmode='multiple', height=len(self.tables), exportselection=False)
+        for idx, table in enumerate(self.tables):
+            self.listbox.insert(tk.END, table)
+            if table in self.selected:
+                self.listbox.selection_set(idx)
+        self.listbox.pack(fill='both', padx=5, pady=5)
+        return self.listbox
+
+    def validate(self):
+        selected = [self.tables[idx] for idx in self.listbox.curselection()]
+        if not selected:
+            messagebox.showerror("Ошибка ввода", "Выберите хотя бы одну таблицу.")
+            return False
+        self.result = selected
+        return True
+
+
+class TransferDialog(simpledialog.Dialog):
+    def __init__(self, parent, source=None):
+        self.source = source
+        super().__init__(parent, title="Перевод")
+
+    def body(self, master):
+        self.entries = {}
+        labels = [('source', "Счёт отправителя:"), ('target', "Счёт получателя:"), ('amount', "Сумма:")]
+        for idx, (name, text) in enumerate(labels):
+            tk.Label(master, text=text).grid(row=idx, column=0, padx=5, pady=5, sticky='e')
+            entry = tk.Entry(master)
+            entry.grid(row=idx, column=1, padx=5, pady=5, sticky='w')
+            self.entries[name] = entry
+        if self.source is not None:
+            self.entries['source'].insert(0, str(self.source))
+        tk.Label(master, text="Пустой счёт - внесение или снятие наличных").grid(
+            row=len(labels), column=0, columnspan=2, padx=5, pady=5)
+        return self.entries['source']
+
+    def validate(self):
+        accounts = []
+        for name in ('source', 'target'):
+            value = self.entries[name].get().strip()
+            if value and not value.isdigit():
+                messagebox.showerror("Ошибка ввода", "Номер счёта должен быть целым числом.")
+                return False
+            accounts.append(int(value) if value else None)
+        if accounts == [None, None]:
+            messagebox.showerror("Ошибка ввода", "Укажите хотя бы один счёт.")
+            return False
+        try:
+            amount = parse_amount(self.entries['amount'].get().strip())
+        except TransferError as te:
+            messagebox.showerror("Ошибка ввода", str(te))
+            return False
+        self.result = (accounts[0], accounts[1], amount)
+        return True
+
+
+class ProgressDialog(tk.Toplevel):
+    # Окно прогресса длительной операции. Счётчик done обновляется из рабочего
+    # потока, окно перечитывает его по таймеру в потоке Tk.
+    def __init__(self, parent, title):
+        super().__init__(parent)
+        self.title(title)
+        self.transient(parent)
+        self.resizable(False, False)
+        self.cancel_event = threading.Event()
+        self.done = 0
+        self.total = None
+        self.task = None
+
+        self.label = tk.Label(self, text="Подготовка...")
+        self.label.pack(padx=10, pady=(10, 5))
+        self.bar = ttk.Progressbar(self, length=300, mode='determinate')
+        self.bar.pack(padx=10, pady=5)
+        tk.Button(self, text="Отмена", command=self.cancel).pack(pady=(5, 10))
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+        self.refresh_id = self.after(200, self.refresh)
+
+    def update_progress(self, done):
+        self.done = done
+
+    def refresh(self):
+        if self.task is not None and self.task.cancelled:
+            self.close()
+            return
+        if self.total:
+            self.bar.config(maximum=max(self.total, self.done), value=self.done)
+            self.label.config(text=f"Обработано строк: {self.done} из ~{self.total}")
+        else:
+            self.label.config(text=f"Обработано строк: {self.done}")
+        self.refresh_id = self.after(200, self.refresh)
+
+    def cancel(self):
+        # Прерывает и текущий запрос на сервере, и цикл записи
+        self.cancel_event.set()
+        if self.task is not None:
+            self.task.cancel()
+        self.label.config(text="Отмена...")
+
+    def close(self):
+        self.after_cancel(self.refresh_id)
+        self.destroy()
+
+
+class PlanWindow(tk.Toplevel):
+    # Дерево плана EXPLAIN ANALYZE; самые дорогие по собственному времени узлы подсвечены
+    def __init__(self, parent, explained):
+        super().__init__(parent)
+        self.title("План запроса")
+        self.geometry("1000x500")
+
+        root, hot = plan_tree(explained)
+        tk.Label(self, text=f"Планирование: {explained.get('Planning Time', 0):.2f} мс, "
+                            f"выполнение: {explained.get('Execution Time', 0):.2f} мс").pack(anchor='w', padx=10, pady=5)
+
+        columns = ['self_time', 'total_time', 'rows', 'plan_rows', 'shared_hit', 'shared_read']
+        headings = ['Собств. время, мс', 'Время, мс', 'Строк', 'Строк (оценка)', 'Буферы hit', 'Буферы read']
+        tree = ttk.Treeview(self, columns=columns)
+        tree.heading('#0', text='Узел')
+        tree.column('#0', width=350)
+        for col, heading in zip(columns, headings):
+            tree.heading(col, text=heading)
+            tree.column(col, width=100, anchor='center')
+        tree.tag_configure('hot', background='#f4b6b6')
+        tree.pack(expand=1, fill='both', padx=10, pady=5)
+
+        def insert(node, parent=''):
+            item = tree.insert(parent, 'end', text=node.label, open=True,
+                               tags=('hot',) if id(node) in hot else (),
+                               values=[f"{node.self_time:.3f}", f"{node.total_time:.3f}", node.rows,
+                                       node.plan_rows, node.shared_hit, node.shared_read])
+            for child in node.children:
+                insert(child, item)
+
+        insert(root)
+
+
+class ScheduleWindow(tk.Toplevel):
+    # График платежей по кредиту; вид графика переключается без обращения к базе
+    def __init__(self, parent, loan):
+        super().__init__(parent)
+        self.title(f"График платежей по кредиту {loan.id}")
+        self.geometry("900x500")
+        self.loan = loan
+
+        options = tk.Frame(self)
+        options.pack(fill='x', padx=10, pady=5)
+        tk.Label(options, text=f"Сумма: {loan.loan_amount}, ставка: {loan.interest_rate}%, "
+                               f"срок: {loan.loan_term}, погашение: {loan.repayment_period}").pack(side='left')
+        self.kind_var = tk.StringVar(value=KINDS[ANNUITY])
+        kind_combo = ttk.Combobox(options, values=list(KINDS.values()), state='readonly', textvariable=self.kind_var)
+        kind_combo.bind("<<ComboboxSelected>>", lambda event: self.show())
+        kind_combo.pack(side='right')
+
+        columns = ['number', 'date', 'payment', 'principal', 'interest', 'balance']
+        headings = ['№', 'Дата', 'Платёж', 'Основной долг', 'Проценты', 'Остаток']
+        self.tree = ttk.Treeview(self, columns=columns, show='headings')
+        for col, heading in zip(columns, headings):
+            self.tree.heading(col, text=heading)
+            self.tree.column(col, width=60 if col == 'number' else 140, anchor='center')
+        self.tree.pack(expand=1, fill='both', padx=10, pady=5)
+        self.summary = tk.Label(self, text="")
+        self.summary.pack(anchor='w', padx=10, pady=5)
+
+        self.show()
+
+    def show(self):
+        kind = next(key for key, label in KINDS.items() if label == self.kind_var.get())
+        try:
+            plan = loan_schedule(self.loan, kind)
+        except ScheduleError as se:
+            messagebox.showerror("Ошибка графика", str(se), parent=self)
+            self.destroy()
+            return
+        self.tree.delete(*self.tree.get_children())
+        for number, day, payment, principal, interest, balance in plan.rows(self.loan.opening_date):
+            self.tree.insert('', 'end', values=[number, day, f"{payment:.2f}", f"{principal:.2f}",
+                                                f"{interest:.2f}", f"{balance:.2f}"])
+        self.summary.config(text=f"Платежей: {len(plan)}, всего выплат: {plan.payment.sum():.2f}, "
+                                 f"переплата: {plan.total_interest:.2f}")
+
+
+class HistoryWindow(tk.Toplevel):
+    def __init__(self, parent, on_select):
+        super().__init__(parent)
+        self.title("История запросов")
+        self.geometry("1000x400")
+        self.on_select = on_select
+        self.entries = []
+
+        columns = ['time', 'mode', 'duration', 'rows', 'query']
+        headings = ['Время', 'Режим', 'Длительность, с', 'Строк', 'Запрос']
+        self.tree = ttk.Treeview(self, columns=columns, show='headings')
+        for col, heading in zip(columns, headings):
+            self.tree.heading(col, text=heading)
+            self.tree.column(col, width=500 if col == 'query' else 110, anchor='w' if col == 'query' else 'center')
+        self.tree.tag_configure('error', foreground='#b00000')
+        self.tree.pack(expand=1, fill='both', padx=10, pady=5)
+        self.tree.bind('<Double-1>', lambda event: self.use_query())
+
+        button_frame = tk.Frame(self)
+        button_frame.pack(pady=5)
+        tk.Button(button_frame, text="Вставить запрос", command=self.use_query).pack(side='left', padx=5)
+        tk.Button(button_frame, text="Запуски этого запроса", command=self.show_same).pack(side='left', padx=5)
+        tk.Button(button_frame, text="Все запросы", command=lambda: self.show()).pack(side='left', padx=5)
+
+        self.show()
+
+    def show(self, query=None):
+        self.entries = query_history.load(query=query)
+        self.tree.delete(*self.tree.get_children())
+        for idx, entry in enumerate(self.entries):
+            text = ' '.join(entry['query'].split())
+            self.tree.insert('', 'end', iid=str(idx), tags=('error',) if entry.get('error') else (),
+                             values=[entry['time'], entry['mode'], entry['duration'],
+                                     entry['rows'] if entry['rows'] is not None else '', text[:200]])
+
+    def selected_entry(self):
+        selected = self.tree.selection()
+        return self.entries[int(selected[0])] if selected else None
+
+    def use_query(self):
+        entry = self.selected_entry()
+        if entry:
+            self.on_select(entry['query'])
+
+    def show_same(self):
+        entry = self.selected_entry()
+        if entry:
+            self.show(entry['query'])
+
+
+def warm_up():
+    # Пока открыто окно входа: первое соединение пула и модуль проверки пароля
+    # готовятся в фоне, чтобы окно появлялось сразу, а вход не ждал их
+    from werkzeug import security  # noqa: F401
+
+    try:
+        db.connect(reuse_if_open=True)
+        db.close()
+    except peewee.OperationalError:
+        pass  # ошибку подключения пользователь увидит при входе
+
 
 class App(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("Банковское Приложение")
         self.geometry("1200x700")
-        db.connect()
 
+        threading.Thread(target=warm_up, name='db-warm-up', daemon=True).start()
         user_info = self.show_login()
 
         if not user_info:
@@ -170,12 +428,26 @@ class App(tk.Tk):
 
         self.user = user_info['user']
         self.client_id = user_info.get('client_id')
+        self.renderer = RowRenderer()
+        self.result_cache = ResultCache()
+
+        self.status_bar = tk.Frame(self)
+        self.status_bar.pack(side='bottom', fill='x')
+        self.cancel_button = tk.Button(self.status_bar, text="Отмена", command=self.cancel_tasks, state='disabled')
+        self.cancel_button.pack(side='right', padx=5, pady=2)
+        self.busy_bar = ttk.Progressbar(self.status_bar, mode='indeterminate', length=150)
+        self.busy_bar.pack(side='right', padx=5, pady=2)
+
+        self.executors = []
+        self.executor = QueryExecutor(self, on_busy_change=self.set_busy)
+        self.executors.append(self.executor)
 
         self.notebook = ttk.Notebook(self)
         self.notebook.pack(expand=1, fill='both')
 
         self.tables_tab = ttk.Frame(self.notebook)
         self.custom_query_tab = ttk.Frame(self.notebook)
+        self.dashboard_tab = ttk.Frame(self.notebook)
 
         self.available_tables = []
 
@@ -198,13 +470,32 @@ class App(tk.Tk):
                 'Card', 'Bank_Account', 'Transaction'
             ]
             self.notebook.add(self.tables_tab, text='Мои Данные')
+        if self.user.status != 'client' or self.client_id:
+            self.notebook.add(self.dashboard_tab, text='Сводка')
 
         self.create_tables_tab()
+        self.create_dashboard_tab()
         if self.user.status == 'admin':
             self.create_custom_query_tab()
 
         self.create_menu()
 
+        # Секции transaction на ближайшие месяцы создаются заранее (без миграции 004 - ничего);
+        # это DDL, поэтому только в сеансе администратора
+        if self.user.status == 'admin':
+            self.executor.submit(ensure_partitions, on_error=self.on_partitions_error)
+
+        if self.user.status != 'client':
+            self.listener = ChangeListener(self, [CHANGES_CHANNEL], self.on_remote_changes)
+        elif self.client_id:
+            self.listener = ChangeListener(self, [client_channel(self.client_id)], self.on_remote_changes)
+        else:
+            self.listener = None
+
+    def on_partitions_error(self, error):
+        # Без новых секций операции копятся в секции по умолчанию - об этом надо знать
+        messagebox.showwarning("Секции transaction", f"Не удалось создать секции на ближайшие месяцы: {error}")
+
     def show_login(self):
         dialog = LoginDialog(self)
         return dialog.result
@@ -214,13 +505,122 @@ class App(tk.Tk):
         self.config(menu=menu_bar)
 
         user_menu = tk.Menu(menu_bar, tearoff=0)
+        if self.user.status == 'admin':
+            user_menu.add_command(label="Сохранить метрики...", command=self.save_metrics)
         user_menu.add_command(label="Выход", command=self.logout)
         menu_bar.add_cascade(label=f"Добро пожаловать, {self.user.login}", menu=user_menu)
 
+    def save_metrics(self):
+        file_path = filedialog.asksaveasfilename(defaultextension='.prom',
+                                                 filetypes=[("Prometheus", '*.prom'), ("JSON", '*.json')])
+        if not file_path:
+            return
+        try:
+            metrics.write(file_path)
+        except OSError as e:
+            messagebox.showerror("Ошибка", str(e))
+
     def logout(self):
+        if self.listener is not None:
+            self.listener.stop()
+        for executor in self.executors:
+            executor.shutdown()
         self.destroy()
         db.close()
 
+    def set_busy(self, busy=None):
+        if any(executor.pending for executor in self.executors):
+            self.busy_bar.start(10)
+            self.cancel_button.config(state='normal')
+            self.config(cursor='watch')
+        else:
+            self.busy_bar.stop()
+            self.cancel_button.config(state='disabled')
+            self.config(cursor='')
+
+    def cancel_tasks(self):
+        for executor in self.executors:
+            executor.cancel_all()
+        self.page_loading = False
+        if self.user.status == 'admin' and self.custom_query_started is not None:
+            self.stop_custom_query_timer()
+            self.custom_query_status.config(text="Запрос отменён.")
+
+    def create_dashboard_tab(self):
+        # Сводки из client_summary/account_summary: перед чтением дообновляются
+        # только изменившиеся ключи, поэтому вкладка открывается быстро
+        controls = tk.Frame(self.dashboard_tab)
+        controls.pack(fill='x', padx=10, pady=5)
+        if self.user.status != 'client':
+            tk.Label(controls, text="Клиент ID:").pack(side='left')
+            self.dashboard_client_entry = tk.Entry(controls, width=10)
+            self.dashboard_client_entry.pack(side='left', padx=5)
+            self.dashboard_client_entry.bind('<Return>', lambda event: self.load_dashboard())
+            tk.Button(controls, text="Найти", command=self.load_dashboard).pack(side='left', padx=5)
+        tk.Button(controls, text="Обновить", command=self.load_dashboard).pack(side='left', padx=5)
+        self.dashboard_status = tk.Label(controls, text="")
+        self.dashboard_status.pack(side='left', padx=10)
+
+        self.client_summary_tree = self.summary_tree(CLIENT_COLUMNS, height=12)
+        self.client_summary_tree.bind('<<TreeviewSelect>>', self.on_client_summary_select)
+        tk.Label(self.dashboard_tab, text="Счета клиента:").pack(anchor='w', padx=10)
+        self.account_summary_tree = self.summary_tree(ACCOUNT_COLUMNS, height=8)
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+
+    def summary_tree(self, columns, height):
+        tree = ttk.Treeview(self.dashboard_tab, columns=[name for name, _ in columns], show='headings', height=height)
+        for name, heading in columns:
+            tree.heading(name, text=heading)
+            tree.column(name, width=110, anchor='center')
+        tree.pack(expand=1, fill='both', padx=10, pady=5)
+        return tree
+
+    def on_tab_changed(self, event=None):
+        if self.notebook.select() == str(self.dashboard_tab):
+            self.load_dashboard()
+
+    def load_dashboard(self):
+        client_id = self.client_id
+        if self.user.status != 'client':
+            text = self.dashboard_client_entry.get().strip()
+            if text and not text.isdigit():
+                messagebox.showerror("Ошибка ввода", "ID клиента должен быть целым числом.")
+                return
+            client_id = int(text) if text else None
+
+        def load():
+            with screen('dashboard'):
+                refresh_summaries()
+                return client_summaries(client_id)
+
+        self.dashboard_status.config(text="Загрузка...")
+        self.executor.submit(load, channel='dashboard', on_success=self.show_dashboard,
+                             on_error=lambda e: self.dashboard_status.config(text=f"Ошибка: {e}"))
+
+    def show_dashboard(self, rows):
+        tree = self.client_summary_tree
+        tree.delete(*tree.get_children())
+        self.account_summary_tree.delete(*self.account_summary_tree.get_children())
+        for row in rows:
+            tree.insert('', 'end', iid=str(row[0]), values=['' if value is None else value for value in row])
+        self.dashboard_status.config(text=f"Клиентов: {len(rows)}, обновлено {time.strftime('%H:%M:%S')}")
+        if len(rows) == 1:
+            tree.selection_set(str(rows[0][0]))
+
+    def on_client_summary_select(self, event=None):
+        selected = self.client_summary_tree.selection()
+        if not selected:
+            return
+
+        def show(rows):
+            tree = self.account_summary_tree
+            tree.delete(*tree.get_children())
+            for row in rows:
+                tree.insert('', 'end', values=['' if value is None else value for value in row])
+
+        self.executor.submit(account_summaries, int(selected[0]), channel='dashboard_accounts', on_success=show,
+                             on_error=lambda e: messagebox.showerror("Ошибка", str(e)))
+
     def create_tables_tab(self):
         if not self.available_tables:
             messagebox.showwarning("Предупреждение", "Нет доступных таблиц для отображения.")
@@ -231,7 +631,7 @@ class App(tk.Tk):
             self.tables_tab, values=self.available_tables, state='readonly',
             textvariable=self.table_selected
         )
-        self.table_combo.bind("<<ComboboxSelected>>", self.load_table)
+        self.table_combo.bind("<<ComboboxSelected>>", self.on_table_selected)
         self.table_combo.pack(pady=10)
 
         button_frame = tk.Frame(self.tables_tab)
@@ -247,28 +647,113 @@ class App(tk.Tk):
         self.delete_button = tk.Button(button_frame, text="Удалить", command=self.delete_record, state='disabled')
         self.delete_button.pack(side='left', padx=5)
 
+        self.import_button = tk.Button(button_frame, text="Импорт", command=self.import_records, state='disabled')
+        self.import_button.pack(side='left', padx=5)
+
         self.export_csv_button = tk.Button(button_frame, text="Экспорт CSV", command=self.export_csv, state='disabled')
         self.export_csv_button.pack(side='left', padx=5)
 
         self.export_xlsx_button = tk.Button(button_frame, text="Экспорт XLSX", command=self.export_xlsx, state='disabled')
         self.export_xlsx_button.pack(side='left', padx=5)
 
-        self.tree = ttk.Treeview(self.tables_tab, columns=[], show='headings')
-        self.tree.pack(expand=1, fill='both', pady=10)
+        self.schedule_button = tk.Button(button_frame, text="График", command=self.show_schedule, state='disabled')
+        self.schedule_button.pack(side='left', padx=5)
+
+        if self.user.status == 'admin':
+            self.transfer_button = tk.Button(button_frame, text="Перевод", command=self.transfer_money)
+            self.transfer_button.pack(side='left', padx=5)
+
+        if self.user.status == 'admin':
+            self.report_button = tk.Button(button_frame, text="Отчёт XLSX", command=self.export_report)
+            self.report_button.pack(side='left', padx=5)
+
+        self.count_label = tk.Label(self.tables_tab, text="")
+        self.count_label.pack(anchor='w', padx=10)
+
+        self.filter_frame = tk.Frame(self.tables_tab)
+        self.filter_frame.pack(fill='x', padx=10)
+        self.filter_entries = {}
+
+        tree_frame = tk.Frame(self.tables_tab)
+        tree_frame.pack(expand=1, fill='both', pady=10)
+
+        self.tree_scrollbar = ttk.Scrollbar(tree_frame, orient='vertical')
+        self.tree_scrollbar.pack(side='right', fill='y')
+
+        self.tree = ttk.Treeview(tree_frame, columns=[], show='headings',
+                                 yscrollcommand=self.on_tree_scroll)
+        self.tree.pack(side='left', expand=1, fill='both')
+        self.tree_scrollbar.config(command=self.tree.yview)
         self.tree.bind('<<TreeviewSelect>>', self.on_tree_select)
 
-    def sort_treeview(self, col, reverse):
-        try:
-            l = [(self.tree.set(k, col), k) for k in self.tree.get_children('')]
-            try:
-                l.sort(key=lambda t: float(t[0]), reverse=reverse)
-            except ValueError:
-                l.sort(reverse=reverse)
-            for index, (val, k) in enumerate(l):
-                self.tree.move(k, '', index)
-            self.tree.heading(col, command=lambda: self.sort_treeview(col, not reverse))
-        except Exception as e:
-            messagebox.showerror("Ошибка сортировки", str(e))
+        self.view_query = None
+        self.view_model = None
+        self.view_order = []
+        self.view_records = {}
+        self.view_total = None
+        self.view_sort = None
+        self.view_filters = {}
+        self.view_period = None
+        self.period_var = tk.StringVar(value='Всё время')
+        self.has_more_before = False
+        self.has_more_after = False
+        self.page_loading = False
+
+    def on_table_selected(self, event=None):
+        model = self.get_model(self.table_selected.get())
+        self.view_sort = None
+        self.view_filters = {}
+        self.view_period = None
+        self.period_var.set('Всё время')
+        if model:
+            self.build_filter_row(model)
+        self.load_table()
+
+    def build_filter_row(self, model):
+        for widget in self.filter_frame.winfo_children():
+            widget.destroy()
+        self.filter_entries = {}
+        for idx, field in enumerate(model._meta.sorted_fields):
+            tk.Label(self.filter_frame, text=field.name.replace('_', ' ').capitalize() + ":").grid(
+                row=0, column=idx * 2, padx=(5, 1), sticky='e')
+            entry = tk.Entry(self.filter_frame, width=10)
+            entry.grid(row=0, column=idx * 2 + 1, padx=(1, 5), sticky='w')
+            entry.bind('<Return>', self.apply_filter)
+            self.filter_entries[field.name] = entry
+        column = len(model._meta.sorted_fields) * 2
+        tk.Button(self.filter_frame, text="Фильтр", command=self.apply_filter).grid(row=0, column=column, padx=5)
+        tk.Button(self.filter_frame, text="Сбросить", command=self.reset_filter).grid(row=0, column=column + 1, padx=5)
+        if model is Transaction:
+            tk.Label(self.filter_frame, text="Период:").grid(row=1, column=0, padx=(5, 1), pady=(5, 0), sticky='e')
+            period_combo = ttk.Combobox(self.filter_frame, values=list(PERIODS), state='readonly',
+                                        textvariable=self.period_var, width=14)
+            period_combo.grid(row=1, column=1, columnspan=3, padx=(1, 5), pady=(5, 0), sticky='w')
+            period_combo.bind("<<ComboboxSelected>>", self.apply_period)
+
+    def apply_period(self, event=None):
+        months = PERIODS[self.period_var.get()]
+        self.view_period = None if months is None else (add_months(month_start(date.today()), 1 - months), None)
+        self.load_table()
+
+    def apply_filter(self, event=None):
+        self.view_filters = {col: entry.get() for col, entry in self.filter_entries.items() if entry.get().strip()}
+        self.load_table()
+
+    def reset_filter(self):
+        for entry in self.filter_entries.values():
+            entry.delete(0, tk.END)
+        self.view_filters = {}
+        self.load_table()
+
+    def sort_by_column(self, col):
+        # Сортировка выполняется на сервере через ORDER BY
+        if col not in self.view_model._meta.fields:
+            return
+        if self.view_sort and self.view_sort[0] == col:
+            self.view_sort = (col, not self.view_sort[1])
+        else:
+            self.view_sort = (col, False)
+        self.load_table()
 
     def delete_record(self):
         if self.user.status == 'client':
@@ -296,16 +781,18 @@ class App(tk.Tk):
 
         confirm = messagebox.askyesno("Подтверждение", "Вы уверены, что хотите удалить запись?")
         if confirm:
-            try:
+            def delete():
                 record = model.get(model.id == record_id)
                 record.delete_instance()
-                messagebox.showinfo("Успех", "Запись успешно удалена.")
-                self.load_table()
-            except model.DoesNotExist:
-                messagebox.showerror("Ошибка", "Запись не найдена в базе данных.")
-            except Exception as e:
-                messagebox.showerror("Ошибка при удалении записи", str(e))
+                return record.id
 
+            def on_error(e):
+                if isinstance(e, model.DoesNotExist):
+                    messagebox.showerror("Ошибка", "Запись не найдена в базе данных.")
+                else:
+                    messagebox.showerror("Ошибка при удалении записи", str(e))
+
+            self.submit_mutation(model, delete, "Запись успешно удалена.", on_error)
 
     def load_table(self, event=None):
         table = self.table_selected.get()
@@ -314,76 +801,58 @@ class App(tk.Tk):
             messagebox.showerror("Ошибка", f"Модель для таблицы {table} не найдена.")
             return
 
-        records = []
-        if self.user.status == 'admin':
-            records = list(model.select())
-        elif self.user.status == 'employee':
-            if table == 'Users':
-                records = list(model.select().where(Users.status == 'client'))  # Only clients for employees
-            else:
-                records = list(model.select())
-        elif self.user.status == 'client':
-            if not self.client_id:
-                messagebox.showerror("Ошибка", "Идентификатор клиента не найден.")
-                return
+        if self.user.status == 'client' and not self.client_id:
+            messagebox.showerror("Ошибка", "Идентификатор клиента не найден.")
+            return
+
+        query = scoped_query(model, self.user.status, self.client_id, self.view_period)
+        if query is not None:
             try:
-                if table == 'Personal_Data':
-                    client = Client.get(Client.id == self.client_id)
-                    if client.personal_data:
-                        records = [client.personal_data]
-                elif table == 'Organization_Data':
-                    client = Client.get(Client.id == self.client_id)
-                    if client.organization_data:
-                        records = [client.organization_data]
-                elif table == 'Client':
-                    client = Client.get(Client.id == self.client_id)
-                    records = [client]
-                elif table == 'Bank_Account':
-                    records = list(Bank_Account.select().where(Bank_Account.client == self.client_id))
-                elif table == 'Deposit':
-                    records = list(Deposit.select().join(
-                        Bank_Account, on=(Deposit.id == Bank_Account.deposit)
-                    ).where(Bank_Account.client == self.client_id))
-                elif table == 'Loan':
-                    records = list(Loan.select().join(
-                        Bank_Account, on=(Loan.id == Bank_Account.loan)
-                    ).where(Bank_Account.client == self.client_id))
-                elif table == 'Card':
-                    records = list(Card.select().join(
-                        Bank_Account, on=(Card.id == Bank_Account.card)
-                    ).where(Bank_Account.client == self.client_id))
-                elif table == 'Transaction':
-                    records_from = list(Transaction.select().join(
-                        Bank_Account, on=(Transaction.bank_account_from == Bank_Account.id)
-                    ).where(Bank_Account.client == self.client_id))
-                    records_to = list(Transaction.select().join(
-                        Bank_Account, on=(Transaction.bank_account_to == Bank_Account.id)
-                    ).where(Bank_Account.client == self.client_id))
-                    records = records_from + records_to
-                else:
-                    records = []
-            except Client.DoesNotExist:
-                records = []
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Произошла ошибка при загрузке данных: {e}")
+                query = apply_filters(query, model, self.view_filters)
+            except ValueError as e:
+                messagebox.showerror("Ошибка фильтра", str(e))
                 return
 
         self.tree.delete(*self.tree.get_children())
-        columns = [field.name for field in model._meta.sorted_fields]
+        if query is not None:
+            columns = query_columns(query)
+        else:
+            columns = [field.name for field in model._meta.sorted_fields]
         self.tree['columns'] = columns
 
         for col in columns:
-            self.tree.heading(col, text=col.replace('_', ' ').capitalize(),
-                              command=lambda _col=col: self.sort_treeview(_col, False))
+            text = col.replace('_', ' ').capitalize()
+            if self.view_sort and self.view_sort[0] == col:
+                text += ' ▼' if self.view_sort[1] else ' ▲'
+            self.tree.heading(col, text=text, command=lambda _col=col: self.sort_by_column(_col))
             self.tree.column(col, width=150, anchor='center')
 
-        for record in records:
-            row = [getattr(record, col) for col in columns]
-            self.tree.insert('', 'end', values=row)
+        self.view_query = query
+        self.view_model = model
+        self.view_order = sort_order(model, *self.view_sort) if self.view_sort else sort_order(model)
+        self.view_records = {}
+        self.view_total = None
+        self.has_more_before = False
+        self.has_more_after = False
+
+        self.executor.cancel('page')
+        if query is not None:
+            self.page_loading = True
+            self.count_label.config(text="Загрузка...")
+            self.executor.submit(self.fetch_rows, query, self.view_order, model, columns, with_total=True,
+                                 key=self.cache_key(), channel='table', on_success=self.show_first_page,
+                                 on_error=self.on_load_error)
+        else:
+            self.executor.cancel('table')
+            self.page_loading = False
+            self.count_label.config(text="Строк: 0")
 
         # Настройка прав доступа к кнопкам
+        self.schedule_button.config(state='disabled')
         if self.user.status == 'admin':
             self.add_button.config(state='normal')
+            # Операции меняют балансы карт, поэтому добавляются только переводом
+            self.import_button.config(state='normal' if table != 'Transaction' else 'disabled')
             self.edit_button.config(state='disabled')
             self.delete_button.config(state='disabled')
             self.export_csv_button.config(state='normal')
@@ -391,38 +860,227 @@ class App(tk.Tk):
         elif self.user.status == 'employee':
             if table != 'Transaction':
                 self.add_button.config(state='normal')
+                self.import_button.config(state='normal')
                 self.edit_button.config(state='normal')
                 self.delete_button.config(state='normal')
             else:
                 self.add_button.config(state='disabled')
+                self.import_button.config(state='disabled')
                 self.edit_button.config(state='disabled')
                 self.delete_button.config(state='disabled')
             self.export_csv_button.config(state='disabled')
             self.export_xlsx_button.config(state='disabled')
         elif self.user.status == 'client':
             self.add_button.config(state='disabled')
+            self.import_button.config(state='disabled')
             self.edit_button.config(state='disabled')
             self.delete_button.config(state='disabled')
             self.export_csv_button.config(state='disabled')
             self.export_xlsx_button.config(state='disabled')
 
+    def cache_key(self, after=None, before=None):
+        filters = tuple(sorted(self.view_filters.items()))
+        return (self.view_model.__name__, self.user.status, self.client_id, after, before, self.view_sort, filters,
+                self.view_period)
+
+    def fetch_rows(self, query, order, model, columns, after=None, before=None, with_total=False, key=None):
+        # Выполняется в рабочем потоке
+        with screen(('load_table/' if with_total else 'page/') + model.__name__):
+            if key is not None:
+                cached = self.result_cache.get(key)
+                if cached is not None:
+                    return cached
+                tables = query_tables(query, model)
+                versions = self.result_cache.versions(tables)
+            records = fetch_page(query, order, after=after, before=before)
+            rows = self.renderer.render(model, columns, records)
+            total = estimate_count(query, model) if with_total else None
+            result = records, rows, total
+            if key is not None:
+                self.result_cache.put(key, result, tables, versions)
+            return result
+
+    def on_load_error(self, e):
+        self.page_loading = False
+        messagebox.showerror("Ошибка", f"Произошла ошибка при загрузке данных: {e}")
+
+    def show_first_page(self, result):
+        records, rows, total = result
+        self.page_loading = False
+        self.insert_rows(records, rows)
+        self.has_more_after = len(records) == PAGE_SIZE
+        self.view_total = max(total, len(records))
+        self.count_label.config(text=f"Строк (оценка): {self.view_total}")
+
+    def insert_rows(self, records, rows, index='end'):
+        id_index = list(self.tree['columns']).index('id')
+        for offset, (record, row) in enumerate(zip(records, rows)):
+            position = index if index == 'end' else index + offset
+            iid = str(record[id_index])
+            self.tree.insert('', position, iid=iid, values=row)
+            self.view_records[iid] = record
+
+    def remove_rows(self, iids):
+        self.tree.delete(*iids)
+        for iid in iids:
+            self.view_records.pop(iid, None)
+
+    def page_cursor(self, iid):
+        return row_cursor(self.view_order, list(self.tree['columns']), self.view_records[iid])
+
+    def on_tree_scroll(self, first, last):
+        self.tree_scrollbar.set(first, last)
+        if self.page_loading or self.view_query is None:
+            return
+        if float(last) >= 0.9 and self.has_more_after:
+            self.load_next_page()
+        elif float(first) <= 0.1 and self.has_more_before:
+            self.load_previous_page()
+
+    def load_next_page(self):
+        children = self.tree.get_children()
+        if self.page_loading or not children or not self.has_more_after:
+            return
+        self.page_loading = True
+        after = self.page_cursor(children[-1])
+        self.executor.submit(self.fetch_rows, self.view_query, self.view_order, self.view_model,
+                             list(self.tree['columns']), after=after, key=self.cache_key(after=after),
+                             channel='page', on_success=self.append_page,
+                             on_error=self.on_load_error)
+
+    def append_page(self, result):
+        records, rows, _ = result
+        self.page_loading = False
+        self.insert_rows(records, rows)
+        self.has_more_after = len(records) == PAGE_SIZE
+        children = self.tree.get_children()
+        overflow = len(children) - WINDOW_SIZE
+        if overflow > 0:
+            self.remove_rows(children[:overflow])
+            self.has_more_before = True
+            self.tree.see(children[-len(records) - 1] if records else children[-1])
+
+    def load_previous_page(self):
+        children = self.tree.get_children()
+        if self.page_loading or not children or not self.has_more_before:
+            return
+        self.page_loading = True
+        before = self.page_cursor(children[0])
+        self.executor.submit(self.fetch_rows, self.view_query, self.view_order, self.view_model,
+                             list(self.tree['columns']), before=before, key=self.cache_key(before=before),
+                             channel='page', on_success=self.prepend_page,
+                             on_error=self.on_load_error)
+
+    def prepend_page(self, result):
+        records, rows, _ = result
+        self.page_loading = False
+        self.insert_rows(records, rows, index=0)
+        self.has_more_before = len(records) == PAGE_SIZE
+        children = self.tree.get_children()
+        overflow = len(children) - WINDOW_SIZE
+        if overflow > 0:
+            self.remove_rows(children[-overflow:])
+            self.has_more_after = True
+        if records:
+            self.tree.see(children[len(records)])
+
+    def submit_mutation(self, model, mutation, message, on_error):
+        # Изменение одной записи: вместо перезагрузки таблицы в представлении
+        # обновляется только строка с этим первичным ключом
+        query, order, columns = self.view_query, self.view_order, list(self.tree['columns'])
+        view_model = self.view_model
+
+        def run():
+            pk = mutation()
+            self.renderer.invalidate(model)
+            self.result_cache.invalidate(model)
+            if query is None or view_model is not model:
+                return pk, None
+            return pk, self.fetch_record(query, order, model, columns, pk)
+
+        def on_success(result):
+            messagebox.showinfo("Успех", message)
+            if query is not None and query is self.view_query:
+                self.patch_row(*result)
+
+        # Запись могла зафиксироваться до нажатия «Отмена» - результат доставляется всегда
+        self.executor.submit(run, on_success=on_success, on_error=on_error, cancellable=False)
+
+    def fetch_record(self, query, order, model, columns, pk):
+        # Выполняется в рабочем потоке: строка в том виде, в каком её показывает
+        # представление (с фильтрами и областью видимости), и id предыдущей строки
+        # в порядке сортировки - по нему строка встаёт на своё место
+        records = list(query.where(model._meta.primary_key == pk).tuples())
+        if not records:
+            return None
+        rows = self.renderer.render(model, columns, records)
+        previous = fetch_page(query, order, before=row_cursor(order, columns, records[0]), limit=1)
+        previous_iid = str(previous[0][columns.index('id')]) if previous else None
+        return records[0], rows[0], previous_iid
+
+    def patch_row(self, pk, found, select=True):
+        iid = str(pk)
+        existed = self.tree.exists(iid)
+        selected = existed and iid in self.tree.selection()
+        if existed:
+            self.remove_rows([iid])
+        if found is not None:
+            record, row, previous = found
+            if previous is None:
+                index = None if self.has_more_before else 0
+            elif self.tree.exists(previous):
+                index = self.tree.index(previous) + 1
+            else:
+                index = None  # строка за пределами загруженного окна
+            if index is not None:
+                self.insert_rows([record], [row], index)
+                if select:
+                    self.tree.selection_set(iid)
+                    self.tree.see(iid)
+                elif selected:
+                    self.tree.selection_add(iid)
+        if self.view_total is not None:
+            self.view_total = max(self.view_total + (found is not None) - existed, 0)
+            self.count_label.config(text=f"Строк (оценка): {self.view_total}")
+
+    def on_remote_changes(self, changes):
+        # Пачка изменений из ChangeListener: {(table, id): op}
+        models = {model._meta.table_name: model for model in TABLES.values()}
+        changed = {table for table, _ in changes}
+        for table in changed:
+            if table in models:
+                self.renderer.invalidate(models[table])
+                self.result_cache.invalidate(models[table])
+
+        model, query = self.view_model, self.view_query
+        if query is None or self.page_loading:
+            return
+        table = model._meta.table_name
+        pks = [pk for (changed_table, pk) in changes if changed_table == table]
+        # Для клиента состав строк зависит и от других таблиц (например, вклад
+        # появляется в его списке, когда к нему привязывают счёт)
+        scope = changed & query_tables(query, model) - {table} if self.user.status == 'client' else set()
+        if len(pks) > LIVE_RELOAD_THRESHOLD or scope:
+            self.load_table()
+        elif pks:
+            order, columns = self.view_order, list(self.tree['columns'])
+
+            def fetch():
+                return [(pk, self.fetch_record(query, order, model, columns, pk)) for pk in pks]
+
+            def on_success(results):
+                if query is self.view_query:
+                    for pk, found in results:
+                        self.patch_row(pk, found, select=False)
+
+            self.executor.submit(fetch, on_success=on_success, on_error=lambda e: None)
+
     def get_model(self, table_name):
-        models = {
-            'Users': Users,
-            'Organization_Data': Organization_Data,
-            'Personal_Data': Personal_Data,
-            'Client': Client,
-            'Employee': Employee,
-            'Deposit': Deposit,
-            'Loan': Loan,
-            'Card': Card,
-            'Bank_Account': Bank_Account,
-            'Transaction': Transaction
-        }
-        return models.get(table_name, None)
+        return TABLES.get(table_name, None)
 
     def on_tree_select(self, event):
         selected = self.tree.selection()
+        self.schedule_button.config(state='normal' if selected and self.view_model is Loan else 'disabled')
         if not selected:
             self.edit_button.config(state='disabled')
             self.delete_button.config(state='disabled')
@@ -452,8 +1110,17 @@ class App(tk.Tk):
             messagebox.showerror("Ошибка прав доступа", "Клиент не может добавлять записи.")
             return
 
+        if model is Transaction and self.user.status != 'admin':
+            messagebox.showerror("Ошибка прав доступа", "Сотрудник не может добавлять операции.")
+            return
+
+        if model is Transaction:
+            # Операция без списания и зачисления нарушила бы балансы карт
+            self.transfer_money()
+            return
+
         fields = [field.name for field in model._meta.sorted_fields if field.name != 'id']
-        dialog = AddEditDialog(self, f"Добавить в {table}", fields, user_status=self.user.status)
+        dialog = AddEditDialog(self, f"Добавить в {table}", fields, user_status=self.user.status, model=model)
         if dialog.result is not None:
             data = {k: v for k, v in dialog.result.items()}
 
@@ -465,12 +1132,94 @@ class App(tk.Tk):
             else:
                 data.pop('password', None)
 
-            try:
-                obj = model.create(**data)
-                messagebox.showinfo("Успех", "Запись успешно добавлена.")
-                self.load_table()
-            except Exception as e:
-                messagebox.showerror("Ошибка при вставке записи", str(e))
+            self.submit_mutation(model, lambda: model.create(**data).id, "Запись успешно добавлена.",
+                                 lambda e: messagebox.showerror("Ошибка при вставке записи", str(e)))
+
+    def show_schedule(self):
+        selected = self.tree.selection()
+        if self.view_model is not Loan or not selected:
+            messagebox.showwarning("Предупреждение", "Выберите кредит в таблице Loan.")
+            return
+        pk = int(selected[0])
+
+        def on_error(e):
+            if isinstance(e, Loan.DoesNotExist):
+                messagebox.showerror("Ошибка", "Кредит не найден в базе данных.")
+            else:
+                messagebox.showerror("Ошибка", str(e))
+
+        self.executor.submit(Loan.get_by_id, pk, on_success=lambda loan: ScheduleWindow(self, loan), on_error=on_error)
+
+    def transfer_money(self):
+        # Операции создаются только переводом: баланс карт и строка transaction
+        # меняются в одной транзакции базы; операции добавляет только администратор
+        if self.user.status != 'admin':
+            return
+        source = None
+        selected = self.tree.selection()
+        if selected and self.view_model is Bank_Account:
+            source = int(selected[0])
+        dialog = TransferDialog(self, source)
+        if dialog.result is None:
+            return
+
+        def mutation():
+            pk = transfer(*dialog.result)
+            self.renderer.invalidate(Card)
+            self.result_cache.invalidate(Card)
+            return pk
+
+        def on_error(e):
+            if isinstance(e, TransferError):
+                messagebox.showerror("Перевод отклонён", str(e))
+            else:
+                messagebox.showerror("Ошибка перевода", str(e))
+
+        self.submit_mutation(Transaction, mutation, "Перевод выполнен.", on_error)
+
+    def import_records(self):
+        if self.user.status == 'client':
+            messagebox.showerror("Ошибка прав доступа", "Клиент не может добавлять записи.")
+            return
+
+        table = self.table_selected.get()
+        model = self.get_model(table)
+        if not model:
+            messagebox.showerror("Ошибка", f"Модель для таблицы {table} не найдена.")
+            return
+
+        file_path = filedialog.askopenfilename(filetypes=[("CSV files", '*.csv'), ("Excel files", '*.xlsx')])
+        if not file_path:
+            return
+
+        progress = ProgressDialog(self, f"Импорт в {table}")
+
+        def on_success(result):
+            progress.close()
+            self.renderer.invalidate(model)
+            self.result_cache.invalidate(model)
+            message = f"Добавлено строк: {result.inserted}, отклонено: {result.rejected}."
+            if result.rejects_path:
+                message += f"\nОтклонённые строки с причинами: {result.rejects_path}"
+            messagebox.showinfo("Импорт", message)
+            self.load_table()
+
+        def on_error(e):
+            progress.close()
+            messagebox.showerror("Ошибка импорта", str(e))
+
+        def on_cancel():
+            # Окно прогресса закрывается само; порции, загруженные до отмены, остаются в таблице
+            self.renderer.invalidate(model)
+            self.result_cache.invalidate(model)
+            messagebox.showinfo("Импорт", "Импорт остановлен. Уже загруженные порции сохранены.")
+            self.load_table()
+
+        progress.task = self.executor.submit(
+            import_file, model, file_path, user_status=self.user.status,
+            progress=progress.update_progress, cancel_event=progress.cancel_event,
+            on_success=on_success, on_error=on_error, on_cancel=on_cancel
+        )
 
     def edit_record(self):
         if self.user.status == 'client':
@@ -495,15 +1244,24 @@ class App(tk.Tk):
             messagebox.showerror("Ошибка", "Не удалось определить ID записи.")
             return
 
-        try:
+        fields = [field.name for field in model._meta.sorted_fields if field.name != 'id']
+
+        def load():
             record = model.get(model.id == record_id)
-        except model.DoesNotExist:
-            messagebox.showerror("Ошибка", "Запись не найдена в базе данных.")
-            return
+            return record, {field: getattr(record, field) for field in fields}
 
-        fields = [field.name for field in model._meta.sorted_fields if field.name != 'id']
-        initial_data = {field: getattr(record, field) for field in fields}
-        dialog = AddEditDialog(self, f"Изменить в {table}", fields, initial_data=initial_data, user_status=self.user.status)
+        def on_error(e):
+            if isinstance(e, model.DoesNotExist):
+                messagebox.showerror("Ошибка", "Запись не найдена в базе данных.")
+            else:
+                messagebox.showerror("Ошибка", str(e))
+
+        self.executor.submit(load, on_error=on_error,
+                             on_success=lambda result: self.open_edit_dialog(table, model, fields, *result))
+
+    def open_edit_dialog(self, table, model, fields, record, initial_data):
+        dialog = AddEditDialog(self, f"Изменить в {table}", fields, initial_data=initial_data,
+                               user_status=self.user.status, model=model)
         if dialog.result is not None:
             data = {k: v for k, v in dialog.result.items()}
 
@@ -515,76 +1273,117 @@ class App(tk.Tk):
             elif 'password' in data:
                 data.pop('password')
 
-            try:
+            def save():
                 for key, value in data.items():
                     setattr(record, key, value)
                 record.save()
-                messagebox.showinfo("Успех", "Запись успешно обновлена.")
-                self.load_table()
-            except Exception as e:
-                messagebox.showerror("Ошибка при обновлении записи", str(e))
+                return record.id
+
+            self.submit_mutation(model, save, "Запись успешно обновлена.",
+                                 lambda e: messagebox.showerror("Ошибка при обновлении записи", str(e)))
 
     def export_csv(self):
         table = self.table_selected.get()
         model = self.get_model(table)
-        if not model:
+        if not model or model is not self.view_model:
             messagebox.showerror("Ошибка", f"Модель для таблицы {table} не найдена.")
             return
+        if self.view_query is None:
+            messagebox.showwarning("Предупреждение", "Нет данных для экспорта.")
+            return
 
-        try:
-            if self.user.status == 'client':
-                records = list(model.select().where(Bank_Account.client == self.client_id))
-            else:
-                records = list(model.select())
-        except Client.DoesNotExist:
-            records = []
-
-        columns = [field.name for field in model._meta.sorted_fields]
+        # Тот же запрос с правами, фильтрами и сортировкой, что и в таблице
+        query = self.view_query.order_by(*ordering(self.view_order))
+        columns = list(self.tree['columns'])
 
         file_path = filedialog.asksaveasfilename(defaultextension='.csv',
                                                  filetypes=[("CSV files", '*.csv')])
         if not file_path:
             return
 
-        try:
-            with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow([col.replace('_', ' ').capitalize() for col in columns])
-                for record in records:
-                    row = [getattr(record, col) for col in columns]
-                    writer.writerow(row)
-            messagebox.showinfo("Успех", f"Таблица '{table}' успешно экспортирована в CSV.")
-        except Exception as e:
-            messagebox.showerror("Ошибка экспорта", str(e))
+        progress = ProgressDialog(self, f"Экспорт {table} в CSV")
+
+        def export():
+            with screen('export_csv/' + table):
+                progress.total = estimate_count(query, model)
+                return stream_csv(query, columns, file_path, progress=progress.update_progress,
+                                  cancel_event=progress.cancel_event)
+
+        progress.task = self.executor.submit(
+            export,
+            on_success=lambda written: self.finish_export(progress, f"Таблица '{table}' успешно экспортирована в CSV ({written} строк)."),
+            on_error=lambda e: self.fail_export(progress, e)
+        )
 
     def export_xlsx(self):
         table = self.table_selected.get()
         model = self.get_model(table)
-        if not model:
+        if not model or model is not self.view_model:
             messagebox.showerror("Ошибка", f"Модель для таблицы {table} не найдена.")
             return
+        if self.view_query is None:
+            messagebox.showwarning("Предупреждение", "Нет данных для экспорта.")
+            return
 
-        try:
-            if self.user.status == 'client':
-                records = list(model.select().where(Bank_Account.client == self.client_id))
-            else:
-                records = list(model.select())
-        except Client.DoesNotExist:
-            records = []
+        query = self.view_query.order_by(*ordering(self.view_order))
+        columns = list(self.tree['columns'])
 
-        columns = [field.name for field in model._meta.sorted_fields]
-        data = [[getattr(record, col) for col in columns] for record in records]
+        file_path = filedialog.asksaveasfilename(defaultextension='.xlsx',
+                                                 filetypes=[("Excel files", '*.xlsx')])
+        if not file_path:
+            return
+
+        progress = ProgressDialog(self, f"Экспорт {table} в XLSX")
+
+        def export():
+            with screen('export_xlsx/' + table):
+                progress.total = estimate_count(query, model)
+                return stream_xlsx(query, columns, table, file_path, progress=progress.update_progress,
+                                   cancel_event=progress.cancel_event)
+
+        progress.task = self.executor.submit(
+            export,
+            on_success=lambda written: self.finish_export(progress, f"Таблица '{table}' успешно экспортирована в XLSX ({written} строк)."),
+            on_error=lambda e: self.fail_export(progress, e)
+        )
+
+    def export_report(self):
+        dialog = TableSelectDialog(self, "Отчёт XLSX", self.available_tables,
+                                   ['Client', 'Bank_Account', 'Transaction'])
+        if not dialog.result:
+            return
+        tables = dialog.result
 
         file_path = filedialog.asksaveasfilename(defaultextension='.xlsx',
                                                  filetypes=[("Excel files", '*.xlsx')])
         if not file_path:
             return
 
-        try:
-            df = pd.DataFrame(data, columns=[col.replace('_', ' ').capitalize() for col in columns])
-            df.to_excel(file_path, index=False)
-            messagebox.showinfo("Успех", f"Таблица '{table}' успешно экспортирована в XLSX.")
-        except Exception as e:
+        progress = ProgressDialog(self, "Отчёт XLSX")
+
+        def export():
+            with screen('export_report'):
+                queries = [(scoped_query(self.get_model(table), self.user.status, self.client_id),
+                            self.get_model(table)) for table in tables]
+                progress.total = sum(estimate_count(query, model) for query, model in queries if query is not None)
+                return export_workbook(tables, self.user.status, self.client_id, file_path,
+                                       progress=progress.update_progress, cancel_event=progress.cancel_event)
+
+        progress.task = self.executor.submit(
+            export,
+            on_success=lambda written: self.finish_export(progress, f"Отчёт сохранён ({written} строк)."),
+            on_error=lambda e: self.fail_export(progress, e)
+        )
+
+    def finish_export(self, progress, message):
+        progress.close()
+        messagebox.showinfo("Успех", message)
+
+    def fail_export(self, progress, e):
+        progress.close()
+        if isinstance(e, ExportCancelled):
+            messagebox.showinfo("Экспорт", "Экспорт отменён.")
+        else:
             messagebox.showerror("Ошибка экспорта", str(e))
 
     def create_custom_query_tab(self):
@@ -595,12 +1394,57 @@ class App(tk.Tk):
         self.custom_query_text = scrolledtext.ScrolledText(input_frame, height=10)
         self.custom_query_text.pack(fill='x', pady=5)
 
-        execute_button = tk.Button(input_frame, text="Выполнить запрос", command=self.execute_custom_query)
-        execute_button.pack(pady=5)
+        options_frame = tk.Frame(input_frame)
+        options_frame.pack(pady=5)
+
+        tk.Label(options_frame, text="Лимит строк:").pack(side='left')
+        self.row_limit_var = tk.StringVar(value=str(DEFAULT_ROW_LIMIT))
+        tk.Spinbox(options_frame, from_=100, to=100000, increment=100, width=8,
+                   textvariable=self.row_limit_var).pack(side='left', padx=5)
+
+        tk.Label(options_frame, text="Таймаут, с:").pack(side='left')
+        self.timeout_var = tk.StringVar(value=str(DEFAULT_TIMEOUT))
+        tk.Spinbox(options_frame, from_=1, to=3600, width=6,
+                   textvariable=self.timeout_var).pack(side='left', padx=5)
+
+        execute_button = tk.Button(options_frame, text="Выполнить запрос", command=self.execute_custom_query)
+        execute_button.pack(side='left', padx=5)
+
+        self.custom_cancel_button = tk.Button(options_frame, text="Отмена", command=self.cancel_custom_query,
+                                              state='disabled')
+        self.custom_cancel_button.pack(side='left', padx=5)
+
+        self.custom_more_button = tk.Button(options_frame, text="Загрузить ещё", command=self.fetch_more_custom_query,
+                                            state='disabled')
+        self.custom_more_button.pack(side='left', padx=5)
+
+        explain_button = tk.Button(options_frame, text="Explain", command=self.explain_custom_query)
+        explain_button.pack(side='left', padx=5)
+
+        history_button = tk.Button(options_frame, text="История", command=self.show_query_history)
+        history_button.pack(side='left', padx=5)
+
+        self.custom_query_status = tk.Label(input_frame, text="")
+        self.custom_query_status.pack(anchor='w')
 
         self.custom_query_tree = ttk.Treeview(self.custom_query_tab, columns=[], show='headings')
         self.custom_query_tree.pack(expand=1, fill='both', pady=10)
 
+        self.custom_query_base = None
+        self.custom_query_sort = None
+        self.custom_query_rows = 0
+        self.custom_query_started = None
+        self.custom_query_tick = None  # id after() текущего отсчёта времени
+        self.custom_query_running = None
+        self.custom_query_mode = 'run'
+
+        # Отдельный поток со своим соединением: серверный курсор результата
+        # живёт между нажатиями "Загрузить ещё"
+        self.sql_session = QuerySession()
+        self.sql_executor = QueryExecutor(self, max_workers=1, on_busy_change=self.set_busy,
+                                          hold_connection=True)
+        self.executors.append(self.sql_executor)
+
     def manual_syntax_check(self, query: str) -> bool:
         query = query.strip().lower()
 
@@ -623,39 +1467,169 @@ class App(tk.Tk):
         if not self.manual_syntax_check(query):
             return
 
+        self.custom_query_base = query if query.lower().startswith('select') else None
+        self.custom_query_sort = None
+        self.run_custom_query(query)
+
+    def query_limits(self):
         try:
-            results = db.execute_sql(query)
-            if results.description is None:
-                db.commit()
-                messagebox.showinfo("Успех", "Запрос выполнен успешно.")
-                return
-            columns = [desc[0] for desc in results.description]
-            data = results.fetchall()
-        except peewee.OperationalError as e:
-            messagebox.showerror("Синтаксическая ошибка", str(e))
+            row_limit = int(self.row_limit_var.get())
+            timeout = int(self.timeout_var.get())
+            if row_limit <= 0 or timeout <= 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Ошибка ввода", "Лимит строк и таймаут должны быть положительными целыми числами.")
+            return None
+        return row_limit, timeout
+
+    def run_custom_query(self, query):
+        limits = self.query_limits()
+        if limits is None:
+            return
+        row_limit, timeout = limits
+
+        self.custom_query_rows = 0
+        self.custom_query_running = query
+        self.custom_query_mode = 'run'
+        self.start_custom_query_timer()
+        self.sql_executor.submit(self.sql_session.start, query, row_limit, timeout,
+                                 channel='custom_query', on_success=self.show_custom_query_result,
+                                 on_error=self.on_custom_query_error)
+
+    def explain_custom_query(self):
+        query = self.custom_query_text.get("1.0", tk.END).strip()
+        if not query:
+            messagebox.showwarning("Предупреждение", "Поле запроса не может быть пустым.")
+            return
+        if not self.manual_syntax_check(query):
             return
-        except Exception as e:
+        limits = self.query_limits()
+        if limits is None:
+            return
+
+        def on_success(explained):
+            self.stop_custom_query_timer()
+            self.custom_query_status.config(text="")
+            self.custom_query_running = None
+            query_history.record(query, 'explain', explained.get('Execution Time', 0) / 1000,
+                                 explained['Plan'].get('Actual Rows'))
+            PlanWindow(self, explained)
+
+        self.custom_query_running = query
+        self.custom_query_mode = 'explain'
+        self.custom_more_button.config(state='disabled')
+        self.start_custom_query_timer()
+        self.sql_executor.submit(self.sql_session.explain, query, limits[1], channel='custom_query',
+                                 on_success=on_success, on_error=self.on_custom_query_error)
+
+    def show_query_history(self):
+        def use_query(query):
+            self.custom_query_text.delete("1.0", tk.END)
+            self.custom_query_text.insert("1.0", query)
+
+        HistoryWindow(self, use_query)
+
+    def fetch_more_custom_query(self):
+        limits = self.query_limits()
+        if limits is None:
+            return
+        self.custom_more_button.config(state='disabled')
+        self.start_custom_query_timer()
+        self.sql_executor.submit(self.sql_session.fetch_more, limits[0],
+                                 channel='custom_query', on_success=self.append_custom_query_result,
+                                 on_error=self.on_custom_query_error)
+
+    def cancel_custom_query(self):
+        # pg_cancel_backend выполняется с другого соединения из общего пула
+        pid = self.sql_session.pid
+        if pid is not None and self.custom_query_started is not None:
+            self.executor.submit(cancel_backend, pid,
+                                 on_error=lambda e: messagebox.showerror("Ошибка", str(e)))
+
+    def start_custom_query_timer(self):
+        # Предыдущий отсчёт снимается, иначе метку обновляли бы несколько циклов
+        self.cancel_custom_query_tick()
+        self.custom_query_started = time.perf_counter()
+        self.custom_cancel_button.config(state='normal')
+        self.tick_custom_query_timer()
+
+    def tick_custom_query_timer(self):
+        self.custom_query_tick = None
+        if self.custom_query_started is None:
+            return
+        elapsed = time.perf_counter() - self.custom_query_started
+        self.custom_query_status.config(
+            text=f"Выполняется... {elapsed:.1f} с, получено строк: {self.custom_query_rows}")
+        self.custom_query_tick = self.after(100, self.tick_custom_query_timer)
+
+    def cancel_custom_query_tick(self):
+        if self.custom_query_tick is not None:
+            self.after_cancel(self.custom_query_tick)
+            self.custom_query_tick = None
+
+    def stop_custom_query_timer(self):
+        self.cancel_custom_query_tick()
+        elapsed = time.perf_counter() - self.custom_query_started if self.custom_query_started else 0.0
+        self.custom_query_started = None
+        self.custom_cancel_button.config(state='disabled')
+        return elapsed
+
+    def on_custom_query_error(self, e):
+        elapsed = self.stop_custom_query_timer()
+        self.custom_query_status.config(text="")
+        if self.custom_query_running:
+            query_history.record(self.custom_query_running, self.custom_query_mode, elapsed, None, error=str(e))
+            self.custom_query_running = None
+        if is_cancelled(e):
+            messagebox.showinfo("Запрос прерван", "Запрос отменён или превысил таймаут.")
+        elif isinstance(e, peewee.OperationalError):
+            messagebox.showerror("Синтаксическая ошибка", str(e))
+        else:
             messagebox.showerror("Ошибка выполнения запроса", str(e))
+
+    def show_custom_query_result(self, result):
+        elapsed = self.stop_custom_query_timer()
+        if self.custom_query_running:
+            query_history.record(self.custom_query_running, 'run', elapsed,
+                                 result.rowcount if result.columns is None else len(result.rows))
+            self.custom_query_running = None
+        if result.columns is None:
+            # Произвольный DML мог затронуть любую таблицу
+            self.result_cache.clear()
+            self.custom_query_status.config(text=f"Время: {elapsed:.2f} с, изменено строк: {result.rowcount}")
+            messagebox.showinfo("Успех", "Запрос выполнен успешно.")
             return
+        columns = result.columns
 
         self.custom_query_tree.delete(*self.custom_query_tree.get_children())
         self.custom_query_tree['columns'] = columns
-        for col in columns:
+        for index, col in enumerate(columns):
             self.custom_query_tree.heading(col, text=col.replace('_', ' ').capitalize(),
-                                           command=lambda _col=col: self.sort_treeview_custom(_col, False))
+                                           command=lambda _index=index: self.sort_custom_query(_index))
             self.custom_query_tree.column(col, width=150, anchor='center')
-        for row in data:
-            self.custom_query_tree.insert('', 'end', values=row)
+        self.custom_query_rows = 0
+        self.append_custom_query_rows(result, elapsed)
 
-    def sort_treeview_custom(self, col, reverse):
-        try:
-            l = [(self.custom_query_tree.set(k, col), k) for k in self.custom_query_tree.get_children('')]
-            try:
-                l.sort(key=lambda t: float(t[0]), reverse=reverse)
-            except ValueError:
-                l.sort(reverse=reverse)
-            for index, (val, k) in enumerate(l):
-                self.custom_query_tree.move(k, '', index)
-            self.custom_query_tree.heading(col, command=lambda: self.sort_treeview_custom(col, not reverse))
-        except Exception as e:
-            messagebox.showerror("Ошибка сортировки", str(e))
+    def append_custom_query_result(self, result):
+        self.append_custom_query_rows(result, self.stop_custom_query_timer())
+
+    def append_custom_query_rows(self, result, elapsed):
+        for row in result.rows:
+            self.custom_query_tree.insert('', 'end', values=row)
+        self.custom_query_rows += len(result.rows)
+        self.custom_more_button.config(state='normal' if result.has_more else 'disabled')
+        status = f"Время: {elapsed:.2f} с, получено строк: {self.custom_query_rows}"
+        if result.has_more:
+            status += " (есть ещё строки)"
+        self.custom_query_status.config(text=status)
+
+    def sort_custom_query(self, index):
+        # Сортировка результата SELECT на сервере: исходный запрос оборачивается
+        # в подзапрос с ORDER BY по номеру колонки
+        if not self.custom_query_base:
+            return
+        descending = self.custom_query_sort == (index, False)
+        self.custom_query_sort = (index, descending)
+        query = 'SELECT * FROM ({}) AS sorted_query ORDER BY {}{}'.format(
+            self.custom_query_base.rstrip().rstrip(';'), index + 1, ' DESC' if descending else '')
+        self.run_custom_query(query)
@@ -0,0 +1,220 @@
+# importer.py
+import argparse
+import csv
+import io
+import os
+import time
+
+from peewee import AutoField, ForeignKeyField
+
+from models import db
+from queries import TABLES
+from validation import validate_frame, error_messages, model_rules
+
+BATCH_SIZE = 50000
+NULL = '\\N'
+# COPY в transaction создал бы операции без списания и зачисления на картах
+NOT_IMPORTABLE = {
+    'Transaction': "Операции нельзя импортировать: они создаются только переводом (transfers.py).",
+}
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.rejected = 0
+        self.rejects_path = None
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_minute(self):
+        return (self.inserted + self.rejected) / self.elapsed * 60 if self.elapsed else 0
+
+
+def normalize(name):
+    return str(name).strip().lower().replace(' ', '_')
+
+
+def map_columns(model, file_columns):
+    # Колонки файла сопоставляются с полями модели по имени; заголовки
+    # экспорта ("Bank account type") тоже подходят. id не импортируется.
+    fields = {field.name: field for field in model._meta.sorted_fields if not isinstance(field, AutoField)}
+    fields.update({field.column_name: field for field in list(fields.values())})
+    mapping = {}
+    unknown = []
+    for column in file_columns:
+        name = normalize(column)
+        if name == 'id':
+            continue
+        if name in fields:
+            mapping[column] = fields[name]
+        else:
+            unknown.append(column)
+    if unknown:
+        raise ValueError("Неизвестные колонки: " + ", ".join(map(str, unknown)))
+    mapped = {field.name for field in mapping.values()}
+    missing = [field.name for field in model._meta.sorted_fields
+               if not isinstance(field, AutoField) and not field.null and field.default is None
+               and field.name not in mapped]
+    if missing:
+        raise ValueError("В файле нет обязательных колонок: " + ", ".join(missing))
+    return mapping
+
+
+def read_chunks(file_path, batch_size=BATCH_SIZE):
+    # Строки читаются как текст; типы приводятся при проверке
+    import pandas as pd
+
+    if file_path.lower().endswith('.xlsx'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        columns = [str(value) for value in next(rows)]
+        batch = []
+        for row in rows:
+            batch.append(['' if value is None else str(value) for value in row])
+            if len(batch) >= batch_size:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+        workbook.close()
+    else:
+        yield from pd.read_csv(file_path, dtype=str, keep_default_na=False, chunksize=batch_size)
+
+
+def existing_values(field, values):
+    values = list(values)
+    if not values:
+        return set()
+    model = field.model
+    query = model.select(field).where(field.in_(values)).tuples()
+    return {row[0] for row in query}
+
+
+def validate_chunk(model, mapping, frame, user_status='admin'):
+    # Форматы проверяются векторно правилами из validation; здесь добавляются
+    # проверки, которым нужна база: существование связанных записей и уникальность.
+    # Возвращает маску корректных строк, приведённые значения и причины отказа.
+    import pandas as pd
+
+    frame = frame.rename(columns={column: field.name for column, field in mapping.items()})
+    frame = frame.fillna('').astype(str).apply(lambda column: column.str.strip())
+    masks = validate_frame(model, frame, user_status)
+    errors = error_messages(model, masks, frame, user_status)
+    bad = masks.any(axis=1)
+    values = {}
+
+    def reject(mask, message):
+        errors[mask] = (errors[mask] + ' ' + message).str.strip()
+
+    for field in mapping.values():
+        text = frame[field.name]
+        usable = (text != '') & ~masks[field.name]
+        rule = model_rules(model)[field.name]
+        if rule.kind == 'integer':
+            parsed = pd.to_numeric(text.where(usable), errors='coerce').astype('Int64')
+        else:
+            parsed = text.where(usable)
+
+        if isinstance(field, ForeignKeyField):
+            known = existing_values(field.rel_field, (int(pk) for pk in parsed.dropna().unique()))
+            missing = parsed.notna() & ~parsed.isin(known)
+            reject(missing, f"{field.name}: связанная запись не найдена.")
+            bad |= missing
+
+        if field.unique:
+            present = parsed.notna()
+            repeated = present & parsed.duplicated(keep='first')
+            reject(repeated, f"{field.name}: повтор значения в файле.")
+            taken = present & parsed.isin(existing_values(field, parsed[present].unique()))
+            reject(taken, f"{field.name}: значение уже есть в базе.")
+            bad |= repeated | taken
+
+        values[field.name] = parsed
+
+    return ~bad, values, errors
+
+
+def copy_rows(model, values, valid):
+    # Вставка корректных строк одной командой COPY FROM STDIN
+    import pandas as pd
+
+    fields = [model._meta.fields[name] for name in values]
+    frame = pd.DataFrame({field.column_name: values[field.name][valid] for field in fields})
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False, na_rep=NULL)
+    buffer.seek(0)
+    columns = ', '.join('"%s"' % field.column_name for field in fields)
+    sql = "COPY \"%s\" (%s) FROM STDIN WITH (FORMAT csv, NULL '%s')" % (model._meta.table_name, columns, NULL)
+    with db.cursor() as cursor:
+        cursor.copy_expert(sql, buffer)
+    return len(frame)
+
+
+def import_file(model, file_path, user_status='admin', batch_size=BATCH_SIZE, rejects_path=None,
+                progress=None, cancel_event=None):
+    if model.__name__ in NOT_IMPORTABLE:
+        raise ValueError(NOT_IMPORTABLE[model.__name__])
+    result = ImportResult()
+    started = time.perf_counter()
+    rejects_path = rejects_path or os.path.splitext(file_path)[0] + '.rejected.csv'
+    rejects_file = None
+    offset = 0
+    mapping = None
+    try:
+        for frame in read_chunks(file_path, batch_size):
+            if cancel_event is not None and cancel_event.is_set():
+                raise ImportCancelled()
+            if mapping is None:
+                mapping = map_columns(model, frame.columns)
+            frame.index = range(offset + 2, offset + 2 + len(frame))  # номер строки в файле
+            offset += len(frame)
+
+            with db.atomic():
+                valid, values, errors = validate_chunk(model, mapping, frame, user_status)
+                if valid.any():
+                    result.inserted += copy_rows(model, values, valid)
+
+            rejected = errors[~valid]
+            if len(rejected):
+                if rejects_file is None:
+                    rejects_file = open(rejects_path, 'w', newline='', encoding='utf-8')
+                    writer = csv.writer(rejects_file)
+                    writer.writerow(['Строка', 'Причина'] + list(frame.columns))
+                for line, reason in rejected.items():
+                    writer.writerow([line, reason] + list(frame.loc[line]))
+                result.rejected += len(rejected)
+            if progress is not None:
+                progress(offset)
+    finally:
+        if rejects_file is not None:
+            rejects_file.close()
+            result.rejects_path = rejects_path
+        result.elapsed = time.perf_counter() - started
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовый импорт CSV/XLSX в таблицу базы данных")
+    parser.add_argument('table', choices=sorted(set(TABLES) - set(NOT_IMPORTABLE)))
+    parser.add_argument('file')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--rejects', help="Файл для отклонённых строк")
+    args = parser.parse_args()
+
+    with db.connection_context():
+        result = import_file(TABLES[args.table], args.file, batch_size=args.batch_size,
+                             rejects_path=args.rejects)
+    print(f"Добавлено строк: {result.inserted}, отклонено: {result.rejected}, "
+          f"время: {result.elapsed:.1f} с ({result.rows_per_minute:.0f} строк/мин)")
+    if result.rejects_path:
+        print(f"Отклонённые строки: {result.rejects_path}")
+
+
+if __name__ == '__main__':
+    main()
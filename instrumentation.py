@@ -0,0 +1,190 @@
+# instrumentation.py
+import bisect
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Границы корзин гистограмм, секунды
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Запросы из SQL-консоли могут быть любыми: число отпечатков ограничено,
+# остальные учитываются под OTHER
+MAX_FINGERPRINTS = 500
+OTHER = 'other'
+
+slow_log = logging.getLogger('bank.slow_queries')
+slow_log.addHandler(logging.NullHandler())  # без slow_query_log журнал не ведётся
+
+_context = threading.local()
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    # Нормализованный текст запроса: литералы и списки параметров заменены на ?
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'%s', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?+)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def cumulative(self):
+        result, running = [], 0
+        for bound, count in zip(BUCKETS + (float('inf'),), self.counts):
+            running += count
+            result.append((bound, running))
+        return result
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.total, 6),
+            'buckets': {('+Inf' if bound == float('inf') else str(bound)): count
+                        for bound, count in self.cumulative()},
+        }
+
+
+class QueryStats:
+    def __init__(self):
+        self.histogram = Histogram()
+        self.rows = 0
+        self.slow = 0
+
+
+class Metrics:
+    # Счётчики накапливаются в памяти под одной блокировкой; на запрос -
+    # пара обращений к словарю, поэтому сбор можно не отключать
+    def __init__(self, slow_threshold=0.5):
+        self.slow_threshold = slow_threshold
+        self.queries = {}
+        self.screens = {}
+        self.lock = threading.Lock()
+
+    def observe_query(self, sql, seconds, rows):
+        text = fingerprint(sql)
+        slow = seconds >= self.slow_threshold
+        with self.lock:
+            stats = self.queries.get(text)
+            if stats is None:
+                key = OTHER if len(self.queries) >= MAX_FINGERPRINTS else text
+                stats = self.queries.setdefault(key, QueryStats())
+            stats.histogram.observe(seconds)
+            stats.rows += max(rows, 0)
+            stats.slow += slow
+        if slow:
+            slow_log.warning("%.1f ms, rows=%s, screen=%s: %s", seconds * 1000, rows,
+                             getattr(_context, 'screen', None), text)
+
+    def observe_screen(self, name, seconds):
+        with self.lock:
+            self.screens.setdefault(name, Histogram()).observe(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'created': time.time(),
+                'slow_threshold_seconds': self.slow_threshold,
+                'queries': {key: dict(stats.histogram.as_dict(), rows=stats.rows, slow=stats.slow)
+                            for key, stats in self.queries.items()},
+                'screens': {name: histogram.as_dict() for name, histogram in self.screens.items()},
+            }
+
+    def prometheus(self):
+        lines = []
+
+        def histogram(metric, label, histograms):
+            lines.append(f'# TYPE {metric} histogram')
+            for value, hist in histograms:
+                value = escape(value)
+                for bound, count in hist.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{metric}_bucket{{{label}="{value}",le="{le}"}} {count}')
+                lines.append(f'{metric}_sum{{{label}="{value}"}} {hist.total}')
+                lines.append(f'{metric}_count{{{label}="{value}"}} {hist.count}')
+
+        with self.lock:
+            lines.append('# HELP bank_query_duration_seconds Время выполнения запросов по отпечатку SQL')
+            histogram('bank_query_duration_seconds', 'fingerprint',
+                      [(key, stats.histogram) for key, stats in self.queries.items()])
+            lines.append('# HELP bank_query_rows_total Число строк, возвращённых или изменённых запросами')
+            lines.append('# TYPE bank_query_rows_total counter')
+            for key, stats in self.queries.items():
+                lines.append(f'bank_query_rows_total{{fingerprint="{escape(key)}"}} {stats.rows}')
+            lines.append('# HELP bank_slow_queries_total Запросы дольше порога медленного журнала')
+            lines.append('# TYPE bank_slow_queries_total counter')
+            for key, stats in self.queries.items():
+                lines.append(f'bank_slow_queries_total{{fingerprint="{escape(key)}"}} {stats.slow}')
+            lines.append('# HELP bank_screen_duration_seconds Время операций интерфейса')
+            histogram('bank_screen_duration_seconds', 'screen', list(self.screens.items()))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        # Формат по расширению: .json - снимок JSON, иначе текстовый формат Prometheus
+        with open(path, 'w', encoding='utf-8') as metrics_file:
+            if path.endswith('.json'):
+                json.dump(self.snapshot(), metrics_file, ensure_ascii=False, indent=2)
+            else:
+                metrics_file.write(self.prometheus())
+
+    def reset(self):
+        with self.lock:
+            self.queries.clear()
+            self.screens.clear()
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+
+
+def configure(slow_threshold_ms, slow_log_file=None):
+    metrics.slow_threshold = slow_threshold_ms / 1000
+    if slow_log_file and not any(isinstance(handler, logging.FileHandler) for handler in slow_log.handlers):
+        handler = logging.FileHandler(slow_log_file, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        slow_log.addHandler(handler)
+        slow_log.setLevel(logging.WARNING)
+        slow_log.propagate = False
+
+
+@contextmanager
+def screen(name):
+    # Время операции интерфейса (загрузка таблицы, экспорт, вход); запросы,
+    # выполненные внутри, попадают в медленный журнал с этим именем
+    previous = getattr(_context, 'screen', None)
+    _context.screen = name
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe_screen(name, time.perf_counter() - started)
+        _context.screen = previous
+
+
+class InstrumentedMixin:
+    # Подмешивается к классу базы данных: замеряет каждый execute_sql
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            cursor = super().execute_sql(sql, params, *args, **kwargs)
+        except Exception:
+            metrics.observe_query(sql, time.perf_counter() - started, 0)
+            raise
+        metrics.observe_query(sql, time.perf_counter() - started, cursor.rowcount)
+        return cursor
@@ -0,0 +1,89 @@
+# live_updates.py
+import json
+import select
+import threading
+
+import psycopg2
+
+from database import settings
+
+# Канал для сотрудников и администраторов: изменения всех таблиц.
+# Клиент слушает только свой канал bank_client_<id> (триггеры миграции 003).
+CHANGES_CHANNEL = 'bank_changes'
+CLIENT_CHANNEL_PREFIX = 'bank_client_'
+
+FLUSH_INTERVAL_MS = 500
+RECONNECT_DELAY = 5  # секунд
+
+
+def client_channel(client_id):
+    return CLIENT_CHANNEL_PREFIX + str(int(client_id))
+
+
+def connect():
+    # Отдельное соединение вне пула: LISTEN действует, пока соединение открыто
+    connection = psycopg2.connect(
+        dbname=settings['name'], user=settings['user'], password=settings['password'],
+        host=settings['host'], port=settings['port'], connect_timeout=int(settings['timeout'])
+    )
+    connection.autocommit = True
+    return connection
+
+
+class ChangeListener:
+    # Слушает NOTIFY в фоновом потоке и копит изменения; раз в FLUSH_INTERVAL_MS
+    # поток Tk получает их одной пачкой {(table, id): op}. Повторные изменения
+    # одной строки схлопываются, поэтому массовая загрузка не заваливает интерфейс.
+    def __init__(self, root, channels, on_changes, flush_interval=FLUSH_INTERVAL_MS):
+        self.root = root
+        self.channels = list(channels)
+        self.on_changes = on_changes
+        self.flush_interval = flush_interval
+        self.changes = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.listen, name='db-listener', daemon=True)
+        self.thread.start()
+        self.root.after(self.flush_interval, self.flush)
+
+    def listen(self):
+        while not self.stopped.is_set():
+            connection = None
+            try:
+                connection = connect()
+                with connection.cursor() as cursor:
+                    for channel in self.channels:
+                        cursor.execute('LISTEN "%s"' % channel)
+                while not self.stopped.is_set():
+                    if select.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self.add(connection.notifies.pop(0).payload)
+            except Exception:
+                # Сервер недоступен или соединение разорвано - переподключаемся
+                self.stopped.wait(RECONNECT_DELAY)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    def add(self, payload):
+        try:
+            change = json.loads(payload)
+            key = (change['table'], change['id'])
+        except (ValueError, KeyError, TypeError):
+            return
+        with self.lock:
+            self.changes[key] = change['op']
+
+    def flush(self):
+        if self.stopped.is_set():
+            return
+        with self.lock:
+            changes, self.changes = self.changes, {}
+        if changes:
+            self.on_changes(changes)
+        self.root.after(self.flush_interval, self.flush)
+
+    def stop(self):
+        self.stopped.set()
@@ -1,5 +1,4 @@
 import gui
-from werkzeug.security import generate_password_hash, check_password_hash  # For password hashing
 
 def main():
     app = gui.App()
@@ -0,0 +1,77 @@
+import json
+
+from models import db, Bank_Account, Transaction
+from queries import PAGE_SIZE, scoped_query, sort_order, ordering
+
+# Индексы для горячих путей load_table. CREATE INDEX CONCURRENTLY не блокирует
+# запись в таблицу, поэтому миграцию можно применять к работающей базе.
+# Имена совпадают с теми, что создаёт peewee для ForeignKeyField, чтобы
+# IF NOT EXISTS не дублировал уже существующие индексы.
+INDEXES = [
+    ('bank_account_client_id', 'bank_account', 'client_id'),
+    ('bank_account_card_id', 'bank_account', 'card_id'),
+    ('bank_account_loan_id', 'bank_account', 'loan_id'),
+    ('bank_account_deposit_id', 'bank_account', 'deposit_id'),
+    ('transaction_bank_account_from', 'transaction', 'bank_account_from'),
+    ('transaction_bank_account_to', 'transaction', 'bank_account_to'),
+    ('transaction_date_time_id', 'transaction', 'date, time, id'),
+]
+
+
+def sample_client_id():
+    cursor = db.execute_sql(
+        "SELECT client_id FROM bank_account WHERE client_id IS NOT NULL "
+        "GROUP BY client_id ORDER BY count(*) DESC LIMIT 1"
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def explain(label, query):
+    sql, params = query.sql()
+    cursor = db.execute_sql('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql, params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return label, plan[0]['Plan']['Node Type'], plan[0]['Execution Time']
+
+
+def explain_hot_paths(client_id):
+    if client_id is None:
+        return []
+    results = []
+    for model in (Bank_Account, Transaction):
+        query = scoped_query(model, 'client', client_id)
+        query = query.order_by(*ordering(sort_order(model))).limit(PAGE_SIZE)
+        results.append(explain(f'client {model.__name__}', query))
+    query = Transaction.select().order_by(Transaction.date.desc(), Transaction.time.desc()).limit(PAGE_SIZE)
+    results.append(explain('latest transactions', query))
+    return results
+
+
+def drop_invalid_index(name):
+    # Прерванный CREATE INDEX CONCURRENTLY оставляет невалидный индекс
+    cursor = db.execute_sql(
+        "SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = %s", (name,)
+    )
+    row = cursor.fetchone()
+    if row and row[0]:
+        db.execute_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+with db.connection_context():
+    client_id = sample_client_id()
+    before = explain_hot_paths(client_id)
+
+    for name, table, columns in INDEXES:
+        drop_invalid_index(name)
+        db.execute_sql(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" ({columns})')
+    db.execute_sql('ANALYZE "bank_account"')
+    db.execute_sql('ANALYZE "transaction"')
+
+    after = explain_hot_paths(client_id)
+
+print("Migration: Added hot path indexes to 'Bank_Account' and 'Transaction' tables.")
+for (label, node_before, time_before), (_, node_after, time_after) in zip(before, after):
+    print(f"  {label}: {node_before} {time_before:.2f} ms -> {node_after} {time_after:.2f} ms")
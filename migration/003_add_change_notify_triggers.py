@@ -0,0 +1,83 @@
+from models import db
+from queries import TABLES
+from live_updates import CHANGES_CHANNEL, CLIENT_CHANNEL_PREFIX
+
+# Триггеры NOTIFY на изменения таблиц приложения. Полезная нагрузка -
+# {"table": ..., "op": ..., "id": ...}. Все изменения уходят в общий канал
+# для сотрудников; изменения, касающиеся клиента (его счета, карты, вклады,
+# кредиты, операции и личные данные), дополнительно - в канал этого клиента.
+# Имя таблицы передаётся аргументом триггера: у секционированной transaction
+# триггер копируется на каждую секцию, и TG_TABLE_NAME там - имя секции.
+FUNCTION = """
+CREATE OR REPLACE FUNCTION notify_bank_change() RETURNS trigger AS $$
+DECLARE
+    records jsonb[];
+    data jsonb;
+    payload text;
+    clients integer[] := '{}';
+    target integer;
+    table_name text := coalesce(TG_ARGV[0], TG_TABLE_NAME);
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        records := ARRAY[to_jsonb(NEW)];
+    ELSIF TG_OP = 'DELETE' THEN
+        records := ARRAY[to_jsonb(OLD)];
+    ELSE
+        records := ARRAY[to_jsonb(OLD), to_jsonb(NEW)];
+    END IF;
+
+    data := records[array_length(records, 1)];
+    payload := jsonb_build_object('table', table_name, 'op', TG_OP, 'id', data->'id')::text;
+    PERFORM pg_notify('%(changes)s', payload);
+
+    -- При UPDATE учитываются и старая, и новая версия строки (например, счёт
+    -- перешёл к другому клиенту - узнать должны оба)
+    FOREACH data IN ARRAY records LOOP
+        IF table_name = 'client' THEN
+            clients := clients || (data->>'id')::integer;
+        ELSIF table_name = 'bank_account' THEN
+            clients := clients || (data->>'client_id')::integer;
+        ELSIF table_name = 'transaction' THEN
+            clients := clients || ARRAY(
+                SELECT b.client_id FROM bank_account b
+                WHERE b.id IN ((data->>'bank_account_from')::integer, (data->>'bank_account_to')::integer));
+        ELSIF table_name = 'deposit' THEN
+            clients := clients || ARRAY(
+                SELECT b.client_id FROM bank_account b WHERE b.deposit_id = (data->>'id')::integer);
+        ELSIF table_name = 'loan' THEN
+            clients := clients || ARRAY(
+                SELECT b.client_id FROM bank_account b WHERE b.loan_id = (data->>'id')::integer);
+        ELSIF table_name = 'card' THEN
+            clients := clients || ARRAY(
+                SELECT b.client_id FROM bank_account b WHERE b.card_id = (data->>'id')::integer);
+        ELSIF table_name = 'personal_data' THEN
+            clients := clients || ARRAY(
+                SELECT c.id FROM client c WHERE c.personal_data_id = (data->>'id')::integer);
+        ELSIF table_name = 'organization_data' THEN
+            clients := clients || ARRAY(
+                SELECT c.id FROM client c WHERE c.organization_data_id = (data->>'id')::integer);
+        END IF;
+    END LOOP;
+
+    FOR target IN SELECT DISTINCT unnest(clients) LOOP
+        IF target IS NOT NULL THEN
+            PERFORM pg_notify('%(client_prefix)s' || target, payload);
+        END IF;
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""" % {'changes': CHANGES_CHANNEL, 'client_prefix': CLIENT_CHANNEL_PREFIX}
+
+with db.connection_context():
+    with db.atomic():
+        db.execute_sql(FUNCTION)
+        for model in TABLES.values():
+            table = model._meta.table_name
+            db.execute_sql(f'DROP TRIGGER IF EXISTS bank_change_notify ON "{table}"')
+            db.execute_sql(
+                f'CREATE TRIGGER bank_change_notify AFTER INSERT OR UPDATE OR DELETE ON "{table}" '
+                f"FOR EACH ROW EXECUTE FUNCTION notify_bank_change('{table}')"
+            )
+
+print("Migration: Added NOTIFY triggers for live updates to all application tables.")
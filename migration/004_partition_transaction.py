@@ -0,0 +1,112 @@
+import json
+from datetime import date
+
+from models import db, Transaction
+from queries import PAGE_SIZE, sort_order, ordering
+from partitions import (
+    TABLE, add_months, month_start, check_insert, create_default_partition, ensure_partitions, is_partitioned
+)
+
+# Перевод transaction в таблицу, секционированную по date помесячно.
+# Первичный ключ секционированной таблицы обязан включать ключ секционирования,
+# поэтому он становится (id, date); id по-прежнему выдаёт та же последовательность.
+# Данные копируются в новую таблицу, индексы и внешние ключи создаются после
+# загрузки; индексы старой таблицы (в том числе из миграции 006, если она уже
+# применена) переносятся на новую. Триггеры 003 и 006 пересоздаются с именем
+# таблицы в аргументе. Миграция выполняется в одной транзакции и блокирует
+# запись в transaction на время копирования; повторный запуск ничего не меняет.
+TRIGGERS = [('bank_change_notify', 'notify_bank_change'), ('summary_dirty_mark', 'mark_summary_dirty')]
+INDEXES = [
+    ('transaction_date_time_id', 'date, time, id'),
+    ('transaction_bank_account_from', 'bank_account_from'),
+    ('transaction_bank_account_to', 'bank_account_to'),
+]
+
+
+def recent_month_query():
+    # Операции последнего месяца с данными - типичный ограниченный по дате просмотр
+    last = Transaction.select(Transaction.date).order_by(Transaction.date.desc()).limit(1).scalar()
+    start = month_start(last or date.today())
+    query = Transaction.select().where((Transaction.date >= start) & (Transaction.date < add_months(start, 1)))
+    return query.order_by(*ordering(sort_order(Transaction))).limit(PAGE_SIZE)
+
+
+def explain(query):
+    sql, params = query.sql()
+    plan = db.execute_sql('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql, params).fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    relations = set()
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if 'Relation Name' in node:
+            relations.add(node['Relation Name'])
+        nodes.extend(node.get('Plans', []))
+    return plan[0]['Execution Time'], len(relations)
+
+
+def has_function(name):
+    return db.execute_sql("SELECT 1 FROM pg_proc WHERE proname = %s", (name,)).fetchone() is not None
+
+
+def index_definitions():
+    # CREATE INDEX ... ON public."transaction" ... для всех индексов, кроме первичного ключа
+    cursor = db.execute_sql(
+        "SELECT pg_get_indexdef(x.indexrelid) FROM pg_index x "
+        "WHERE x.indrelid = to_regclass(%s) AND NOT x.indisprimary", (f'"{TABLE}"',)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def partition():
+    time_before, scanned_before = explain(recent_month_query())
+
+    with db.atomic():
+        db.execute_sql(f'LOCK TABLE "{TABLE}" IN EXCLUSIVE MODE')
+        first, = db.execute_sql(f'SELECT min(date) FROM "{TABLE}"').fetchone()
+        sequence, = db.execute_sql("SELECT pg_get_serial_sequence(%s, 'id')", (f'"{TABLE}"',)).fetchone()
+        indexes = index_definitions()
+
+        db.execute_sql(f'CREATE TABLE "{TABLE}_new" (LIKE "{TABLE}" INCLUDING DEFAULTS) PARTITION BY RANGE (date)')
+        db.execute_sql(f'ALTER SEQUENCE {sequence} OWNED BY "{TABLE}_new".id')
+
+        # Секции создаются на имени новой таблицы, затем она получает имя transaction
+        db.execute_sql(f'ALTER TABLE "{TABLE}" RENAME TO "{TABLE}_old"')
+        db.execute_sql(f'ALTER TABLE "{TABLE}_new" RENAME TO "{TABLE}"')
+        ensure_partitions(first_month=first)
+        # Операции с пустой датой или за месяцы без секции
+        create_default_partition()
+        db.execute_sql(f'INSERT INTO "{TABLE}" SELECT * FROM "{TABLE}_old"')
+        db.execute_sql(f'DROP TABLE "{TABLE}_old"')
+
+        db.execute_sql(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY (id, date)')
+        for column in ('bank_account_from', 'bank_account_to'):
+            db.execute_sql(f'ALTER TABLE "{TABLE}" ADD FOREIGN KEY ({column}) '
+                           f'REFERENCES "bank_account" (id) ON DELETE SET NULL')
+        # Имена освободились вместе со старой таблицей
+        for definition in indexes:
+            db.execute_sql(definition)
+        for name, columns in INDEXES:
+            db.execute_sql(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{TABLE}" ({columns})')
+        for trigger, function in TRIGGERS:
+            if has_function(function):
+                db.execute_sql(f'CREATE TRIGGER {trigger} AFTER INSERT OR UPDATE OR DELETE ON "{TABLE}" '
+                               f"FOR EACH ROW EXECUTE FUNCTION {function}('{TABLE}')")
+        check_insert()
+
+    db.execute_sql(f'ANALYZE "{TABLE}"')
+    time_after, scanned_after = explain(recent_month_query())
+    return time_before, scanned_before, time_after, scanned_after
+
+
+with db.connection_context():
+    timings = None if is_partitioned() else partition()
+
+if timings is None:
+    print("Migration: 'Transaction' is already partitioned, nothing to do.")
+else:
+    time_before, scanned_before, time_after, scanned_after = timings
+    print("Migration: Converted 'Transaction' to a table range-partitioned by month on 'date'.")
+    print(f"  last month page: {time_before:.2f} ms ({scanned_before} relation) -> "
+          f"{time_after:.2f} ms ({scanned_after} partition(s) scanned)")
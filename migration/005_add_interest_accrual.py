@@ -0,0 +1,8 @@
+from models import db, Accrual_Run, Accrual
+
+# Таблицы пакетного начисления процентов (accrual.py): результаты по каждому
+# продукту за месяц и контрольные точки запусков
+with db.connection_context():
+    db.create_tables([Accrual_Run, Accrual])
+
+print("Migration: Added 'Accrual_Run' and 'Accrual' tables for monthly interest accrual.")
@@ -0,0 +1,89 @@
+import time
+
+from models import db, Summary_Dirty, Account_Summary, Client_Summary
+from summaries import refresh_summaries
+
+# Сводки по клиентам и счетам (summaries.py). Триггер на таблицах, от которых
+# зависят сводки, отмечает в summary_dirty затронутые счета и клиентов:
+# операции - оба счёта, карта/кредит/вклад - счета, к которым они привязаны,
+# счёт - сам счёт и его старого и нового клиента. Вид таблицы передаётся
+# аргументом триггера (на секциях transaction TG_TABLE_NAME - имя секции).
+FUNCTION = """
+CREATE OR REPLACE FUNCTION mark_summary_dirty() RETURNS trigger AS $$
+DECLARE
+    records jsonb[];
+    data jsonb;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        records := ARRAY[to_jsonb(NEW)];
+    ELSIF TG_OP = 'DELETE' THEN
+        records := ARRAY[to_jsonb(OLD)];
+    ELSE
+        records := ARRAY[to_jsonb(OLD), to_jsonb(NEW)];
+    END IF;
+
+    FOREACH data IN ARRAY records LOOP
+        CASE TG_ARGV[0]
+        WHEN 'client' THEN
+            INSERT INTO summary_dirty (kind, item_id) VALUES ('client', (data->>'id')::integer)
+            ON CONFLICT DO NOTHING;
+        WHEN 'bank_account' THEN
+            INSERT INTO summary_dirty (kind, item_id)
+            SELECT kind, item_id FROM (VALUES ('account', (data->>'id')::integer),
+                                              ('client', (data->>'client_id')::integer)) v (kind, item_id)
+            WHERE item_id IS NOT NULL
+            ON CONFLICT DO NOTHING;
+        WHEN 'transaction' THEN
+            INSERT INTO summary_dirty (kind, item_id)
+            SELECT 'account', item_id FROM unnest(ARRAY[(data->>'bank_account_from')::integer,
+                                                        (data->>'bank_account_to')::integer]) item_id
+            WHERE item_id IS NOT NULL
+            ON CONFLICT DO NOTHING;
+        -- Карта, кредит, вклад: счета, к которым привязан продукт
+        WHEN 'card' THEN
+            INSERT INTO summary_dirty (kind, item_id)
+            SELECT 'account', id FROM bank_account WHERE card_id = (data->>'id')::integer
+            ON CONFLICT DO NOTHING;
+        WHEN 'loan' THEN
+            INSERT INTO summary_dirty (kind, item_id)
+            SELECT 'account', id FROM bank_account WHERE loan_id = (data->>'id')::integer
+            ON CONFLICT DO NOTHING;
+        WHEN 'deposit' THEN
+            INSERT INTO summary_dirty (kind, item_id)
+            SELECT 'account', id FROM bank_account WHERE deposit_id = (data->>'id')::integer
+            ON CONFLICT DO NOTHING;
+        ELSE
+            RAISE EXCEPTION 'mark_summary_dirty: неизвестная таблица %', TG_ARGV[0];
+        END CASE;
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+TABLES = ['client', 'bank_account', 'card', 'loan', 'deposit', 'transaction']
+# Оборот за месяц и последняя операция по счёту читаются по этим индексам
+INDEXES = [
+    ('transaction_bank_account_to_date', 'transaction', 'bank_account_to, date'),
+    ('transaction_bank_account_from_date', 'transaction', 'bank_account_from, date'),
+    ('client_summary_last_activity', 'client_summary', 'last_activity DESC NULLS LAST, client_id'),
+]
+
+with db.connection_context():
+    with db.atomic():
+        db.create_tables([Summary_Dirty, Account_Summary, Client_Summary])
+        for name, table, columns in INDEXES:
+            db.execute_sql(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({columns})')
+        db.execute_sql(FUNCTION)
+        for table in TABLES:
+            db.execute_sql(f'DROP TRIGGER IF EXISTS summary_dirty_mark ON "{table}"')
+            db.execute_sql(
+                f'CREATE TRIGGER summary_dirty_mark AFTER INSERT OR UPDATE OR DELETE ON "{table}" '
+                f"FOR EACH ROW EXECUTE FUNCTION mark_summary_dirty('{table}')"
+            )
+
+    started = time.perf_counter()
+    accounts, clients = refresh_summaries(full=True)
+    elapsed = time.perf_counter() - started
+
+print("Migration: Added per-client and per-account summary tables with incremental refresh triggers.")
+print(f"  initial build: {accounts} accounts, {clients} clients in {elapsed:.1f} s")
@@ -123,3 +123,81 @@ class Transaction(BaseModel):
         Bank_Account, backref='Transaction', null=True, on_delete='SET NULL', column_name='bank_account_to'
     )
 
+    class Meta:
+        indexes = (
+            (('date', 'time', 'id'), False),
+        )
+
+
+class Accrual_Run(BaseModel):
+    # Запуск начисления процентов за месяц по одному виду продуктов;
+    # last_id - последний обработанный id, по нему прерванный запуск продолжается
+    id = AutoField()
+    period = DateField()
+    product_type = CharField(max_length=20)
+    last_id = IntegerField(default=0)
+    processed = IntegerField(default=0)
+    skipped = IntegerField(default=0)
+    started_at = DateTimeField()
+    finished_at = DateTimeField(null=True)
+
+    class Meta:
+        indexes = (
+            (('period', 'product_type'), True),
+        )
+
+
+class Accrual(BaseModel):
+    # Начисленные за месяц проценты и остаток по вкладу или кредиту на конец месяца
+    id = AutoField()
+    period = DateField()
+    product_type = CharField(max_length=20)
+    product_id = IntegerField()
+    accrued_interest = DecimalField(max_digits=14, decimal_places=2)
+    balance = DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        indexes = (
+            (('product_type', 'period', 'product_id'), True),
+        )
+
+
+class Summary_Dirty(BaseModel):
+    # Ключи сводок, затронутые изменениями с последнего обновления (триггеры миграции 006)
+    kind = CharField(max_length=10)
+    item_id = IntegerField()
+
+    class Meta:
+        primary_key = CompositeKey('kind', 'item_id')
+
+
+class Account_Summary(BaseModel):
+    bank_account = ForeignKeyField(Bank_Account, primary_key=True, backref='summary', on_delete='CASCADE')
+    client_id = IntegerField(null=True, index=True)
+    card_id = IntegerField(null=True)
+    loan_id = IntegerField(null=True)
+    deposit_id = IntegerField(null=True)
+    card_balance = DecimalField(max_digits=14, decimal_places=2)
+    loan_amount = DecimalField(max_digits=14, decimal_places=2)
+    deposit_amount = DecimalField(max_digits=14, decimal_places=2)
+    month = DateField()
+    month_inflow = DecimalField(max_digits=16, decimal_places=2)
+    month_outflow = DecimalField(max_digits=16, decimal_places=2)
+    last_activity = DateField(null=True)
+    refreshed_at = DateTimeField()
+
+
+class Client_Summary(BaseModel):
+    client = ForeignKeyField(Client, primary_key=True, backref='summary', on_delete='CASCADE')
+    accounts = IntegerField()
+    cards = IntegerField()
+    loans = IntegerField()
+    deposits = IntegerField()
+    card_balance = DecimalField(max_digits=16, decimal_places=2)
+    loan_total = DecimalField(max_digits=16, decimal_places=2)
+    deposit_total = DecimalField(max_digits=16, decimal_places=2)
+    month = DateField()
+    month_inflow = DecimalField(max_digits=16, decimal_places=2)
+    month_outflow = DecimalField(max_digits=16, decimal_places=2)
+    last_activity = DateField(null=True)
+    refreshed_at = DateTimeField()
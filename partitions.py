@@ -0,0 +1,135 @@
+# partitions.py
+import argparse
+from datetime import date
+
+from models import db
+
+# Таблица transaction секционирована по date помесячно (миграция 004).
+# Секции создаются заранее на PARTITIONS_AHEAD месяцев вперёд; старые секции
+# отсоединяются и переносятся в схему ARCHIVE_SCHEMA, где их можно выгрузить
+# или удалить, не трогая рабочую таблицу. Строки вне созданных месяцев (и с
+# пустой датой) попадают в секцию по умолчанию, а не в ошибку вставки.
+TABLE = 'transaction'
+PARTITIONS_AHEAD = 3
+ARCHIVE_SCHEMA = 'archive'
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month, table=TABLE):
+    return f'{table}_y{month.year}m{month.month:02d}'
+
+
+def default_partition_name(table=TABLE):
+    return f'{table}_default'
+
+
+def create_default_partition(table=TABLE):
+    name = default_partition_name(table)
+    db.execute_sql(f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" DEFAULT')
+    return name
+
+
+def create_partition(month, table=TABLE):
+    # Если строки этого месяца уже попали в секцию по умолчанию, PostgreSQL не
+    # даст создать секцию поверх них. Поэтому секция по умолчанию на время
+    # отсоединяется, её строки за месяц переносятся в новую секцию, и она
+    # присоединяется обратно - всё в одной транзакции
+    name = partition_name(month, table)
+    default = default_partition_name(table)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    with db.atomic():
+        has_default = default in list_partitions(table)
+        if has_default:
+            db.execute_sql(f'ALTER TABLE "{table}" DETACH PARTITION "{default}"')
+        db.execute_sql(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+        if has_default:
+            db.execute_sql(
+                f'WITH moved AS (DELETE FROM "{default}" WHERE date >= %s AND date < %s RETURNING *) '
+                f'INSERT INTO "{name}" SELECT * FROM moved', (start, end)
+            )
+            db.execute_sql(f'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT')
+    return name
+
+
+def check_insert(table=TABLE):
+    # Пробная вставка операции со всеми триггерами таблицы; откатывается
+    # до точки сохранения, в базе ничего не остаётся. Ошибка триггера на
+    # секции всплывает здесь, а не при первом переводе
+    with db.atomic() as savepoint:
+        db.execute_sql(f'INSERT INTO "{table}" (date, time, amount_money) VALUES (current_date, localtime(0), 0)')
+        savepoint.rollback()
+
+
+def list_partitions(table=TABLE):
+    # Имена секций в порядке их диапазонов
+    cursor = db.execute_sql(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname", ('"%s"' % table,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def is_partitioned(table=TABLE):
+    cursor = db.execute_sql("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", ('"%s"' % table,))
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def ensure_partitions(first_month=None, ahead=PARTITIONS_AHEAD, today=None, table=TABLE):
+    # Секции с first_month (по умолчанию - текущий месяц) до текущего месяца + ahead.
+    # До миграции 004 таблица обычная - тогда ничего не делается.
+    if not is_partitioned(table):
+        return []
+    current = month_start(today or date.today())
+    month = month_start(first_month) if first_month else current
+    created = []
+    existing = set(list_partitions(table))
+    while month <= add_months(current, ahead):
+        if partition_name(month, table) not in existing:
+            created.append(create_partition(month, table))
+        month = add_months(month, 1)
+    return created
+
+
+def archive_partitions(keep_months, today=None, table=TABLE, schema=ARCHIVE_SCHEMA):
+    # Отсоединяет секции старше keep_months месяцев и переносит их в архивную схему
+    cutoff = add_months(month_start(today or date.today()), -keep_months)
+    archived = []
+    db.execute_sql(f'CREATE SCHEMA IF NOT EXISTS "{schema}"')
+    for name in list_partitions(table):
+        if name != default_partition_name(table) and name < partition_name(cutoff, table):
+            with db.atomic():
+                db.execute_sql(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                db.execute_sql(f'ALTER TABLE "{name}" SET SCHEMA "{schema}"')
+            archived.append(name)
+    return archived
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание секций таблицы transaction")
+    parser.add_argument('--ahead', type=int, default=PARTITIONS_AHEAD, help="На сколько месяцев вперёд создать секции")
+    parser.add_argument('--archive-after', type=int,
+                        help="Перенести в архив секции старше этого числа месяцев")
+    args = parser.parse_args()
+
+    with db.connection_context():
+        for name in ensure_partitions(ahead=args.ahead):
+            print(f"Создана секция {name}")
+        if args.archive_after is not None:
+            for name in archive_partitions(args.archive_after):
+                print(f"Секция {name} перенесена в схему {ARCHIVE_SCHEMA}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+# queries.py
+import json
+import operator
+from datetime import date, time
+from decimal import Decimal, InvalidOperation
+
+from peewee import (
+    AutoField, Case, CharField, DateField, DecimalField, ForeignKeyField, IntegerField,
+    TextField, TimeField
+)
+
+from models import (
+    Organization_Data, Personal_Data, Client, Employee, Deposit, Loan,
+    Card, Bank_Account, Transaction, Users, db
+)
+
+PAGE_SIZE = 200
+
+TABLES = {
+    'Users': Users,
+    'Organization_Data': Organization_Data,
+    'Personal_Data': Personal_Data,
+    'Client': Client,
+    'Employee': Employee,
+    'Deposit': Deposit,
+    'Loan': Loan,
+    'Card': Card,
+    'Bank_Account': Bank_Account,
+    'Transaction': Transaction
+}
+
+
+def client_account_ids(client_id):
+    return Bank_Account.select(Bank_Account.id).where(Bank_Account.client == client_id)
+
+
+def period_bounds(period):
+    # period - (date_from, date_to), любая граница может быть None; date_to не включается.
+    # Условия на Transaction.date позволяют PostgreSQL отсечь лишние секции.
+    if period is None:
+        return []
+    date_from, date_to = period
+    bounds = []
+    if date_from is not None:
+        bounds.append(Transaction.date >= date_from)
+    if date_to is not None:
+        bounds.append(Transaction.date < date_to)
+    return bounds
+
+
+def client_transactions(client_id, period=None):
+    # История операций клиента одним запросом: id входящих и исходящих операций
+    # собираются через UNION (каждая ветка идёт по индексу своего внешнего
+    # ключа, дубли внутренних переводов убираются), направление - колонка direction.
+    # Границы периода повторяются в каждой ветке, чтобы отсечение секций работало и там.
+    accounts = client_account_ids(client_id)
+    bounds = period_bounds(period)
+    outgoing = Transaction.bank_account_from.in_(accounts)
+    incoming = Transaction.bank_account_to.in_(accounts)
+    ids = (Transaction.select(Transaction.id).where(outgoing, *bounds) |
+           Transaction.select(Transaction.id).where(incoming, *bounds))
+    direction = Case(None, [
+        (outgoing & incoming, 'внутренняя'),
+        (outgoing, 'исходящая'),
+    ], 'входящая')
+    return (Transaction
+            .select(*Transaction._meta.sorted_fields, direction.alias('direction'))
+            .where(Transaction.id.in_(ids), *bounds))
+
+
+def scoped_query(model, user_status, client_id=None, period=None):
+    # Запрос к таблице с учётом прав пользователя; None, если таблица недоступна.
+    # period ограничивает операции по дате (только для Transaction).
+    if user_status in ('admin', 'employee'):
+        query = model.select()
+        if user_status == 'employee' and model is Users:
+            query = query.where(Users.status == 'client')  # Only clients for employees
+        if model is Transaction and period_bounds(period):
+            query = query.where(*period_bounds(period))
+        return query
+    if user_status != 'client' or not client_id:
+        return None
+
+    if model is Personal_Data:
+        return model.select().where(model.id.in_(
+            Client.select(Client.personal_data).where(Client.id == client_id)
+        ))
+    if model is Organization_Data:
+        return model.select().where(model.id.in_(
+            Client.select(Client.organization_data).where(Client.id == client_id)
+        ))
+    if model is Client:
+        return model.select().where(Client.id == client_id)
+    if model is Bank_Account:
+        return model.select().where(Bank_Account.client == client_id)
+    if model is Deposit:
+        return model.select().where(model.id.in_(
+            Bank_Account.select(Bank_Account.deposit).where(Bank_Account.client == client_id)
+        ))
+    if model is Loan:
+        return model.select().where(model.id.in_(
+            Bank_Account.select(Bank_Account.loan).where(Bank_Account.client == client_id)
+        ))
+    if model is Card:
+        return model.select().where(model.id.in_(
+            Bank_Account.select(Bank_Account.card).where(Bank_Account.client == client_id)
+        ))
+    if model is Transaction:
+        return client_transactions(client_id, period)
+    return None
+
+
+def query_columns(query):
+    # Имена колонок в порядке значений кортежа .tuples()
+    return [node.name for node in query._returning]
+
+
+def sort_order(model, sort_column=None, descending=False):
+    # Порядок строк: выбранная колонка и первичный ключ для однозначности
+    pk = model._meta.primary_key
+    if sort_column is None and model is Transaction:
+        return [(Transaction.date, False), (Transaction.time, False), (pk, False)]
+    if sort_column is None or sort_column == pk.name:
+        return [(pk, descending)]
+    return [(model._meta.fields[sort_column], descending), (pk, False)]
+
+
+def row_cursor(order, columns, record):
+    return tuple(record[columns.index(field.name)] for field, _ in order)
+
+
+def after_condition(order, cursor):
+    # Условие "строка идёт после cursor" при данном порядке. NULL в PostgreSQL
+    # больше любого значения: ASC ставит их в конец, DESC - в начало.
+    (field, descending), rest = order[0], order[1:]
+    value = cursor[0]
+    tail = after_condition(rest, cursor[1:]) if rest else None
+
+    if value is None:
+        if descending:
+            condition = field.is_null(False)
+            return condition | (field.is_null() & tail) if tail is not None else condition
+        return field.is_null() & tail if tail is not None else None
+
+    condition = field < value if descending else field > value
+    if not descending and field.null:
+        condition = condition | field.is_null()
+    if tail is not None:
+        condition = condition | ((field == value) & tail)
+    return condition
+
+
+def ordering(order):
+    return [field.desc() if descending else field.asc() for field, descending in order]
+
+
+def fetch_page(query, order, after=None, before=None, limit=PAGE_SIZE):
+    # Keyset-пагинация: WHERE (col, id) > (last_col, last_id) ORDER BY col, id LIMIT n.
+    # Строки возвращаются кортежами, внешние ключи - сырыми id (без ленивых запросов)
+    if before is not None:
+        reverse = [(field, not descending) for field, descending in order]
+        condition = after_condition(reverse, before)
+        if condition is None:
+            return []
+        page = query.where(condition).order_by(*ordering(reverse)).limit(limit)
+        return list(reversed(list(page.tuples())))
+    if after is not None:
+        condition = after_condition(order, after)
+        if condition is None:
+            return []
+        query = query.where(condition)
+    return list(query.order_by(*ordering(order)).limit(limit).tuples())
+
+
+FILTER_OPERATORS = (
+    ('>=', operator.ge), ('<=', operator.le), ('!=', operator.ne),
+    ('>', operator.gt), ('<', operator.lt), ('=', operator.eq),
+)
+
+
+def parse_value(field, text):
+    # Приводит текст фильтра к типу поля модели
+    target = field.rel_field if isinstance(field, ForeignKeyField) else field
+    try:
+        if isinstance(target, (AutoField, IntegerField)):
+            return int(text)
+        if isinstance(target, DecimalField):
+            return Decimal(text.replace(',', '.'))
+        if isinstance(target, DateField):
+            return date.fromisoformat(text)
+        if isinstance(target, TimeField):
+            return time.fromisoformat(text)
+    except (ValueError, InvalidOperation):
+        raise ValueError(f"Неверное значение фильтра для поля {field.name}: {text}")
+    return text
+
+
+def filter_condition(field, text):
+    # Текстовые поля: подстрока без учёта регистра; остальные: "=", ">", "<=" и т.д.
+    text = text.strip()
+    if text.lower() == 'null':
+        return field.is_null()
+    compare = None
+    for prefix, func in FILTER_OPERATORS:
+        if text.startswith(prefix):
+            compare = func
+            text = text[len(prefix):].strip()
+            break
+    if compare is None and isinstance(field, (CharField, TextField)):
+        pattern = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return field.ilike(f'%{pattern}%')
+    return (compare or operator.eq)(field, parse_value(field, text))
+
+
+def apply_filters(query, model, filters):
+    conditions = [filter_condition(model._meta.fields[col], text)
+                  for col, text in filters.items() if text.strip()]
+    return query.where(*conditions) if conditions else query
+
+
+def estimate_count(query, model):
+    # Оценка числа строк без COUNT(*): pg_class.reltuples для всей таблицы,
+    # оценка планировщика для запросов с фильтром
+    if query._where is None:
+        # У секционированной таблицы оценка - сумма по секциям
+        cursor = db.execute_sql(
+            "SELECT (CASE WHEN p.relkind = 'p' THEN (SELECT coalesce(sum(greatest(c.reltuples, 0)), 0) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = p.oid) "
+            "ELSE p.reltuples END)::bigint FROM pg_class p WHERE p.oid = to_regclass(%s)",
+            ('"%s"' % model._meta.table_name,)
+        )
+        row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+    sql, params = query.sql()
+    cursor = db.execute_sql('EXPLAIN (FORMAT JSON) ' + sql, params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
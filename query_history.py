@@ -0,0 +1,65 @@
+# query_history.py
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+HISTORY_FILE = os.environ.get(
+    'BANK_QUERY_HISTORY',
+    os.path.join(os.path.expanduser('~'), '.bank_app', 'query_history.jsonl')
+)
+MAX_ENTRIES = 1000
+
+_lock = threading.Lock()
+
+
+def normalize(sql):
+    # Один и тот же запрос с разными пробелами и регистром - одна запись для сравнения
+    return re.sub(r'\s+', ' ', sql.strip().rstrip(';')).lower()
+
+
+def record(sql, mode, duration, rows, error=None, history_file=HISTORY_FILE):
+    entry = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'query': sql,
+        'mode': mode,
+        'duration': round(duration, 4),
+        'rows': rows,
+        'error': error,
+    }
+    with _lock:
+        directory = os.path.dirname(history_file)
+        if directory:  # BANK_QUERY_HISTORY может быть просто именем файла
+            os.makedirs(directory, exist_ok=True)
+        with open(history_file, 'a', encoding='utf-8') as history:
+            history.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        trim(history_file)
+    return entry
+
+
+def load(history_file=HISTORY_FILE, query=None):
+    # Записи от новых к старым; с query - только запуски этого запроса
+    if not os.path.exists(history_file):
+        return []
+    entries = []
+    with open(history_file, encoding='utf-8') as history:
+        for line in history:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    if query is not None:
+        key = normalize(query)
+        entries = [entry for entry in entries if normalize(entry['query']) == key]
+    entries.reverse()
+    return entries
+
+
+def trim(history_file):
+    # Файл не растёт бесконечно: при двукратном превышении оставляем MAX_ENTRIES последних
+    with open(history_file, encoding='utf-8') as history:
+        lines = history.readlines()
+    if len(lines) > MAX_ENTRIES * 2:
+        with open(history_file, 'w', encoding='utf-8') as history:
+            history.writelines(lines[-MAX_ENTRIES:])
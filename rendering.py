@@ -0,0 +1,91 @@
+# rendering.py
+import threading
+from collections import OrderedDict
+
+from peewee import ForeignKeyField
+
+from models import Organization_Data, Personal_Data, Employee, Card
+
+# Поле, которое показывается рядом с id связанной записи
+LABEL_FIELDS = {
+    Personal_Data: Personal_Data.fcs,
+    Organization_Data: Organization_Data.organization_name,
+    Employee: Employee.fcs,
+    Card: Card.card_number,
+}
+
+LABEL_CACHE_SIZE = 4096
+
+
+class LabelCache:
+    def __init__(self, maxsize=LABEL_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.labels = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            label = self.labels.get(key)
+            if label is not None:
+                self.labels.move_to_end(key)
+            return label
+
+    def put(self, key, label):
+        with self.lock:
+            self.labels[key] = label
+            self.labels.move_to_end(key)
+            while len(self.labels) > self.maxsize:
+                self.labels.popitem(last=False)
+
+    def discard_model(self, model):
+        with self.lock:
+            for key in [key for key in self.labels if key[0] is model]:
+                del self.labels[key]
+
+
+class RowRenderer:
+    # Превращает строки .tuples() в значения для отображения.
+    # Внешние ключи приходят как сырые id; подписи к ним подгружаются
+    # одним запросом IN (...) на колонку за страницу и кэшируются.
+    def __init__(self, cache_size=LABEL_CACHE_SIZE):
+        self.cache = LabelCache(cache_size)
+
+    def render(self, model, columns, rows):
+        fields = model._meta.fields
+        lookups = {}
+        for index, col in enumerate(columns):
+            field = fields.get(col)
+            if isinstance(field, ForeignKeyField) and field.rel_model in LABEL_FIELDS:
+                lookups[index] = field.rel_model
+
+        if not lookups:
+            return [list(row) for row in rows]
+
+        for index, rel_model in lookups.items():
+            missing = {row[index] for row in rows if row[index] is not None}
+            missing = [pk for pk in missing if self.cache.get((rel_model, pk)) is None]
+            if missing:
+                self.load_labels(rel_model, missing)
+
+        rendered = []
+        for row in rows:
+            values = list(row)
+            for index, rel_model in lookups.items():
+                pk = values[index]
+                if pk is not None:
+                    label = self.cache.get((rel_model, pk))
+                    values[index] = f"{pk} — {label}" if label else pk
+            rendered.append(values)
+        return rendered
+
+    def load_labels(self, rel_model, ids):
+        label_field = LABEL_FIELDS[rel_model]
+        query = (rel_model
+                 .select(rel_model.id, label_field)
+                 .where(rel_model.id.in_(ids))
+                 .tuples())
+        for pk, label in query:
+            self.cache.put((rel_model, pk), label)
+
+    def invalidate(self, model):
+        self.cache.discard_model(model)
@@ -0,0 +1,126 @@
+# result_cache.py
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from peewee import ForeignKeyField
+
+from models import db
+from rendering import LABEL_FIELDS
+
+RESULT_CACHE_BYTES = 32 * 1024 * 1024
+# Записи старше этого возраста (секунд) перед выдачей сверяются со счётчиками
+# изменений в pg_stat_user_tables; None - без проверки
+VERSION_CHECK_AGE = 5.0
+
+TABLE_PATTERN = re.compile(r'(?:FROM|JOIN)\s+"(\w+)"')
+
+
+def query_tables(query, model):
+    # Таблицы, от которых зависит страница: всё, что упомянуто в запросе
+    # (включая подзапросы области видимости клиента), и таблицы подписей
+    # внешних ключей, которые подставляет RowRenderer
+    sql, _ = query.sql()
+    tables = set(TABLE_PATTERN.findall(sql))
+    for field in model._meta.sorted_fields:
+        if isinstance(field, ForeignKeyField) and field.rel_model in LABEL_FIELDS:
+            tables.add(field.rel_model._meta.table_name)
+    return frozenset(tables)
+
+
+def table_versions(tables):
+    # Счётчики вставок/изменений/удалений; статистика обновляется с небольшой
+    # задержкой, поэтому это ловит изменения других пользователей, а свои
+    # изменения сбрасываются из кэша сразу через invalidate. У секционированной
+    # таблицы (transaction после миграции 004) строки лежат в секциях, поэтому
+    # счётчики суммируются по ним
+    tables = sorted(tables)
+    if not tables:
+        return {}
+    cursor = db.execute_sql(
+        "SELECT t.relname, sum(s.n_tup_ins + s.n_tup_upd + s.n_tup_del) FROM pg_class t "
+        "LEFT JOIN pg_inherits i ON t.relkind = 'p' AND i.inhparent = t.oid "
+        "JOIN pg_stat_user_tables s ON s.relid = coalesce(i.inhrelid, t.oid) "
+        "WHERE t.relkind IN ('r', 'p') AND t.relname IN (%s) GROUP BY t.relname"
+        % ', '.join(['%s'] * len(tables)), tables
+    )
+    return dict(cursor.fetchall())
+
+
+def result_size(value):
+    # Грубая оценка занимаемой памяти в байтах
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(result_size(item) for item in value)
+    return size
+
+
+class CacheEntry:
+    def __init__(self, value, tables, versions, size):
+        self.value = value
+        self.tables = tables
+        self.versions = versions
+        self.size = size
+        self.checked = time.monotonic()
+
+
+class ResultCache:
+    # LRU страниц табличного представления с ограничением по памяти.
+    # Ключ составляет вызывающий код: (модель, роль, client_id, страница, сортировка, фильтр).
+    def __init__(self, max_bytes=RESULT_CACHE_BYTES, version_check_age=VERSION_CHECK_AGE):
+        self.max_bytes = max_bytes
+        self.version_check_age = version_check_age
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+        if self.version_check_age is not None and time.monotonic() - entry.checked > self.version_check_age:
+            if table_versions(entry.tables) != entry.versions:
+                self.discard(key)
+                return None
+            entry.checked = time.monotonic()
+        return entry.value
+
+    def versions(self, tables):
+        # Снимок счётчиков берётся до выборки, чтобы не пропустить изменения во время неё
+        return table_versions(tables) if self.version_check_age is not None else None
+
+    def put(self, key, value, tables, versions=None):
+        size = result_size(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            self.pop(key)
+            self.entries[key] = CacheEntry(value, tables, versions, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self.pop(next(iter(self.entries)))
+
+    def pop(self, key):
+        # Вызывается под self.lock
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def discard(self, key):
+        with self.lock:
+            self.pop(key)
+
+    def invalidate(self, model):
+        table = model._meta.table_name
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if table in entry.tables]:
+                self.pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
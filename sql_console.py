@@ -0,0 +1,161 @@
+# sql_console.py
+import json
+import time
+import uuid
+
+from models import db
+
+DEFAULT_ROW_LIMIT = 1000
+DEFAULT_TIMEOUT = 30  # секунд
+
+
+class QueryResult:
+    def __init__(self, columns, rows, has_more, elapsed, rowcount=None):
+        self.columns = columns
+        self.rows = rows
+        self.has_more = has_more
+        self.elapsed = elapsed
+        self.rowcount = rowcount
+
+
+def is_select(sql):
+    return sql.lstrip().lower().startswith(('select', 'with'))
+
+
+class QuerySession:
+    # Выполнение произвольного SQL из вкладки администратора. SELECT читается
+    # через серверный курсор порциями по row_limit, поэтому большой результат
+    # не попадает в память целиком. Все методы вызываются из одного рабочего
+    # потока: курсор и транзакция живут на его соединении между вызовами.
+    def __init__(self):
+        self.cursor = None
+        self.transaction = None
+        self.columns = None
+        self.pid = None
+
+    def start(self, sql, row_limit=DEFAULT_ROW_LIMIT, timeout=DEFAULT_TIMEOUT):
+        self.close()
+        started = time.perf_counter()
+        self.pid = db.execute_sql('SELECT pg_backend_pid()').fetchone()[0]
+
+        if not is_select(sql):
+            with db.atomic():
+                db.execute_sql('SET LOCAL statement_timeout = %s', (int(timeout * 1000),))
+                cursor = db.execute_sql(sql)
+                if cursor.description is None:
+                    return QueryResult(None, [], False, time.perf_counter() - started, cursor.rowcount)
+                columns = [desc[0] for desc in cursor.description]
+                rows = cursor.fetchmany(row_limit)
+                return QueryResult(columns, rows, False, time.perf_counter() - started, cursor.rowcount)
+
+        self.transaction = db.atomic()
+        self.transaction.__enter__()
+        try:
+            db.execute_sql('SET LOCAL statement_timeout = %s', (int(timeout * 1000),))
+            self.cursor = db.connection().cursor(name='console_' + uuid.uuid4().hex)
+            self.cursor.itersize = row_limit
+            self.cursor.execute(sql)
+            rows = self.cursor.fetchmany(row_limit)
+            self.columns = [desc[0] for desc in self.cursor.description]
+        except Exception:
+            self.close()
+            raise
+        return self.page(rows, row_limit, started)
+
+    def fetch_more(self, row_limit=DEFAULT_ROW_LIMIT):
+        if self.cursor is None:
+            return QueryResult(self.columns, [], False, 0.0)
+        started = time.perf_counter()
+        try:
+            rows = self.cursor.fetchmany(row_limit)
+        except Exception:
+            self.close()
+            raise
+        return self.page(rows, row_limit, started)
+
+    def page(self, rows, row_limit, started):
+        has_more = len(rows) == row_limit
+        result = QueryResult(self.columns, rows, has_more, time.perf_counter() - started)
+        if not has_more:
+            self.close()
+        return result
+
+    def explain(self, sql, timeout=DEFAULT_TIMEOUT):
+        self.close()
+        self.pid = db.execute_sql('SELECT pg_backend_pid()').fetchone()[0]
+        return explain(sql, timeout)
+
+    def close(self):
+        if self.cursor is not None:
+            try:
+                self.cursor.close()
+            except Exception:
+                pass
+            self.cursor = None
+        if self.transaction is not None:
+            transaction, self.transaction = self.transaction, None
+            try:
+                transaction.__exit__(None, None, None)
+            except Exception:
+                pass
+
+
+def is_cancelled(error):
+    # Запрос прерван по pg_cancel_backend или statement_timeout (SQLSTATE 57014);
+    # peewee оборачивает исключение psycopg2, поэтому смотрим и исходное
+    candidates = [error, error.__cause__, error.__context__] + list(error.args[:1])
+    return any(getattr(candidate, 'pgcode', None) == '57014' for candidate in candidates)
+
+
+def cancel_backend(pid):
+    # Прерывает запрос, выполняющийся на соединении с данным pid
+    return db.execute_sql('SELECT pg_cancel_backend(%s)', (pid,)).fetchone()[0]
+
+
+def explain(sql, timeout=DEFAULT_TIMEOUT):
+    # EXPLAIN ANALYZE действительно выполняет запрос, поэтому он идёт в
+    # транзакции, которая всегда откатывается: INSERT/UPDATE/DELETE ничего не меняют
+    with db.atomic() as transaction:
+        db.execute_sql('SET LOCAL statement_timeout = %s', (int(timeout * 1000),))
+        plan = db.execute_sql('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql).fetchone()[0]
+        transaction.rollback()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+class PlanNode:
+    def __init__(self, plan, depth=0):
+        self.plan = plan
+        self.depth = depth
+        self.children = [PlanNode(child, depth + 1) for child in plan.get('Plans', [])]
+        loops = plan.get('Actual Loops', 1) or 1
+        self.total_time = plan.get('Actual Total Time', 0.0) * loops
+        # Собственное время узла без времени дочерних узлов
+        self.self_time = max(self.total_time - sum(child.total_time for child in self.children), 0.0)
+        self.rows = plan.get('Actual Rows', 0) * loops
+        self.plan_rows = plan.get('Plan Rows', 0)
+        self.shared_hit = plan.get('Shared Hit Blocks', 0)
+        self.shared_read = plan.get('Shared Read Blocks', 0)
+
+    @property
+    def label(self):
+        label = self.plan['Node Type']
+        if 'Relation Name' in self.plan:
+            label += f" on {self.plan['Relation Name']}"
+        if 'Index Name' in self.plan:
+            label += f" using {self.plan['Index Name']}"
+        return label
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+def plan_tree(explained):
+    # Корень дерева плана и множество самых дорогих узлов по собственному времени
+    root = PlanNode(explained['Plan'])
+    nodes = sorted(root.walk(), key=lambda node: node.self_time, reverse=True)
+    hot = {id(node) for node in nodes[:3] if node.self_time > 0}
+    return root, hot
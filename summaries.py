@@ -0,0 +1,144 @@
+# summaries.py
+import argparse
+import time
+from datetime import date
+
+from models import db, Bank_Account, Account_Summary, Client_Summary
+from partitions import add_months, month_start
+
+# Сводки по счетам и клиентам: продукты, балансы, оборот за текущий месяц и
+# дата последней операции. Триггеры миграции 006 записывают затронутые
+# счета и клиентов в summary_dirty; refresh_summaries пересчитывает только
+# их. Полный пересчёт нужен после создания таблиц, при смене месяца и после
+# загрузок, обходящих триггеры (TRUNCATE, COPY с отключёнными триггерами).
+DASHBOARD_LIMIT = 200
+LOCK_KEY = 4206  # ключ pg_advisory_xact_lock обновления сводок
+
+ACCOUNT_COLUMNS = [
+    ('bank_account', "Счёт"), ('card_balance', "Баланс карты"), ('loan_amount', "Кредит"),
+    ('deposit_amount', "Вклад"), ('month_inflow', "Поступления за месяц"), ('month_outflow', "Списания за месяц"),
+    ('last_activity', "Последняя операция"),
+]
+CLIENT_COLUMNS = [
+    ('client', "Клиент"), ('accounts', "Счетов"), ('cards', "Карт"), ('loans', "Кредитов"), ('deposits', "Вкладов"),
+    ('card_balance', "Баланс карт"), ('loan_total', "Кредиты"), ('deposit_total', "Вклады"),
+    ('month_inflow', "Поступления за месяц"), ('month_outflow', "Списания за месяц"),
+    ('last_activity', "Последняя операция"),
+]
+
+REFRESH_ACCOUNTS = """
+INSERT INTO account_summary (bank_account_id, client_id, card_id, loan_id, deposit_id, card_balance, loan_amount,
+                             deposit_amount, month, month_inflow, month_outflow, last_activity, refreshed_at)
+SELECT b.id, b.client_id, b.card_id, b.loan_id, b.deposit_id,
+       coalesce(c.card_amount, 0), coalesce(l.loan_amount, 0), coalesce(d.deposit_amount, 0), %(month)s,
+       coalesce((SELECT sum(t.amount_money) FROM "transaction" t
+                 WHERE t.bank_account_to = b.id AND t.date >= %(month)s AND t.date < %(next)s), 0),
+       coalesce((SELECT sum(t.amount_money) FROM "transaction" t
+                 WHERE t.bank_account_from = b.id AND t.date >= %(month)s AND t.date < %(next)s), 0),
+       greatest((SELECT max(t.date) FROM "transaction" t WHERE t.bank_account_to = b.id),
+                (SELECT max(t.date) FROM "transaction" t WHERE t.bank_account_from = b.id)),
+       now()
+FROM bank_account b
+LEFT JOIN card c ON c.id = b.card_id
+LEFT JOIN loan l ON l.id = b.loan_id
+LEFT JOIN deposit d ON d.id = b.deposit_id
+WHERE %(all)s OR b.id = ANY(%(accounts)s)
+ON CONFLICT (bank_account_id) DO UPDATE SET
+    client_id = EXCLUDED.client_id, card_id = EXCLUDED.card_id, loan_id = EXCLUDED.loan_id,
+    deposit_id = EXCLUDED.deposit_id, card_balance = EXCLUDED.card_balance, loan_amount = EXCLUDED.loan_amount,
+    deposit_amount = EXCLUDED.deposit_amount, month = EXCLUDED.month, month_inflow = EXCLUDED.month_inflow,
+    month_outflow = EXCLUDED.month_outflow, last_activity = EXCLUDED.last_activity,
+    refreshed_at = EXCLUDED.refreshed_at
+"""
+
+# Клиентская сводка собирается из уже обновлённых сводок его счетов
+REFRESH_CLIENTS = """
+INSERT INTO client_summary (client_id, accounts, cards, loans, deposits, card_balance, loan_total, deposit_total,
+                            month, month_inflow, month_outflow, last_activity, refreshed_at)
+SELECT c.id, count(s.bank_account_id), count(DISTINCT s.card_id), count(DISTINCT s.loan_id),
+       count(DISTINCT s.deposit_id), coalesce(sum(s.card_balance), 0), coalesce(sum(s.loan_amount), 0),
+       coalesce(sum(s.deposit_amount), 0), %(month)s, coalesce(sum(s.month_inflow), 0),
+       coalesce(sum(s.month_outflow), 0), max(s.last_activity), now()
+FROM client c
+LEFT JOIN account_summary s ON s.client_id = c.id
+WHERE %(all)s OR c.id = ANY(%(clients)s)
+GROUP BY c.id
+ON CONFLICT (client_id) DO UPDATE SET
+    accounts = EXCLUDED.accounts, cards = EXCLUDED.cards, loans = EXCLUDED.loans, deposits = EXCLUDED.deposits,
+    card_balance = EXCLUDED.card_balance, loan_total = EXCLUDED.loan_total,
+    deposit_total = EXCLUDED.deposit_total, month = EXCLUDED.month, month_inflow = EXCLUDED.month_inflow,
+    month_outflow = EXCLUDED.month_outflow, last_activity = EXCLUDED.last_activity,
+    refreshed_at = EXCLUDED.refreshed_at
+"""
+
+
+def take_dirty():
+    # Забирает накопленные ключи; изменения, зафиксированные после этого,
+    # попадут в следующее обновление
+    rows = db.execute_sql('DELETE FROM summary_dirty RETURNING kind, item_id').fetchall()
+    accounts = [item_id for kind, item_id in rows if kind == 'account']
+    clients = {item_id for kind, item_id in rows if kind == 'client'}
+    if accounts:
+        clients.update(client for client, in Bank_Account
+                       .select(Bank_Account.client)
+                       .where(Bank_Account.id.in_(accounts) & Bank_Account.client.is_null(False))
+                       .tuples())
+    return accounts, sorted(clients)
+
+
+def refresh_summaries(full=False, today=None):
+    # Возвращает (обновлено счетов, обновлено клиентов)
+    month = month_start(today or date.today())
+    with db.atomic():
+        # Одновременно идёт только одно обновление; остальные сразу возвращаются
+        # и показывают сводки, которые вот-вот будут обновлены
+        if not db.execute_sql('SELECT pg_try_advisory_xact_lock(%s)', (LOCK_KEY,)).fetchone()[0]:
+            return 0, 0
+        # С началом нового месяца оборот «за месяц» устарел у всех
+        full = full or Account_Summary.select().where(Account_Summary.month < month).exists()
+        if full:
+            db.execute_sql('DELETE FROM summary_dirty')
+            accounts, clients = [], []
+        else:
+            accounts, clients = take_dirty()
+            if not accounts and not clients:
+                return 0, 0
+        params = {'all': full, 'accounts': accounts, 'clients': clients, 'month': month,
+                  'next': add_months(month, 1)}
+        refreshed_accounts = db.execute_sql(REFRESH_ACCOUNTS, params).rowcount
+        refreshed_clients = db.execute_sql(REFRESH_CLIENTS, params).rowcount
+    return refreshed_accounts, refreshed_clients
+
+
+def client_summaries(client_id=None, limit=DASHBOARD_LIMIT):
+    # Клиенты с самой свежей активностью (индекс client_summary_last_activity)
+    query = Client_Summary.select(*[getattr(Client_Summary, name) for name, _ in CLIENT_COLUMNS])
+    if client_id is not None:
+        query = query.where(Client_Summary.client == client_id)
+    return list(query
+                .order_by(Client_Summary.last_activity.desc(nulls='LAST'), Client_Summary.client)
+                .limit(limit)
+                .tuples())
+
+
+def account_summaries(client_id):
+    return list(Account_Summary
+                .select(*[getattr(Account_Summary, name) for name, _ in ACCOUNT_COLUMNS])
+                .where(Account_Summary.client_id == client_id)
+                .order_by(Account_Summary.bank_account)
+                .tuples())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обновление сводок по клиентам и счетам")
+    parser.add_argument('--full', action='store_true', help="Пересчитать все сводки")
+    args = parser.parse_args()
+
+    with db.connection_context():
+        started = time.perf_counter()
+        accounts, clients = refresh_summaries(full=args.full)
+    print(f"Обновлено сводок: счетов {accounts}, клиентов {clients} за {time.perf_counter() - started:.2f} с")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+# tests/test_amortization.py
+# Проверка разбора условий кредита: python -m pytest tests
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('peewee')
+
+from amortization import ScheduleError, normalize_term, schedule  # noqa: E402
+
+
+def test_normalize_term():
+    assert normalize_term('24 месяца', 'ежемесячно') == (24, 12)
+    assert normalize_term('1 год', 'ежеквартально') == (12, 4)
+
+
+@pytest.mark.parametrize('loan_term', ['0 месяцев', '0 лет'])
+def test_zero_term_rejected(loan_term):
+    with pytest.raises(ScheduleError):
+        normalize_term(loan_term, 'ежемесячно')
+
+
+@pytest.mark.parametrize('amount', [0, -1000, '0.00'])
+def test_non_positive_amount_rejected(amount):
+    with pytest.raises(ScheduleError):
+        normalize_term('12 месяцев', 'ежемесячно', amount)
+    with pytest.raises(ScheduleError):
+        schedule(amount, 10, '12 месяцев', 'ежемесячно')
+
+
+def test_term_not_multiple_of_period_rejected():
+    with pytest.raises(ScheduleError):
+        normalize_term('13 месяцев', 'ежеквартально')
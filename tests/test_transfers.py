@@ -0,0 +1,69 @@
+# tests/test_transfers.py
+# Проверка проводки пакета переводов без базы: python -m pytest tests
+import os
+import sys
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('peewee')
+
+from transfers import TransferError, parse_amount, plan_transfers  # noqa: E402
+
+NOW = datetime(2026, 10, 18, 12, 30, 15, 123456)
+# счёт -> карта; у счёта 3 карты нет
+ACCOUNTS = {1: 10, 2: 20, 3: None}
+BALANCES = {10: Decimal('100.00'), 20: Decimal('5.00')}
+
+
+def test_transfer_moves_money_between_cards():
+    rows, balances, rejected = plan_transfers([(0, 1, 2, Decimal('30.00'))], ACCOUNTS, BALANCES, NOW)
+    assert rejected == []
+    assert balances == {10: Decimal('70.00'), 20: Decimal('35.00')}
+    assert rows == [{'date': NOW.date(), 'time': NOW.time().replace(microsecond=0), 'amount_money': Decimal('30.00'),
+                     'bank_account_from': 1, 'bank_account_to': 2}]
+    assert BALANCES[10] == Decimal('100.00')
+
+
+def test_deposit_and_withdrawal_change_one_card():
+    transfers = [(0, None, 2, Decimal('10.00')), (1, 1, None, Decimal('100.00'))]
+    rows, balances, rejected = plan_transfers(transfers, ACCOUNTS, BALANCES, NOW)
+    assert rejected == []
+    assert balances == {10: Decimal('0.00'), 20: Decimal('15.00')}
+    assert len(rows) == 2
+
+
+@pytest.mark.parametrize('transfer, reason', [
+    ((0, 1, 1, Decimal('1.00')), "Счета отправителя и получателя совпадают."),
+    ((0, 1, 99, Decimal('1.00')), "Счёт 99 не найден."),
+    ((0, 3, 1, Decimal('1.00')), "К счёту не привязана карта."),
+    ((0, 2, 1, Decimal('5.01')), "Недостаточно средств."),
+])
+def test_rejected_transfer_leaves_balances(transfer, reason):
+    rows, balances, rejected = plan_transfers([transfer], ACCOUNTS, BALANCES, NOW)
+    assert rejected == [(0, reason)]
+    assert rows == []
+    assert balances == BALANCES
+
+
+def test_balance_is_checked_after_earlier_transfers_in_batch():
+    # Второй перевод уже не проходит: первый списал почти всё
+    transfers = [(0, 1, 2, Decimal('90.00')), (1, 1, 2, Decimal('20.00')), (2, 2, 1, Decimal('95.00'))]
+    rows, balances, rejected = plan_transfers(transfers, ACCOUNTS, BALANCES, NOW)
+    assert rejected == [(1, "Недостаточно средств.")]
+    assert balances == {10: Decimal('105.00'), 20: Decimal('0.00')}
+    assert sum(balances.values()) == sum(BALANCES.values())
+    assert len(rows) == 2
+
+
+@pytest.mark.parametrize('amount', ['0', '-5', 'abc'])
+def test_parse_amount_rejects(amount):
+    with pytest.raises(TransferError):
+        parse_amount(amount)
+
+
+def test_parse_amount_accepts_comma():
+    assert parse_amount('12,5') == Decimal('12.50')
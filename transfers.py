@@ -0,0 +1,166 @@
+# transfers.py
+import random
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from peewee import Case
+
+from models import db, Bank_Account, Card, Transaction
+
+MAX_RETRIES = 5
+BATCH_SIZE = 1000
+CENTS = Decimal('0.01')
+
+# SQLSTATE, при которых транзакцию имеет смысл просто повторить
+RETRY_CODES = ('40001', '40P01')  # serialization_failure, deadlock_detected
+
+
+class TransferError(ValueError):
+    pass
+
+
+class BatchResult:
+    def __init__(self):
+        self.transaction_ids = []
+        self.rejected = []  # (номер перевода в пакете, причина)
+        self.retries = 0
+
+
+def error_code(error):
+    # peewee оборачивает исключение psycopg2, поэтому смотрим и исходное
+    for candidate in [error, error.__cause__, error.__context__] + list(error.args[:1]):
+        code = getattr(candidate, 'pgcode', None)
+        if code:
+            return code
+    return None
+
+
+def with_retries(func, *args):
+    # Повтор всей транзакции при конфликте сериализации или взаимоблокировке
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            with db.atomic():
+                return func(*args), attempt
+        except Exception as e:
+            if error_code(e) not in RETRY_CODES or attempt == MAX_RETRIES:
+                raise
+            time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+
+
+def parse_amount(amount):
+    try:
+        amount = Decimal(str(amount).replace(',', '.')).quantize(CENTS)
+    except InvalidOperation:
+        raise TransferError(f"Неверная сумма: {amount}")
+    if amount <= 0:
+        raise TransferError("Сумма перевода должна быть положительной.")
+    return amount
+
+
+def lock_balances(account_ids):
+    # Блокировки берутся всегда в одном порядке: сначала счета по возрастанию id,
+    # затем их карты по возрастанию id - встречные переводы не взаимоблокируются
+    accounts = dict(Bank_Account
+                    .select(Bank_Account.id, Bank_Account.card)
+                    .where(Bank_Account.id.in_(sorted(account_ids)))
+                    .order_by(Bank_Account.id)
+                    .for_update()
+                    .tuples())
+    card_ids = sorted({card for card in accounts.values() if card is not None})
+    balances = dict(Card
+                    .select(Card.id, Card.card_amount)
+                    .where(Card.id.in_(card_ids))
+                    .order_by(Card.id)
+                    .for_update()
+                    .tuples()) if card_ids else {}
+    return accounts, balances
+
+
+def plan_transfers(transfers, accounts, balances, now):
+    # Проверка и проводка пакета по уже заблокированным счетам и балансам, без
+    # обращения к базе. Возвращает (строки transaction, балансы карт после пакета,
+    # отклонённые); balances не меняется
+    balances = dict(balances)
+    rejected = []
+    rows = []
+    for index, source, target, amount in transfers:
+        if source is not None and source == target:
+            rejected.append((index, "Счета отправителя и получателя совпадают."))
+            continue
+        missing = [account for account in (source, target) if account is not None and account not in accounts]
+        if missing:
+            rejected.append((index, f"Счёт {missing[0]} не найден."))
+            continue
+        cards = [accounts[account] if account is not None else None for account in (source, target)]
+        if any(account is not None and card is None for account, card in zip((source, target), cards)):
+            rejected.append((index, "К счёту не привязана карта."))
+            continue
+        source_card, target_card = cards
+        if source_card is not None and balances[source_card] < amount:
+            rejected.append((index, "Недостаточно средств."))
+            continue
+        if source_card is not None:
+            balances[source_card] -= amount
+        if target_card is not None:
+            balances[target_card] += amount
+        rows.append({'date': now.date(), 'time': now.time().replace(microsecond=0), 'amount_money': amount,
+                     'bank_account_from': source, 'bank_account_to': target})
+    return rows, balances, rejected
+
+
+def apply_transfers(transfers):
+    # transfers - [(номер, счёт-источник, счёт-получатель, сумма)]; None вместо
+    # счёта означает внешний источник или получателя (взнос или снятие наличных).
+    # Возвращает (id операций, отклонённые); при повторе транзакции всё
+    # считается заново, поэтому накопители создаются здесь
+    account_ids = {account for _, source, target, _ in transfers for account in (source, target)
+                   if account is not None}
+    accounts, original = lock_balances(account_ids)
+    rows, balances, rejected = plan_transfers(transfers, accounts, original, datetime.now())
+
+    changed = {card: balance for card, balance in balances.items() if balance != original[card]}
+    if changed:
+        # Все балансы пакета одним UPDATE ... SET card_amount = CASE id ... END
+        Card.update(card_amount=Case(Card.id, list(changed.items()))).where(Card.id.in_(list(changed))).execute()
+    ids = []
+    if rows:
+        ids = [row[0] for row in Transaction.insert_many(rows).returning(Transaction.id).tuples().execute()]
+    return ids, rejected
+
+
+def transfer(source, target, amount):
+    # Один перевод в одной транзакции; возвращает id созданной операции
+    if source is None and target is None:
+        raise TransferError("Укажите хотя бы один счёт.")
+    (ids, rejected), _ = with_retries(apply_transfers, [(0, source, target, parse_amount(amount))])
+    if rejected:
+        raise TransferError(rejected[0][1])
+    return ids[0]
+
+
+def transfer_batch(transfers, batch_size=BATCH_SIZE):
+    # Пакетный API: transfers - итерируемое (source, target, amount). Каждые
+    # batch_size переводов - одна транзакция: одна блокировка всех затронутых
+    # счетов, один UPDATE балансов и один INSERT операций. Переводы, которые
+    # нельзя провести, отклоняются, остальные в пакете проходят.
+    result = BatchResult()
+    batch = []
+
+    def flush():
+        (ids, rejected), retries = with_retries(apply_transfers, batch)
+        result.transaction_ids.extend(ids)
+        result.rejected.extend(rejected)
+        result.retries += retries
+
+    for index, (source, target, amount) in enumerate(transfers):
+        try:
+            batch.append((index, source, target, parse_amount(amount)))
+        except TransferError as e:
+            result.rejected.append((index, str(e)))
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    return result
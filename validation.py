@@ -0,0 +1,185 @@
+# validation.py
+import re
+from datetime import date, time
+from functools import lru_cache
+
+from peewee import (
+    AutoField, CharField, DateField, DecimalField, ForeignKeyField, IntegerField, TextField,
+    TimeField
+)
+
+DIGITS = r'\d+'
+NUMBER = r'\d+(?:\.\d+)?'
+DATE = r'\d{4}-\d{2}-\d{2}'
+TIME = r'\d{2}:\d{2}(?::\d{2})?'
+
+# Форматы отдельных полей, которые не выводятся из типа колонки
+FIELD_PATTERNS = {
+    'card_number': (r'\d{4}-\d{4}-\d{4}-\d{4}', "Номер карты должен быть в формате xxxx-xxxx-xxxx-xxxx."),
+    'telephone_number': (r'\+7-\d{3}-\d{3}-\d{2}-\d{2}', "Номер телефона должен быть в формате +7-XXX-XXX-XX-XX."),
+    'passport_serial': (r'\d{4}', "Серия паспорта должна содержать 4 цифры."),
+    'passport_number': (r'\d{6}', "Номер паспорта должен содержать 6 цифр."),
+    'security_code': (DIGITS, None),
+    'inn': (DIGITS, None),
+    'kpp': (DIGITS, None),
+}
+
+# Статусы, которые сотрудник не может назначать
+RESTRICTED_STATUSES = ('admin', 'employee')
+
+
+class ValidationError(ValueError):
+    def __init__(self, field, message):
+        super().__init__(message)
+        self.field = field
+
+
+class FieldRule:
+    def __init__(self, field):
+        self.name = field.name
+        self.required = not field.null and field.default is None and not isinstance(field, AutoField)
+        self.max_length = None
+        self.limit = None
+        self.kind = 'text'
+
+        target = field.rel_field if isinstance(field, ForeignKeyField) else field
+        pattern, message = None, None
+        if isinstance(target, (AutoField, IntegerField)):
+            pattern, self.kind = DIGITS, 'integer'
+        elif isinstance(target, DecimalField):
+            pattern, self.kind = NUMBER, 'decimal'
+            self.limit = 10 ** (target.max_digits - target.decimal_places)
+            message = f"Поле {field.name} должно быть числом."
+        elif isinstance(target, DateField):
+            pattern, self.kind = DATE, 'date'
+            message = "Неверный формат даты. Используйте YYYY-MM-DD."
+        elif isinstance(target, TimeField):
+            pattern, self.kind = TIME, 'time'
+            message = "Неверный формат времени. Используйте HH:MM:SS."
+        elif isinstance(target, (CharField, TextField)):
+            self.max_length = getattr(target, 'max_length', None)
+
+        if field.name in FIELD_PATTERNS:
+            pattern, message = FIELD_PATTERNS[field.name]
+        self.pattern = re.compile(pattern) if pattern else None
+        self.pattern_source = pattern
+        self.message = message or f"Поле {field.name} должно содержать только цифры."
+        self.range_message = f"Поле {field.name} превышает допустимое значение."
+        self.length_message = f"Поле {field.name} длиннее {self.max_length} символов."
+
+    def check(self, value):
+        # Проверка одного значения (строка без пробелов по краям, не пустая)
+        if self.pattern is not None and not self.pattern.fullmatch(value):
+            raise ValidationError(self.name, self.message)
+        if self.kind == 'date':
+            try:
+                date.fromisoformat(value)
+            except ValueError:
+                raise ValidationError(self.name, self.message)
+        elif self.kind == 'time':
+            try:
+                time.fromisoformat(value)
+            except ValueError:
+                raise ValidationError(self.name, self.message)
+        elif self.kind == 'decimal' and float(value) >= self.limit:
+            raise ValidationError(self.name, self.range_message)
+        if self.max_length is not None and len(value) > self.max_length:
+            raise ValidationError(self.name, self.length_message)
+
+    def column_errors(self, text):
+        # Векторная проверка колонки строк: [(маска, сообщение)] по каждой
+        # проверке (формат, диапазон, длина); True в маске - значение с ошибкой
+        import pandas as pd
+
+        empty = text == ''
+        bad_format = pd.Series(False, index=text.index)
+        errors = []
+        if self.pattern_source is not None:
+            bad_format |= ~empty & ~text.str.fullmatch(self.pattern_source)
+        if self.kind == 'date':
+            parsed = pd.to_datetime(text.where(~empty & ~bad_format), format='%Y-%m-%d', errors='coerce')
+            bad_format |= ~empty & parsed.isna()
+        elif self.kind == 'time':
+            parsed = pd.to_datetime(text.where(~empty & ~bad_format), format='%H:%M:%S', errors='coerce')
+            short = pd.to_datetime(text.where(~empty & ~bad_format), format='%H:%M', errors='coerce')
+            bad_format |= ~empty & parsed.isna() & short.isna()
+        errors.append((bad_format, self.message))
+        if self.kind == 'decimal':
+            parsed = pd.to_numeric(text.where(~empty & ~bad_format), errors='coerce')
+            errors.append((parsed >= self.limit, self.range_message))
+        if self.max_length is not None:
+            errors.append((text.str.len() > self.max_length, self.length_message))
+        return errors
+
+    def check_column(self, text):
+        # Векторная проверка колонки строк; True - значение с ошибкой
+        bad = None
+        for mask, _ in self.column_errors(text):
+            bad = mask if bad is None else bad | mask
+        return bad
+
+
+@lru_cache(maxsize=None)
+def model_rules(model):
+    return {field.name: FieldRule(field) for field in model._meta.sorted_fields}
+
+
+def validate_record(model, data, user_status='admin'):
+    # Проверка одной записи из диалога: пустые строки становятся None,
+    # при первой ошибке выбрасывается ValidationError
+    rules = model_rules(model)
+    result = {}
+    for field, value in data.items():
+        value = value.strip() if isinstance(value, str) else value
+        if value == '' or value is None:
+            result[field] = None
+            continue
+        if field == 'status' and user_status == 'employee' and value in RESTRICTED_STATUSES:
+            raise ValidationError(field, "Недостаточный уровень доступа")
+        rule = rules.get(field)
+        if rule is not None:
+            rule.check(value)
+        result[field] = value
+    return result
+
+
+def validate_frame(model, frame, user_status='admin', check_required=True):
+    # Векторная проверка таблицы строк (колонки - имена полей модели).
+    # Возвращает DataFrame масок: True в ячейке означает ошибку в этом поле.
+    import pandas as pd
+
+    rules = model_rules(model)
+    masks = {}
+    for column in frame.columns:
+        rule = rules.get(column)
+        if rule is None:
+            continue
+        text = frame[column].fillna('').astype(str).str.strip()
+        bad = rule.check_column(text)
+        if check_required and rule.required:
+            bad |= text == ''
+        if column == 'status' and user_status == 'employee':
+            bad |= text.isin(RESTRICTED_STATUSES)
+        masks[column] = bad
+    return pd.DataFrame(masks, index=frame.index)
+
+
+def error_messages(model, masks, frame, user_status='admin'):
+    # Текст ошибок по маскам validate_frame: по строке на запись, '' - без ошибок.
+    # Для каждой ошибочной ячейки указываются именно те проверки, что не прошли.
+    import pandas as pd
+
+    rules = model_rules(model)
+    messages = pd.Series('', index=masks.index)
+    for column in masks.columns:
+        failed = masks[column]
+        if not failed.any():
+            continue
+        text = frame[column].fillna('').astype(str).str.strip()
+        empty = text == ''
+        messages[failed & empty] += f"{column}: обязательное поле. "
+        for mask, message in rules[column].column_errors(text):
+            messages[failed & mask.fillna(False).astype(bool)] += f"{column}: {message} "
+        if column == 'status' and user_status == 'employee':
+            messages[failed & text.isin(RESTRICTED_STATUSES)] += f"{column}: Недостаточный уровень доступа. "
+    return messages.str.strip()
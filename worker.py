@@ -0,0 +1,143 @@
+# worker.py
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from models import db
+
+POLL_INTERVAL_MS = 30
+
+
+class Task:
+    def __init__(self, func, args, kwargs, on_success, on_error, channel, on_cancel=None, cancellable=True):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.on_success = on_success
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.cancellable = cancellable
+        self.channel = channel
+        self.future = None
+        self.connection = None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+        # Прерываем уже выполняющийся запрос на сервере
+        connection = self.connection
+        if connection is not None:
+            try:
+                connection.cancel()
+            except Exception:
+                pass
+
+
+class QueryExecutor:
+    # Выполняет запросы peewee в пуле потоков и возвращает результат в поток Tk.
+    # У каждого рабочего потока своё соединение с db (состояние peewee локально
+    # для потока), взятое из пула на время задачи. С hold_connection=True поток
+    # держит соединение между задачами (нужно для серверных курсоров).
+    # Задача с тем же channel вытесняет предыдущую. Результат отменённой задачи
+    # не доставляется; если она успела начаться, вызывается on_cancel (задача
+    # могла частично изменить данные до отмены). Задачи с cancellable=False
+    # (изменения данных) cancel_all не трогает: их результат всегда доставляется.
+    def __init__(self, root, max_workers=4, on_busy_change=None, hold_connection=False):
+        self.root = root
+        self.hold_connection = hold_connection
+        self.on_busy_change = on_busy_change
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db-worker')
+        self.results = queue.Queue()
+        self.channels = {}
+        self.pending = set()
+        self.closed = False
+        self.root.after(POLL_INTERVAL_MS, self.poll)
+
+    def submit(self, func, *args, on_success=None, on_error=None, on_cancel=None, channel=None, cancellable=True,
+               **kwargs):
+        task = Task(func, args, kwargs, on_success, on_error, channel, on_cancel, cancellable)
+        if channel is not None:
+            self.cancel(channel)
+            self.channels[channel] = task
+        self.pending.add(task)
+        self.set_busy()
+        task.future = self.pool.submit(self.run, task)
+        return task
+
+    def cancel(self, channel):
+        task = self.channels.pop(channel, None)
+        if task is not None:
+            task.cancel()
+            self.pending.discard(task)
+            self.set_busy()
+
+    def cancel_all(self):
+        for task in list(self.pending):
+            if task.cancellable:
+                task.cancel()
+                self.pending.discard(task)
+        self.channels = {channel: task for channel, task in self.channels.items() if not task.cancelled}
+        self.set_busy()
+
+    def run(self, task):
+        if task.cancelled:
+            return
+        try:
+            if self.hold_connection:
+                db.connect(reuse_if_open=True)
+                result = self.execute(task)
+            else:
+                # Соединение берётся из пула на время задачи
+                with db.connection_context():
+                    result = self.execute(task)
+            self.results.put((task, result, None))
+        except Exception as e:
+            self.results.put((task, None, e))
+
+    def execute(self, task):
+        task.connection = db.connection()
+        try:
+            return task.func(*task.args, **task.kwargs)
+        finally:
+            task.connection = None
+
+    def poll(self):
+        if self.closed:
+            return
+        while True:
+            try:
+                task, result, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.finish(task, result, error)
+        self.root.after(POLL_INTERVAL_MS, self.poll)
+
+    def finish(self, task, result, error):
+        self.pending.discard(task)
+        if task.channel is not None and self.channels.get(task.channel) is task:
+            del self.channels[task.channel]
+        self.set_busy()
+        if task.cancelled:
+            if task.on_cancel is not None:
+                task.on_cancel()
+            return
+        if error is not None:
+            if task.on_error is not None:
+                task.on_error(error)
+        elif task.on_success is not None:
+            task.on_success(result)
+
+    def set_busy(self):
+        if self.on_busy_change is not None:
+            self.on_busy_change(bool(self.pending))
+
+    def shutdown(self):
+        self.closed = True
+        self.cancel_all()
+        self.pool.shutdown(wait=False, cancel_futures=True)